@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from primitives import *
+from avl import AVLTree
+from sweep_line import SweepLine, naive_seg_inter
+from sweep_line_datasets import generate_general_segments, generate_segments, generate_polylines
+from red_blue import red_blue_intersections, generate_red_blue_segments
+from dcel import DCEL, overlay, naive_overlay_intersect, sweep_overlay_intersect
+from dcel_datasets import grid_lines_test, map_pair
+from kernel import intersect_all
+from incremental import update_overlay
+import engine
+
+# a reproducible benchmark suite. each benchmark builds a seeded workload of a given size,
+#   which is not timed, and returns a function running the operation being measured.
+#   results are written as json, and may be compared against a saved baseline run.
+
+# name -> (sizes, quick sizes, setup), where setup(n, seed) returns a function taking no arguments
+BENCHMARKS = {}
+
+def benchmark(name, sizes, quick):
+    '''registers the decorated setup function as the benchmark "name", run at each of the
+    given sizes, or at the "quick" sizes for a short run'''
+    def register(setup):
+        BENCHMARKS[name] = (sizes, quick, setup)
+        return setup
+    return register
+
+def random_segments(n, seed):
+    '''n random segments in general position, as required by SweepLine
+    (see generate_general_segments)'''
+    return generate_general_segments(n, seed=seed)
+
+def grid_dcels(n, compute_faces=True):
+    '''the two DCELs of grid_lines_test with n rectangles each, which meet at 4n^2 points,
+    built with or without faces'''
+    row, col = grid_lines_test(n, n)
+    if compute_faces:
+        return row, col
+    return tuple(DCEL.from_points_segs(d.verts, d.edges, compute_faces=False) for d in (row, col))
+
+@benchmark('intersect.naive', [100, 200, 400, 800], [100, 200])
+def _(n, seed):
+    segs = random_segments(n, seed)
+    return lambda: len(naive_seg_inter(segs))
+
+@benchmark('intersect.sweep', [100, 200, 400, 800], [100, 200])
+def _(n, seed):
+    segs = random_segments(n, seed)
+    return lambda: len(SweepLine().find_intersections(segs))
+
+@benchmark('intersect.sweep_certificates', [100, 200, 400, 800], [100, 200])
+def _(n, seed):
+    segs = random_segments(n, seed)
+    return lambda: len(SweepLine(certificates=True).find_intersections(segs))
+
+@benchmark('intersect.chains', [10, 20, 40], [10, 20])
+def _(n, seed):
+    # n polylines of 10n short segments each
+    segs = generate_polylines(n, 10*n, seed=seed)
+    return lambda: len(SweepLine(chains=True).find_intersections(segs))
+
+@benchmark('intersect.int64', [100, 200, 400, 800], [100, 200])
+def _(n, seed):
+    segs = random_segments(n, seed)
+    # every pair is found in both orders
+    return lambda: len(intersect_all(segs, segs))//2
+
+@benchmark('intersect.auto', [100, 200, 400, 800], [100, 200])
+def _(n, seed):
+    segs = random_segments(n, seed)
+    return lambda: len(engine.find_intersections(segs, seed=seed))
+
+@benchmark('intersect.red_blue', [250, 500, 1000, 2000], [250, 500])
+def _(n, seed):
+    red, blue = generate_red_blue_segments(n, seed=seed)
+    return lambda: len(red_blue_intersections(red, blue)[0])
+
+@benchmark('overlay_intersect.naive', [5, 10, 20], [5, 10])
+def _(n, seed):
+    d1, d2 = grid_dcels(n, compute_faces=False)
+    return lambda: len(naive_overlay_intersect(d1, d2))
+
+@benchmark('overlay_intersect.multi_sweep', [5, 10, 20, 40], [5, 10])
+def _(n, seed):
+    d1, d2 = grid_dcels(n, compute_faces=False)
+    return lambda: sum(map(len, sweep_overlay_intersect([d1, d2]).values()))
+
+@benchmark('avl.insert_delete', [1000, 10000, 100000], [1000, 10000])
+def _(n, seed):
+    keys = random.Random(seed).sample(range(10*n), n)
+
+    def run():
+        tree = AVLTree()
+        for k in keys:
+            tree.insert(k)
+        for k in keys[::2]:
+            tree.delete(k)
+        return tree.size
+    return run
+
+@benchmark('avl.search', [1000, 10000, 100000], [1000, 10000])
+def _(n, seed):
+    keys = random.Random(seed).sample(range(10*n), n)
+    tree = AVLTree()
+    for k in keys:
+        tree.insert(k)
+    return lambda: sum(tree._search(tree.root, k) is not None for k in keys)
+
+@benchmark('dcel.from_points_segs', [10, 20, 40, 80], [10, 20])
+def _(n, seed):
+    row, _ = grid_dcels(n, compute_faces=False)
+    points = { id(v): Point(v._x, v._y, v._w) for v in row.verts }
+    segs = [ Segment(points[id(e.p1)], points[id(e.p2)]) for e in row.edges ]
+    points = list(points.values())
+    return lambda: len(DCEL.from_points_segs(points, segs, verify=DCEL.VERIFY_NONE, compute_faces=False).edges)
+
+@benchmark('dcel.from_segments', [250, 500, 1000], [250, 500])
+def _(n, seed):
+    segs = generate_segments(n, 2*n, seed=seed, size=10**6)
+    return lambda: len(DCEL.from_segments(segs).faces)
+
+@benchmark('dcel.set_faces', [10, 20, 40], [10, 20])
+def _(n, seed):
+    ol_dcel = overlay(*grid_dcels(n))
+
+    def run():
+        ol_dcel.set_faces()
+        return len(ol_dcel.faces)
+    return run
+
+@benchmark('dcel.annotate_faces', [5, 10, 20], [5, 10])
+def _(n, seed):
+    row, col = grid_dcels(n)
+    ol_dcel = overlay(row, col)
+    ol_dcel.set_faces()
+
+    def run():
+        ol_dcel.annotate_faces(row)
+        ol_dcel.annotate_faces(col)
+        return len(ol_dcel.faces)
+    return run
+
+@benchmark('dcel.overlay', [5, 10, 20], [5, 10])
+def _(n, seed):
+    row, col = grid_dcels(n)
+    return lambda: len(overlay(row, col, compute_faces=True).faces)
+
+@benchmark('dcel.overlay_honeycomb', [5, 10, 20], [5, 10])
+def _(n, seed):
+    d1, d2 = map_pair('honeycomb', n, 4*n*n, seed=seed, compute_faces=True)
+    return lambda: len(overlay(d1, d2, compute_faces=True).faces)
+
+@benchmark('dcel.overlay_auto', [5, 10, 20], [5, 10])
+def _(n, seed):
+    d1, d2 = map_pair('honeycomb', n, 4*n*n, seed=seed, compute_faces=True)
+    return lambda: len(overlay(d1, d2, compute_faces=True, engine='auto').faces)
+
+@benchmark('incremental.update_overlay', [10, 20, 40], [10, 20])
+def _(n, seed):
+    # inserting and deleting a chord of one cell of the first of two shifted n by n grids
+    d1, d2 = map_pair('grid', n, 4*n*n, seed=seed, compute_faces=True)
+    ol_dcel = overlay(d1, d2, compute_faces=True)
+    p, q = min(d1.verts), max(d1.verts)
+    c = (q._x - p._x)//n
+    seg = Segment(Point(p._x + c//2 + 1, p._y + c//2 + 1), Point(p._x + c//2 + c//3 + 1, p._y + c//2 + c//5 + 1))
+
+    def run():
+        for _ in range(10):
+            update_overlay(ol_dcel, d1, [seg], [])
+            update_overlay(ol_dcel, d1, [], [seg])
+        return len(ol_dcel.faces)
+    return run
+
+def measure(run, repeat):
+    '''returns the result of run() and the wall times in seconds of "repeat" calls'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = run()
+        times.append(time.perf_counter() - start)
+    return res, times
+
+def git_commit():
+    '''returns the hash of the current git commit, or None if it cannot be found'''
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(names=None, seed=290, repeat=3, quick=False, log=None):
+    '''runs the named benchmarks, or all of them, returning the results as a dict with
+        meta        the seed, repeat count, python version, platform and git commit
+        results     for each benchmark and size, a dict with its name, n, the minimum and
+                        median times in seconds and the result of the benchmarked operation,
+                        which is the same in every run with the same seed
+    If log is given, it is called with each result as it is measured.'''
+    results = []
+    for name, (sizes, quick_sizes, setup) in BENCHMARKS.items():
+        if names is not None and not any(name.startswith(m) for m in names):
+            continue
+
+        for n in (quick_sizes if quick else sizes):
+            res, times = measure(setup(n, seed), repeat)
+            results.append({
+                'name': name,
+                'n': n,
+                'min': min(times),
+                'median': statistics.median(times),
+                'result': res,
+            })
+            if log is not None:
+                log(results[-1])
+
+    meta = {
+        'seed': seed,
+        'repeat': repeat,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'commit': git_commit(),
+    }
+    return { 'meta': meta, 'results': results }
+
+def compare(run, baseline, threshold=0.25):
+    '''compares the results of a run against a baseline run, returning a list of
+    (name, n, baseline time, time, ratio, flag) for each benchmark and size in both, where
+    flag is 'slower' or 'faster' if the minimum time changed by more than the given fraction,
+    and 'changed' if the result of the benchmarked operation is different'''
+    base = { (r['name'], r['n']): r for r in baseline['results'] }
+
+    rows = []
+    for r in run['results']:
+        b = base.get((r['name'], r['n']))
+        if b is None:
+            continue
+
+        ratio = r['min'] / max(b['min'], 1e-9)
+        flag = ''
+        if r['result'] != b['result']:
+            flag = 'changed'
+        elif ratio > 1+threshold:
+            flag = 'slower'
+        elif ratio < 1/(1+threshold):
+            flag = 'faster'
+        rows.append((r['name'], r['n'], b['min'], r['min'], ratio, flag))
+
+    return rows
+
+def print_result(r):
+    print('%-28s %8d %10.4f %10.4f %10s' % (r['name'], r['n'], r['min'], r['median'], r['result']))
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='run the benchmark suite')
+    parser.add_argument('names', nargs='*', help='run only benchmarks whose names start with these')
+    parser.add_argument('--seed', type=int, default=290)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--quick', action='store_true', help='run only the smallest sizes')
+    parser.add_argument('--out', help='write the results to this json file')
+    parser.add_argument('--baseline', help='compare the results against this json file')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='the fraction by which a time must change to be flagged')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (sizes, quick, _) in BENCHMARKS.items():
+            print(name, sizes, quick)
+        sys.exit(0)
+
+    print('%-28s %8s %10s %10s %10s' % ('benchmark', 'n', 'min', 'median', 'result'))
+    run = run_suite(args.names or None, seed=args.seed, repeat=args.repeat, quick=args.quick, log=print_result)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(run, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        print()
+        print('%-28s %8s %10s %10s %8s' % ('benchmark', 'n', 'baseline', 'min', 'ratio'))
+        rows = compare(run, baseline, args.threshold)
+        for name, n, b, t, ratio, flag in rows:
+            print('%-28s %8d %10.4f %10.4f %8.2f %s' % (name, n, b, t, ratio, flag))
+
+        # regressions fail the run
+        if any(flag in ('slower', 'changed') for *_, flag in rows):
+            sys.exit(1)
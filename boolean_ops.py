@@ -0,0 +1,167 @@
+from collections import deque
+from primitives import *
+from dcel_helpers import *
+from dcel import DCEL
+from red_blue import red_blue_overlay_intersect
+from kernel import segment_array
+
+def split_pieces(dcel1, dcel2):
+    '''returns the points and pieces of the overlay of dcel1 and dcel2, and the points
+    that were introduced by intersections. each piece is a segment paired with, for each
+    DCEL, None or the edge containing it and whether the piece runs from its p1 to its p2.'''
+    _, splits = red_blue_overlay_intersect(dcel1, dcel2)
+
+    points = {}
+    pieces = {}
+    for i,d in enumerate((dcel1, dcel2)):
+        for e in d.edges:
+            # order the points along e from p1 to p2
+            chain = [e.p1] + sorted(splits[id(e)], reverse=e.p2 < e.p1) + [e.p2]
+            chain = [ points.setdefault(p, Point(p._x, p._y, p._w)) for p in chain ]
+
+            for p, q in zip(chain, chain[1:]):
+                key = frozenset((p, q))
+                if key not in pieces:
+                    pieces[key] = (Segment(p, q), [None, None])
+                seg, origins = pieces[key]
+                origins[i] = (e, seg.p1 is p)
+
+    inters = set()
+    for s in splits.values():
+        inters.update(s)
+
+    return list(points.values()), list(pieces.values()), inters
+
+def label_cycles(ol_dcel, origins, dcels):
+    '''for the overlay ol_dcel of the given DCELs, without faces, where origins[i] gives the
+    origins of ol_dcel.edges[i] as in split_pieces, return the cycle index of each
+    halfedge and, for each cycle, whether the region to its left lies in a bounded face
+    of each DCEL. labels are read off the edges of each DCEL where a cycle has one, and
+    carried across edges of the other DCELs otherwise; only components that do not
+    meet a DCEL at all are located in it.'''
+    cycle_of = {}
+    cycles = []
+    for h in ol_dcel.hedges:
+        if id(h) in cycle_of:
+            continue
+
+        hedges = []
+        curr = h
+        while id(curr) not in cycle_of:
+            cycle_of[id(curr)] = len(cycles)
+            hedges.append(curr)
+            curr = curr.nxt
+        cycles.append(hedges)
+
+    origin_of = { id(e): o for e, o in zip(ol_dcel.edges, origins) }
+    labels = [ [None]*len(dcels) for _ in cycles ]
+    queues = [ deque() for _ in dcels ]
+
+    for e, origin in zip(ol_dcel.edges, origins):
+        for i,o in enumerate(origin):
+            if o is None:
+                continue
+
+            f, along = o
+            for h, fh in ((e.h1, f.h1), (e.h2, f.h2)) if along else ((e.h1, f.h2), (e.h2, f.h1)):
+                c = cycle_of[id(h)]
+                if labels[c][i] is None:
+                    labels[c][i] = fh.face is not dcels[i].infinite_face
+                    queues[i].append(c)
+
+    for i,d in enumerate(dcels):
+        queue = queues[i]
+        unlabelled = iter(range(len(cycles)))
+        coords = None
+
+        while True:
+            # the label of a DCEL only changes across its own edges
+            while len(queue) > 0:
+                c = queue.popleft()
+                for h in cycles[c]:
+                    if origin_of[id(h.edge)][i] is not None:
+                        continue
+                    t = cycle_of[id(h.twin)]
+                    if labels[t][i] is None:
+                        labels[t][i] = labels[c][i]
+                        queue.append(t)
+
+            c = next((c for c in unlabelled if labels[c][i] is None), None)
+            if c is None:
+                break
+
+            # this component meets no edge of d, so locate it in d
+            leftmost = cycles[c][0]
+            for h in cycles[c]:
+                leftmost = ol_dcel.get_leftmost_by_origin(leftmost, h)
+
+            if coords is None:
+                coords = segment_array(d.edges)
+            visible = ol_dcel.get_visible_hedge(leftmost, d.edges, coords)
+            labels[c][i] = visible is not None and visible.face is not d.infinite_face
+            queue.append(c)
+
+    return cycle_of, labels
+
+def boolean_op(dcel1, dcel2, op):
+    '''returns a DCEL whose edges bound the region of points for which op(in1, in2) is True,
+    where in1 and in2 denote whether a point lies in a bounded face of dcel1 and dcel2,
+    along with the list of faces of that DCEL which make up the region.
+    faces are only computed for the boundary of the region, and the faces of the
+    overlay of dcel1 and dcel2 are never built or annotated.'''
+    points, pieces, inters = split_pieces(dcel1, dcel2)
+
+    ol_dcel = DCEL.from_points_segs(points, [ seg for seg, _ in pieces ],
+                                    verify=DCEL.VERIFY_NONE, compute_faces=False)
+    origins = [ origin for _, origin in pieces ]
+
+    cycle_of, labels = label_cycles(ol_dcel, origins, [dcel1, dcel2])
+    inside = [ op(*l) for l in labels ]
+
+    # keep the edges separating the region from its complement, directed with the region on their left
+    out = {}
+    for e in ol_dcel.edges:
+        left, right = inside[cycle_of[id(e.h1)]], inside[cycle_of[id(e.h2)]]
+        if left and not right:
+            out.setdefault(e.p1, []).append(e.p2)
+        elif right and not left:
+            out.setdefault(e.p2, []).append(e.p1)
+
+    # rejoin collinear edges that were only split by a discarded intersection
+    into = {}
+    for p, qs in out.items():
+        for q in qs:
+            into.setdefault(q, []).append(p)
+
+    for v in inters:
+        if len(out.get(v, [])) != 1 or len(into.get(v, [])) != 1:
+            continue
+
+        a, b = into[v][0], out[v][0]
+        if not collinear_in_order(a, v, b):
+            continue
+
+        out[a][out[a].index(v)] = b
+        into[b][into[b].index(v)] = a
+        del out[v], into[v]
+
+    segs = [ Segment(p, q) for p, qs in out.items() for q in qs ]
+    kept = set(out) | set(into)
+    res = DCEL.from_points_segs([ p for p in points if p in kept ], segs)
+
+    # bounded faces whose outer cycle runs along the kept edges lie in the region
+    region = [ f for f in res.faces if len(f.outer.hedges) > 0 and f.outer.hedges[0] is f.outer.hedges[0].edge.h1 ]
+
+    return res, region
+
+def intersection(dcel1, dcel2):
+    '''returns the DCEL and its faces making up the region covered by both dcel1 and dcel2'''
+    return boolean_op(dcel1, dcel2, lambda a, b: a and b)
+
+def union(dcel1, dcel2):
+    '''returns the DCEL and its faces making up the region covered by dcel1 or dcel2'''
+    return boolean_op(dcel1, dcel2, lambda a, b: a or b)
+
+def difference(dcel1, dcel2):
+    '''returns the DCEL and its faces making up the region covered by dcel1 and not by dcel2'''
+    return boolean_op(dcel1, dcel2, lambda a, b: a and not b)
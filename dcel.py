@@ -1,8 +1,12 @@
-import matplotlib.pyplot as plt
+import numpy as np
 from primitives import *
-from dcel_datasets import *
-from overlay_cases import *
+from overlay_cases import vertex_vertex, edge_edge, vertex_edge, split_edges
 from dcel_helpers import *
+from engine import overlay_intersect
+from red_blue import sweep_segments, split_segments
+from stats import phase
+from sweep_line import SweepLine
+from kernel import BOUND, fits, point_array, segment_array, orient_signs, float_orient_signs, collinear_in_order_mask, intersect_line_many, intersect_all
     
 class DCEL(object):
     '''representation of a planar subdivision as a doubly-connected edge list (DCEL),
@@ -11,6 +15,14 @@ class DCEL(object):
 
     VERIFY=False
 
+    # verification levels for from_points_segs
+    VERIFY_NONE = 0
+    VERIFY_POINTERS = 1
+    VERIFY_FULL = 2
+
+    # the number of edges above which draw uses collections by default
+    BULK_DRAW_EDGES = 1000
+
     '''a class defining a DCEL
     
     Attributes:
@@ -19,6 +31,8 @@ class DCEL(object):
         verts           The list of Vertex objects in this DCEL
         faces           The list of Faces in this DCEL
         infinite_face   The infinite face of this DCEL
+        edit_index      The EditIndex kept up to date by incremental edits of this DCEL
+                            (see incremental.py), or None
     '''
 
     def __init__(self, edges, hedges, verts, faces=None):
@@ -27,8 +41,17 @@ class DCEL(object):
         self.verts = verts
         self.faces = faces
         self.infinite_face = None
+        self.edit_index = None
+
+    def draw(self, fig=None, bulk=None):
+        '''draws the faces, vertices and halfedges of this DCEL. If bulk is True, or None and
+        this DCEL has more than BULK_DRAW_EDGES edges, its faces and edges are instead drawn
+        with one collection each (see draw_dcel in render.py), which are returned.'''
+        fig = get_fig(fig)
+        if bulk or (bulk is None and len(self.edges) > self.BULK_DRAW_EDGES):
+            from render import draw_dcel
+            return draw_dcel(self, ax=fig if hasattr(fig, 'add_collection') else fig.gca())
 
-    def draw(self, fig=plt):
         if self.faces is not None:
             for f in self.faces:
                 f.draw(fig=fig)
@@ -40,75 +63,257 @@ class DCEL(object):
             he.draw(fig=fig)
 
     def copy(self):
-        '''returns a copy of this DCEL by reconstructing it from its underlying vertex coordinates and segments'''
-        npoints = [ Point(v._x, v._y, v._w) for v in self.verts ]
-        nsegs = [ Segment(e.p1, e.p2) for e in self.edges ]
-        dcel = self.from_points_segs(npoints, nsegs)
+        '''returns a copy of this DCEL by cloning each of its records and remapping
+        the pointers between them, in time linear in the size of this DCEL.'''
+        vmap = {}
+        verts = []
+        for v in self.verts:
+            nv = Vertex(v._x, v._y, v._w)
+            vmap[id(v)] = nv
+            verts.append(nv)
+
+        hmap = {}
+        edges = []
+        for e in self.edges:
+            ne = Edge(vmap[id(e.p1)], vmap[id(e.p2)])
+            ne.source = e.source
+            hmap[id(e.h1)] = ne.h1
+            hmap[id(e.h2)] = ne.h2
+            edges.append(ne)
+
+        hedges = [ hmap[id(h)] for h in self.hedges ]
+
+        for h in self.hedges:
+            nh = hmap[id(h)]
+            nh.origin = vmap[id(h.origin)]
+            nh.nxt = hmap.get(id(h.nxt))
+            nh.prv = hmap.get(id(h.prv))
+
+        for v in self.verts:
+            vmap[id(v)].hedge = hmap.get(id(v.hedge))
+
+        dcel = type(self)(edges, hedges, verts)
+
+        if self.faces is None:
+            return dcel
+
+        cmap = {}
+        for f in self.faces:
+            for c in [f.outer] + f.inners:
+                nc = BoundaryCycle([ hmap[id(h)] for h in c.hedges ], hmap.get(id(c.leftmost)), c.is_outer)
+                cmap[id(c)] = nc
+
+        faces = []
+        fmap = {}
+        for f in self.faces:
+            nf = Face(cmap[id(f.outer)], [ cmap[id(c)] for c in f.inners ], dcel=dcel)
+            for c in [f.outer] + f.inners:
+                nc = cmap[id(c)]
+                nc.face = nf
+                nc.parent = None if c.parent is None else cmap[id(c.parent)]
+                for h in nc.hedges:
+                    h.face = nf
+            fmap[id(f)] = nf
+            faces.append(nf)
+
+        # labels of this DCEL's own faces now refer to the copy
+        for f in self.faces:
+            nf = fmap[id(f)]
+            for other, g in f.overlay_data.items():
+                if other is self:
+                    nf.overlay_data[dcel] = fmap[id(g)]
+                else:
+                    nf.overlay_data[other] = g
+
+        dcel.faces = faces
+        dcel.infinite_face = fmap.get(id(self.infinite_face))
+
         return dcel
     
-    def verify(self, verify_edges=True, verify_hedges=True, verify_vertices=True):
-        '''a helper method for debugging purposes'''
+    def verify(self, verify_edges=True, verify_hedges=True, verify_vertices=True, verify_faces=False):
+        '''a helper method for debugging purposes. runs in time linear in the size of this DCEL
+        by checking membership in sets of record identities.
+        if verify_faces is True, also checks that the faces and boundary cycles
+        computed by set_faces are consistent with the halfedges.'''
+        edge_ids = set(map(id, self.edges))
+        hedge_ids = set(map(id, self.hedges))
+        vert_ids = set(map(id, self.verts))
+
         if verify_edges:
             for e in self.edges:
-                if e.h1 not in self.hedges:
+                if id(e.h1) not in hedge_ids:
                     raise ValueError(str(e.h1) + ' not in hedges')
                 
-                if e.h2 not in self.hedges:
+                if id(e.h2) not in hedge_ids:
                     raise ValueError(str(e.h2) + ' not in hedges')
+
+                if e.h1.twin is not e.h2 or e.h2.twin is not e.h1:
+                    raise ValueError('halfedges of ' + str(e) + ' are not twins')
             
         if verify_hedges:
             for h in self.hedges:
-                if h.edge not in self.edges:
-                    raise ValueError(str(e) + ' not in edges')
+                if id(h.edge) not in edge_ids:
+                    raise ValueError(str(h.edge) + ' not in edges')
+
+                if h.twin is None or h.twin is h or h.twin.twin is not h:
+                    raise ValueError(str(h) + ' is not twin of its twin')
+
+                if h.twin.edge is not h.edge:
+                    raise ValueError(str(h) + ' and its twin have different edges')
                 
                 if h.prv is None:
                     raise ValueError(str(h) + ' has no prev')
-                elif h.prv not in self.hedges:
+                elif id(h.prv) not in hedge_ids:
                     raise ValueError(str(h.prv) + ' is prev and not in hedges')
                 
                 if h.nxt is None:
                     raise ValueError(str(h) + ' has no next')
-                elif h.nxt not in self.hedges:
-                    raise ValueError(str(h.prv) + ' is next and not in hedges')
+                elif id(h.nxt) not in hedge_ids:
+                    raise ValueError(str(h.nxt) + ' is next and not in hedges')
 
             for h in self.hedges:
-                if h.nxt.prv != h:
+                if h.nxt.prv is not h:
                     raise ValueError(str(h) + ' is not next.prev')
-                if h.prv.nxt != h:
+                if h.prv.nxt is not h:
                     raise ValueError(str(h) + ' is not prev.next')
+                if h.nxt.origin is not h.twin.origin:
+                    raise ValueError(str(h) + ' does not end at the origin of its next')
         
         if verify_vertices:
             for v in self.verts:
-                if v.hedge is None or v.hedge not in self.hedges:
+                if v.hedge is None or id(v.hedge) not in hedge_ids:
                     raise ValueError(str(v.hedge) + ' is halfedge at vertex ' + str(v) + ' and not in hedges')
+                if v.hedge.origin is not v:
+                    raise ValueError(str(v.hedge) + ' is halfedge at vertex ' + str(v) + ' and not from it')
             
             for h in self.hedges:
-                if h.origin not in self.verts:
+                if id(h.origin) not in vert_ids:
                     raise ValueError(str(h.origin) + ' is vertex of halfedge ' + str(h) + ' and not in verts')
             
             for e in self.edges:
-                if e.p1 not in self.verts:
+                if id(e.p1) not in vert_ids:
                     raise ValueError(str(e.p1) + ' is vertex of edge ' + str(e) + ' and not in verts')
-                if e.p2 not in self.verts:
+                if id(e.p2) not in vert_ids:
                     raise ValueError(str(e.p2) + ' is vertex of edge ' + str(e) + ' and not in verts')
-            
-    def annotate_faces(self, other):
-        '''identify face of "other" dcel that contains each face of this dcel.
+
+        if verify_faces:
+            self.verify_faces()
+
+    def verify_planar(self):
+        '''raises a ValueError if two edges of this DCEL cross, touch or overlap anywhere but
+        at a shared endpoint, found in O(n log n) time (see find_any_intersection in sweep_line.py)'''
+        found = SweepLine().find_any_intersection(self.edges)
+        if found is not None:
+            a, b, p = found
+            raise ValueError('edges ' + str(a) + ' and ' + str(b) + ' meet at ' + str(p))
+
+    def verify_faces(self):
+        '''a helper method for debugging purposes, checking that every halfedge lies on exactly
+        one boundary cycle, that each cycle is closed under next pointers, and that each face
+        has one outer cycle, with the infinite face the only one without halfedges.'''
+        if self.faces is None:
+            raise ValueError('faces have not been computed')
+
+        seen = set()
+        unbounded = []
+        for f in self.faces:
+            if f.dcel is not self:
+                raise ValueError('face does not belong to this dcel')
+
+            if f.outer is None or not f.outer.is_outer:
+                raise ValueError('face has no outer cycle')
+
+            if len(f.outer.hedges) == 0:
+                unbounded.append(f)
+
+            for c in [f.outer] + f.inners:
+                if c is not f.outer and c.is_outer:
+                    raise ValueError('inner cycle of face is an outer cycle')
+
+                if c.face is not f:
+                    raise ValueError('cycle does not point to its face')
+
+                n = len(c.hedges)
+                if n > 0 and c.leftmost not in c.hedges:
+                    raise ValueError(str(c.leftmost) + ' is leftmost and not on its cycle')
+
+                for i,h in enumerate(c.hedges):
+                    if id(h) in seen:
+                        raise ValueError(str(h) + ' lies on more than one cycle')
+                    seen.add(id(h))
+
+                    if h.cycle is not c:
+                        raise ValueError(str(h) + ' does not point to its cycle')
+                    if h.face is not f:
+                        raise ValueError(str(h) + ' does not point to its face')
+                    if h.nxt is not c.hedges[(i+1)%n]:
+                        raise ValueError(str(h) + ' is not followed by its next on its cycle')
+
+        if len(seen) != len(self.hedges):
+            raise ValueError('some halfedges lie on no cycle')
+
+        if len(unbounded) != 1 or unbounded[0] is not self.infinite_face:
+            raise ValueError('infinite face is not the only face without an outer boundary')
+
+    def annotate_faces(self, other, faces=None, index=None):
+        '''identify face of "other" dcel that contains each face of this dcel,
+        or only each of the given faces if "faces" is not None.
         assumes self is obtained as overlay of "other" with one or more other dcels.
+        if index is the EditIndex of other (see incremental.py), only the halfedges in the
+        cells of its grid around each face are checked, rather than every halfedge of other.
         NOTE: This takes time linear in the number of original halfedges since we do
         not implement the sweep-line to make this more efficient.'''
 
-        for face in self.faces:
+        if faces is None:
+            faces = self.faces
+
+        # every face lies in itself
+        if other is self:
+            for face in faces:
+                face.overlay_data[self] = face
+            return
+
+        # the origins and destinations of the halfedges of other, for the kernel (see kernel.py),
+        #   where halfedges outside the kernel are always checked exactly
+        if index is None:
+            ends = point_array([ p for h in other.hedges for p in (h.origin, h.twin.origin) ]).reshape(-1, 2, 2)
+            s1, t1 = ends[:,0], ends[:,1]
+            outside = (ends == BOUND).any(axis=(1,2))
+            fs1, ft1 = s1.astype(float), t1.astype(float)
+        edge_coords = None
+
+        for face in faces:
+            face.overlay_data.pop(other, None)
+
             if face == self.infinite_face:
                 face.overlay_data[other] = other.infinite_face
                 continue
             
             leftmost = face.outer.leftmost
 
+            # only the halfedges that the kernel does not rule out from the checks below are
+            #   checked exactly, in order. these all pass through the origin of leftmost.
+            if index is not None:
+                candidates = [ h for e in index.edges_at(leftmost.origin) for h in (e.h1, e.h2) ]
+            elif fits(leftmost.origin) and fits(leftmost.twin.origin):
+                s2, t2 = point_array([leftmost.origin, leftmost.twin.origin])
+                same_s, same_t = (s1 == s2).all(axis=1), (t1 == t2).all(axis=1)
+                contains = (same_s | collinear_in_order_mask(s1, s2, t2)) & (same_t | collinear_in_order_mask(s2, t2, t1))
+                emanates = collinear_in_order_mask(s1, s2, t1) & (orient_signs(s1, t2, t1) < 0)
+                candidates = [ other.hedges[i] for i in np.flatnonzero(contains | emanates | same_s | outside) ]
+            else:
+                # the origin of leftmost, such as an intersection point, is outside the kernel.
+                #   the checks below all need it on the closed halfedge, so only the halfedges
+                #   whose line passes through it, or may in floating point, are kept
+                q = np.array(leftmost.origin.p())
+                signs, undecided = float_orient_signs(fs1, q, ft1)
+                tol = 4*np.finfo(float).eps*np.abs(q)
+                within = ((np.minimum(fs1, ft1) - tol <= q) & (q <= np.maximum(fs1, ft1) + tol)).all(axis=1)
+                candidates = [ other.hedges[i] for i in np.flatnonzero(((signs == 0) & within) | outside) ]
+
             # infer original hedge that defines the leftmost
             adj = []
-            for hedge in other.hedges:
-
+            for hedge in candidates:
                 # if an original hedge supports leftmost
                 if hedge.contains(leftmost):
                     face.overlay_data[other] = hedge.cycle.face
@@ -134,7 +339,7 @@ class DCEL(object):
                 # get next in CW order from adjacent in adj
                 v = leftmost.origin
                 adj.append(leftmost)
-                cw_hedges = sorted(adj, key=lambda z: -v.angle(z.twin.origin)) # sort in CW order
+                cw_hedges = sorted(adj, key=lambda z: v.cw_key(z.twin.origin)) # sort in CW order
                 idx = cw_hedges.index(leftmost)
                 hedge = cw_hedges[(idx+1)%len(adj)]
                 face.overlay_data[other] = hedge.cycle.face
@@ -143,36 +348,33 @@ class DCEL(object):
             # this hedge is disjoint from any original edges, so find the rightmost visible to left
             #   of leftmost.)
 
-            visible_edge, visible_inter = self.get_rightmost_visible_edge(leftmost, other.edges)
+            if index is not None:
+                visible_hedge = index.visible_hedge(leftmost)
+            else:
+                if edge_coords is None:
+                    edge_coords = segment_array(other.edges)
+                visible_hedge = self.get_visible_hedge(leftmost, other.edges, edge_coords)
         
-            if visible_inter is None:
+            if visible_hedge is None:
                 face.overlay_data[other] = other.infinite_face
             else:
-                h1 = visible_edge.h1
-                h2 = visible_edge.h2
-
-                # swap h1,h2 so that h1.origin is not directly horizontal from leftmost
-                if visible_inter == h1.origin:
-                    h1, h2 = h2, h1
-
-                # if clockwise, h1 lies right of the leftward ray, so leftmost is left of h1
-                if cw(leftmost.origin, visible_inter, h1.origin):
-                    f = h1.cycle.face
-                # if ccw, h1 lies left of the leftward ray, so leftmost is right of h1
-                elif ccw(leftmost.origin, visible_inter, h1.origin):
-                    f = h2.cycle.face
-                else:
-                    ValueError('impossible case finding visible halfedge')
-
-                face.overlay_data[other] = f
+                face.overlay_data[other] = visible_hedge.cycle.face
             
-    def get_rightmost_visible_edge(self, leftmost, edge_set):
+    def get_rightmost_visible_edge(self, leftmost, edge_set, coords=None):
         '''given the leftmost halfedge of a boundary cycle and the edges of a DCEL, return
         the visible edge and the point on that edge that is closest on the left to the origin
-         of the given halfedge.'''
+         of the given halfedge. "coords" is the array segment_array(edge_set) (see kernel.py),
+         computed if not given; only the edges that the kernel finds on the horizontal
+         line through the origin, or cannot decide, are intersected exactly.'''
 
         line = Line(leftmost.origin, leftmost.origin.translate(-1,0))
-        inters = [ (e.intersect_line(line),e) for e in edge_set ]
+
+        if coords is None:
+            coords = segment_array(edge_set)
+        s_loc, _, _, fallback = intersect_line_many(coords, point_array([line.p1, line.p2]))
+        near = np.flatnonzero((s_loc == IntersLoc.ON.value) | fallback)
+
+        inters = [ (edge_set[i].intersect_line(line),edge_set[i]) for i in near ]
     
         visible_edge = None
         visible_inter = None
@@ -193,8 +395,51 @@ class DCEL(object):
                 if visible_inter < inter:
                     visible_edge, visible_inter = e,inter
 
+                # edges meeting at a vertex on the line: keep the one closest in angle to the
+                #   ray towards the origin, which bounds the wedge containing that ray
+                elif visible_inter == inter and self._closer_to_ray(inter, e, visible_edge):
+                    visible_edge = e
+
         return visible_edge, visible_inter
+
+    @staticmethod
+    def _closer_to_ray(v, e, f):
+        '''given two non-horizontal edges e and f with endpoint v, returns True if e is closer
+        than f in angle to the rightward ray from v, preferring edges above the ray'''
+        qe = e.p2 if e.p1 == v else e.p1
+        qf = f.p2 if f.p1 == v else f.p1
+        if qe.is_above(v) != qf.is_above(v):
+            return qe.is_above(v)
+        if qe.is_above(v):
+            return v.cw_key(qf) < v.cw_key(qe)
+        return v.cw_key(qe) < v.cw_key(qf)
     
+    def get_visible_hedge(self, leftmost, edge_set, coords=None):
+        '''given the leftmost halfedge of a boundary cycle and the edges of a DCEL, return
+        the halfedge of the rightmost visible edge to the left of the origin of leftmost
+        that lies on the face containing that origin, or None if no edge is visible.
+        "coords" is as in get_rightmost_visible_edge.'''
+        visible_edge, visible_inter = self.get_rightmost_visible_edge(leftmost, edge_set, coords)
+
+        if visible_inter is None:
+            return None
+
+        h1 = visible_edge.h1
+        h2 = visible_edge.h2
+
+        # swap h1,h2 so that h1.origin is not directly horizontal from leftmost
+        if visible_inter == h1.origin:
+            h1,h2 = h2,h1
+        
+        # if clockwise, h1 lies right of the leftward ray, so leftmost is left of h1
+        if cw(leftmost.origin, visible_inter, h1.origin):
+            return h1
+        # if ccw, h1 lies left of the leftward ray, so leftmost is right of h1
+        elif ccw(leftmost.origin, visible_inter, h1.origin):
+            return h2
+        else:
+            raise ValueError('impossible case finding visible halfedge')
+
     def get_leftmost_by_origin(self, a, b):
         '''given two halfedges, return the one whose origin is left, picking the higher
         of the two if both origins have same x-coordinate.'''
@@ -205,104 +450,102 @@ class DCEL(object):
         else:
             return a
 
-    def set_faces(self):
-        '''computes all faces and assigns each halfedge its incident face.'''
-        edges = self.edges
-        hedges = self.hedges
+    def trace_cycle(self, first, marked=None):
+        '''returns the BoundaryCycle containing the halfedge "first", adding
+        each of its halfedges to the set "marked" if one is given'''
+        fedges = []
 
-        marked = set()
-        infinite_face_outer = BoundaryCycle([], None, is_outer=True)
-        cycles = [infinite_face_outer]
-        
+        leftmost = first
+        curr = first
 
-        # iterate through all halfedges, marking them with the cycle that contains them
-        for e in hedges:
-            if e in marked:
-                continue
-
-            first = e
-            fedges = []
+        # traverse the cycle and find the halfedge with leftmost origin vertex
+        while True:
 
-            leftmost = first
-            curr = first
-
-            # traverse the cycle and find the halfedge with leftmost origin vertex
-            while (curr not in marked):
-
-                leftmost = self.get_leftmost_by_origin(leftmost, curr)
-                
+            leftmost = self.get_leftmost_by_origin(leftmost, curr)
+            
+            if marked is not None:
                 marked.add(curr)
-                fedges.append(curr)
-                curr = curr.nxt
-
+            fedges.append(curr)
+            curr = curr.nxt
 
-            # detect outer cycles as those oriented clockwise
-            is_outer = ccw(leftmost.prv.origin, leftmost.origin, leftmost.nxt.origin)
+            if curr is first:
+                break
 
-            cycle = BoundaryCycle(fedges, leftmost, is_outer)
-            cycles.append(cycle)
+        # detect outer cycles as those oriented clockwise. a cycle may pass through its leftmost
+        #   vertex several times, as along an edge with a free end, and is outer only if it
+        #   turns counterclockwise every time
+        v = leftmost.origin
+        is_outer = all(ccw(h.prv.origin, v, h.nxt.origin) for h in fedges if h.origin is v)
 
-            cycle.visible_hedge = None
+        return BoundaryCycle(fedges, leftmost, is_outer)
 
-            # for each inner cycle, find the rightmost visible halfedge from its leftmost vertex
-            if not is_outer:
+    def set_faces(self):
+        '''computes all faces and assigns each halfedge its incident face.
+        cycles and faces are numbered by their index attributes, and each inner cycle
+        finds its outer cycle through an array of parent indices with path compression.'''
+        edges = self.edges
+        hedges = self.hedges
 
-                visible_edge, visible_inter = self.get_rightmost_visible_edge(leftmost, edges)
+        # halfedges are marked by the cycle containing them, so clear any previous cycles
+        for e in hedges:
+            e.cycle = None
 
-                if visible_inter is None:
-                    cycle.parent = None
-                else:
-                    h1 = visible_edge.h1
-                    h2 = visible_edge.h2
-
-                    # swap h1,h2 so that h1.origin is not directly horizontal from leftmost
-                    if visible_inter == h1.origin:
-                        h1,h2 = h2,h1
-                    
-                    # if clockwise, h1 lies right of the leftward ray, so leftmost is left of h1
-                    if cw(leftmost.origin, visible_inter, h1.origin):
-                        cycle.visible_hedge = h1
-                    # if ccw, h1 lies left of the leftward ray, so leftmost is right of h1
-                    elif ccw(leftmost.origin, visible_inter, h1.origin):
-                        cycle.visible_hedge = h2
-                    else:
-                        raise ValueError('impossible case finding visible halfedge')
+        infinite_face_outer = BoundaryCycle([], None, is_outer=True)
+        cycles = [infinite_face_outer]
         
 
-        cycle_pairs = { c : [] for c in cycles if c.is_outer }
-        
-        # assign each cycle the cycle containing its visible halfedge
-        for cycle in cycles:
-            if not cycle.is_outer:
-                if cycle.visible_hedge is None:
-                    cycle.parent = infinite_face_outer
-                else:
-                    cycle.parent = cycle.visible_hedge.cycle
+        # iterate through all halfedges, marking them with the cycle that contains them
+        for e in hedges:
+            if e.cycle is not None:
+                continue
+
+            cycles.append(self.trace_cycle(e))
 
+        for i, cycle in enumerate(cycles):
+            cycle.index = i
 
-        for cycle in cycles:
+        # owner[i] is i for an outer cycle, and otherwise the index of its parent cycle,
+        #   which contains the rightmost visible halfedge from its leftmost vertex
+        owner = list(range(len(cycles)))
+        coords = None
+        for i, cycle in enumerate(cycles):
             if cycle.is_outer:
                 continue
 
-            # for each inner cycle, iterate through parent pointers
-            #   to find its outer cycle
+            if coords is None:
+                coords = segment_array(edges)
+            visible_hedge = self.get_visible_hedge(cycle.leftmost, edges, coords)
+            if visible_hedge is None:
+                cycle.parent = infinite_face_outer
+            else:
+                cycle.parent = visible_hedge.cycle
+            owner[i] = cycle.parent.index
+
+        def find_outer(i):
+            # follow parent indices to the outer cycle, pointing each visited cycle directly at it
+            root = i
+            while owner[root] != root:
+                root = owner[root]
+            while owner[i] != root:
+                owner[i], i = root, owner[i]
+            return root
 
-            curr = cycle
-            while not curr.is_outer:
-                curr = curr.parent
-            
-            cycle_pairs[curr].append(cycle)
-        
         faces = []
-        
-        for outer in cycle_pairs.keys():
-            # create Face objects with outer cycles and all inner cycles paired
-            inners = cycle_pairs[outer]
-            face = Face(outer, inners, dcel=self)
-            faces.append(face)
+        face_of = [None]*len(cycles)
+
+        # create Face objects with outer cycles, then pair each inner cycle with its outer cycle's face
+        for i, cycle in enumerate(cycles):
+            if cycle.is_outer:
+                face_of[i] = len(faces)
+                face = Face(cycle, [], dcel=self)
+                face.index = face_of[i]
+                faces.append(face)
 
-            if outer == infinite_face_outer:
-                self.infinite_face = face
+        for i, cycle in enumerate(cycles):
+            if not cycle.is_outer:
+                faces[face_of[find_outer(i)]].inners.append(cycle)
+
+        self.infinite_face = faces[0]
 
         for face in faces:
             # for convenience, add cross-pointers from hedges and cycles to their faces
@@ -319,7 +562,12 @@ class DCEL(object):
         self.faces = faces
 
     @classmethod
-    def from_points_segs(cls, points, segs):
+    def from_points_segs(cls, points, segs, verify=VERIFY_POINTERS, compute_faces=True):
+        '''returns a DCEL with the given points as vertices and the given non-crossing segments
+        as edges. "verify" is one of VERIFY_NONE, VERIFY_POINTERS, or VERIFY_FULL, where the last
+        also checks that no two segments cross, and the computed faces and boundary cycles.
+        if compute_faces is False, only the vertices, edges, and halfedges are linked, and
+        faces is None.'''
         
         p2v = {}
         adj = {}
@@ -349,48 +597,180 @@ class DCEL(object):
 
         # for each outgoing halfedge from Vertex v, set their prv and nxt pointers
         for v in verts:
-            cw_hedges = sorted(adj[v], key=lambda z: -v.angle(z.twin.origin)) # sort in CW order
-            deg = len(cw_hedges)
-            for i in range(deg):
-                cur = cw_hedges[i]
-                nxt = cw_hedges[(i+1)%deg]
-
-                cur.twin.nxt = nxt
-                nxt.prv = cur.twin
-            
-            adj[v] = cw_hedges
-            v.hedge = adj[v][0]
+            link_star(v, adj[v])
 
         dcel = cls(edges, hedges, verts)
-        
-        dcel.set_faces()
-        dcel.annotate_faces(dcel)
-        dcel.verify()
+
+        if compute_faces:
+            dcel.set_faces()
+            dcel.annotate_faces(dcel)
+
+        if verify > cls.VERIFY_NONE:
+            dcel.verify(verify_faces=compute_faces and verify >= cls.VERIFY_FULL)
+        if verify >= cls.VERIFY_FULL:
+            dcel.verify_planar()
 
         return dcel
+
+    @classmethod
+    def from_segments(cls, segs, verify=VERIFY_POINTERS, compute_faces=True):
+        '''returns the DCEL of the arrangement of the given segments, which may cross, touch and
+        overlap anywhere: its vertices are the endpoints of the segments and the points where
+        they meet, and its edges are the pieces of the segments between these points, where
+        overlapping pieces form a single edge. the segments are split in a single sweep (see
+        split_segments in red_blue.py), and "verify" and compute_faces are as in from_points_segs.'''
+        points, pieces = split_segments(segs)
+
+        # pieces shared by overlapping segments appear only once
+        segs = {}
+        for p, q in pieces:
+            key = frozenset((p, q))
+            if key not in segs:
+                segs[key] = Segment(p, q)
+
+        return cls.from_points_segs(points, list(segs.values()), verify, compute_faces)
     
 def naive_overlay_intersect(dcel1, dcel2):
-    inters = set()
-    for e1 in dcel1.edges:
-        for e2 in dcel2.edges:
-
-            inter = e1.intersect(e2)
-            if inter is not None:
-                inters.add(inter)
+    '''returns the set of points where edges of dcel1 meet edges of dcel2, testing every
+    pair of edges, in batches with the kernel where possible (see intersect_all in kernel.py)'''
+    return { inter for _, _, inter in intersect_all(dcel1.edges, dcel2.edges) }
+
+def sweep_overlay_intersect(dcels):
+    '''returns a dict mapping the id of each edge of the given DCELs to the set of points
+    where it meets edges of the other DCELs, found in a single Bentley-Ottmann sweep over the
+    edges of all of them (see sweep_segments in red_blue.py) in O((n+k) log n) expected time
+    for n edges meeting at k points. since edges of the same DCEL only meet at their
+    endpoints, every event in the interior of an edge is a point where another DCEL meets it.'''
+    edges = [ e for d in dcels for e in d.edges ]
+    splits = { id(e): set() for e in edges }
+    for p, _, passing in sweep_segments(edges):
+        for e in passing:
+            if p != e.p1 and p != e.p2:
+                splits[id(e)].add(p)
+
+    return splits
+
+def split_overlay_segments(dcels, engine='sweep', stats=None):
+    '''returns the vertices and edges of the overlay of the given DCELs as points and
+    segments, splitting each edge at every intersection in its interior, along with
+    the DCEL from which each segment originates. no DCEL is modified.
+    the intersections of two DCELs are found with the given engine (see overlay_intersect
+    in engine.py), and those of more DCELs with sweep_overlay_intersect.'''
+    if len(dcels) == 2:
+        _, splits = overlay_intersect(*dcels, engine=engine, stats=stats)
+    else:
+        splits = sweep_overlay_intersect(dcels)
+
+    points = {}
+    segs = {}
+    sources = {}
+    for d in dcels:
+        for e in d.edges:
+            # order the points along e from p1 to p2
+            chain = [e.p1] + sorted(splits[id(e)], reverse=e.p2 < e.p1) + [e.p2]
+            chain = [ points.setdefault(p, Point(p._x, p._y, p._w)) for p in chain ]
+
+            for p, q in zip(chain, chain[1:]):
+                # edges shared by several DCELs appear only once
+                key = frozenset((p, q))
+                if key not in segs:
+                    segs[key] = Segment(p, q)
+                    sources[key] = d
+
+    return list(points.values()), list(segs.values()), list(sources.values())
+
+def resolve_intersection(dcel, inter, edges):
+    '''given a point "inter" where edges of the improper dcel meet, and a list "edges"
+    containing every edge of dcel through inter, split or merge the edges and vertices
+    at inter so that they meet at a single vertex. if two vertices coincide at inter,
+    the one first incident to "edges" is kept.
+    returns the vertex at inter and the list of edges removed from dcel.'''
+
+    # get all segments containing inter
+    crossing_edges = [ e for e in edges if e.contains_interior_point(inter) ]
+    incident_edges = [ e for e in edges if e.p1 == inter or e.p2 == inter ]
+    
+    # two edges intersect
+    if len(incident_edges) == 0:   
+        assert(len(crossing_edges) == 2)
+        a,b = crossing_edges[:2]
+        v = edge_edge(dcel, inter, a, b)
+        return v, [a, b]
+
+    # the vertices at inter, by identity and in order of incidence
+    coinciding = []
+    for e in incident_edges:
+        v = e.p1 if e.p1 == inter else e.p2
+        if not any(v is c for c in coinciding):
+            coinciding.append(v)
+
+    # an edge crosses a vertex
+    if len(crossing_edges) == 1:
+        e = crossing_edges[0]
+        v = coinciding[0]
+        vertex_edge(dcel, v, incident_edges, e)
+        return v, [e]
+
+    # two vertices coincide
+    assert(len(crossing_edges) == 0)
+    assert(len(coinciding) == 2)
+    v1, v2 = coinciding[:2]
+    inc1, inc2 = [], []
+    for e in incident_edges:
+        if e.p1 is v1 or e.p2 is v1:
+            inc1.append(e)
+        else:
+            inc2.append(e)
 
-    return inters
+    vertex_vertex(dcel, v1, inc1, v2, inc2)
+    return v1, []
 
-def overlay(dcel1, dcel2, compute_faces=False):
+def overlay(dcel1, dcel2, compute_faces=False, copy=True, bulk=True, engine='sweep', stats=None):
     '''returns a DCEL which is the overlay of dcel1 and dcel2
-    NOTE: for simplicity, this implementation does not use the sweep-line technique
-    and has much higher asymptotic runtime.'''
+    The intersections of their edges are found with the given engine, which by default is
+    the red-blue sweep, or 'auto' to choose one by its estimated cost (see overlay_intersect
+    in engine.py).
+    If copy is False, neither DCEL is copied; instead, the overlay is built directly
+    from their edges split at all intersections, leaving both DCELs unchanged.
+    If bulk is True, each edge of the copies is split once at all of its intersections
+    and each vertex's halfedges are linked once (see split_edges in overlay_cases.py).
+    Collinear overlapping edges then form a single edge, as they do when copy is False.
+    If stats is a Stats object (see stats.py), the wall time of each phase (copy,
+    intersect, split, set_faces and annotate), the engine used and the number of intersections
+    are recorded.
+    NOTE: If bulk is False, for simplicity each intersection is resolved in turn by
+    scanning every edge, for a much higher asymptotic runtime, and collinear overlapping
+    edges are not merged, so their faces may be wrong.'''
     odcel1, odcel2 = dcel1, dcel2
 
-    dcel1 = dcel1.copy()
-    dcel2 = dcel2.copy()
+    if not copy:
+        with phase(stats, 'intersect'):
+            points, segs, sources = split_overlay_segments([dcel1, dcel2], engine, stats)
+        with phase(stats, 'split'):
+            ol_dcel = DCEL.from_points_segs(points, segs, compute_faces=False)
+
+        for e, source in zip(ol_dcel.edges, sources):
+            e.source = source
+
+        if compute_faces:
+            with phase(stats, 'set_faces'):
+                ol_dcel.set_faces()
+            with phase(stats, 'annotate'):
+                ol_dcel.annotate_faces(odcel1)
+                ol_dcel.annotate_faces(odcel2)
+
+        return ol_dcel
 
-    # find all intersections; ideally use line-sweep for large inputs
-    inters = naive_overlay_intersect(dcel1, dcel2)
+    with phase(stats, 'copy'):
+        dcel1 = dcel1.copy()
+        dcel2 = dcel2.copy()
+
+    # find all intersections, by default with a red-blue sweep
+    with phase(stats, 'intersect'):
+        inters, splits = overlay_intersect(dcel1, dcel2, engine=engine, stats=stats)
+
+    if stats is not None:
+        stats.count('overlay.intersections', len(inters))
 
     # combine copies of given dcels into a single one
     verts = dcel1.verts + dcel2.verts
@@ -402,51 +782,49 @@ def overlay(dcel1, dcel2, compute_faces=False):
     for h in hedges:
         h.face = None
 
-    # process each intersection between the given dcels
-    for inter in inters:
-        # get all segments containing inter
-        crossing_edges = list(filter(lambda e: e.contains_interior_point(inter), ol_dcel.edges))
-        incident_edges =  list(filter(lambda e: e.p1 == inter or e.p2 == inter, ol_dcel.edges))
+    for e in dcel1.edges:
+        e.source = odcel1
+    for e in dcel2.edges:
+        e.source = odcel2
 
-        if ol_dcel.VERIFY:
-            ol_dcel.verify()
-        
-        # two edges intersect
-        if len(incident_edges) == 0:   
-            assert(len(crossing_edges) == 2)
-            a,b = crossing_edges[:2]
-            edge_edge(ol_dcel, inter, a, b)
-
-        # an edge crosses a vertex
-        elif len(crossing_edges) == 1:
-            e = crossing_edges[0]
-            idx = verts.index(inter)
-            v = verts[idx]
-            vertex_edge(ol_dcel, v, incident_edges, e)
-
-        # two vertices coincide
+    with phase(stats, 'split'):
+        if bulk:
+            split_edges(ol_dcel, splits)
         else:
-            assert(len(crossing_edges) == 0)
-            coinciding = [ v for v in verts if v == inter ]
-            assert(len(coinciding) == 2)
-            v1, v2 = coinciding[:2]
-            inc1, inc2 = [], []
-            for e in incident_edges:
-                if e.p1 == v1 or e.p2 == v1:
-                    inc1.append(e)
-                else:
-                    inc2.append(e)
+            # process each intersection between the given dcels
+            for inter in inters:
+                if ol_dcel.VERIFY:
+                    ol_dcel.verify()
 
-            vertex_vertex(ol_dcel, v1, inc1, v2, inc2)
+                resolve_intersection(ol_dcel, inter, ol_dcel.edges)
 
     if compute_faces:
-        ol_dcel.set_faces()
-        ol_dcel.annotate_faces(odcel1)
-        ol_dcel.annotate_faces(odcel2)
+        with phase(stats, 'set_faces'):
+            ol_dcel.set_faces()
+        with phase(stats, 'annotate'):
+            ol_dcel.annotate_faces(odcel1)
+            ol_dcel.annotate_faces(odcel2)
+
+    return ol_dcel
+
+def overlay_many(dcels):
+    '''returns a DCEL which is the overlay of all of the given DCELs, with the intersections
+    between all of them found in a single sweep and the faces computed once. each face is
+    labelled in its overlay_data with the containing face of every given DCEL.
+    no DCEL is modified.'''
+    points, segs, sources = split_overlay_segments(dcels)
+    ol_dcel = DCEL.from_points_segs(points, segs)
+
+    for e, source in zip(ol_dcel.edges, sources):
+        e.source = source
+
+    for d in dcels:
+        ol_dcel.annotate_faces(d)
 
     return ol_dcel
 
 if __name__=='__main__':
+    plt = pyplot()
 
     verts = [
             Point(4,0),
@@ -1,3 +1,4 @@
+import random
 from primitives import *
 from dcel import DCEL
 
@@ -125,6 +126,32 @@ def vert_edge_test2():
 
     return poly1, poly2
 
+def seam_test():
+    '''a pair of dcels where a vertex of one touches an edge of the other from below, such
+    that the edge lies on the tile line of tiled_overlay(poly1, poly2, 1, 2)'''
+    verts = [
+        Point(0,2),
+        Point(6,2),
+        Point(6,4),
+        Point(0,4),
+    ]
+
+    edges = [ Segment(verts[i],verts[(i+1)%len(verts)]) for i in range(len(verts)) ]
+
+    poly1 = DCEL.from_points_segs(verts,edges)
+
+    verts = [
+        Point(2,0),
+        Point(4,0),
+        Point(3,2),
+    ]
+
+    edges = [ Segment(verts[i],verts[(i+1)%len(verts)]) for i in range(len(verts)) ]
+
+    poly2 = DCEL.from_points_segs(verts,edges)
+
+    return poly1, poly2
+
 def disconnected_test():
     '''a pair of dcels, one of which is connected, whose overlay has vertex-vertex
     and vertex-edge events'''
@@ -170,11 +197,9 @@ def disconnected_test():
     
     return dcel1, dcel2  
 
-def grid_lines_test():
-    '''a pair of disconnected DCELs, each 3 rectangles, which compose
+def grid_lines_test(n=3, m=3):
+    '''a pair of disconnected DCELs, of n tall and m wide rectangles, which compose
     a grid-like shape when overlayed'''
-    n = 3
-    m = 3
     rowpts = []
     rowedges = []
     colpts = []
@@ -287,3 +312,129 @@ def rectangle(x1,y1,x2,y2):
 
     dcel = DCEL.from_points_segs(verts, edges)
     return dcel
+
+# seeded generators of large maps, which return the points and segments of a planar
+#   subdivision filling roughly the square [0,size]^2, to be passed to DCEL.from_points_segs.
+#   without jitter, every coordinate is even, so that a copy shifted by an odd amount shares
+#   no vertex or collinear edge with the original.
+
+def _jitter(rng, d):
+    return rng.randint(-d, d) if d > 0 else 0
+
+def grid_map(n, m, size=2*10**6, jitter=0.0, seed=None):
+    '''the points and segments of a map of n by m rectangular cells sharing their vertices.
+    each vertex is moved by up to "jitter" times the cell size in each direction, which
+    must be less than 1/4 to keep the cells simple.'''
+    assert(jitter < 0.25)
+    rng = random.Random(seed)
+    cw, ch = 2*(size//(2*n)), 2*(size//(2*m))
+    jx, jy = int(jitter*cw), int(jitter*ch)
+
+    points = [ Point(i*cw + _jitter(rng, jx), j*ch + _jitter(rng, jy)) for j in range(m+1) for i in range(n+1) ]
+    at = lambda i, j: points[j*(n+1)+i]
+
+    segs = [ Segment(at(i,j), at(i+1,j)) for j in range(m+1) for i in range(n) ]
+    segs.extend(Segment(at(i,j), at(i,j+1)) for j in range(m) for i in range(n+1))
+    return points, segs
+
+def honeycomb_map(n, m, size=2*10**6, jitter=0.2, seed=None):
+    '''the points and segments of a Voronoi-like map of n by m cells, laid out as bricks in
+    rows with alternating offsets, so that interior vertices have degree 3 and interior
+    cells have 6 vertices. each vertex is moved by up to "jitter" times the height of a row
+    in each direction, which must be less than 1/4 to keep the cells simple.'''
+    assert(jitter < 0.25)
+    rng = random.Random(seed)
+    ux, uy = 2*(size//(4*n)), 2*(size//(2*m))
+    jx, jy = int(jitter*min(ux, uy)), int(jitter*min(ux, uy))
+
+    # a lattice of 2n by m units, with each brick 2 units wide
+    points = [ Point(i*ux + _jitter(rng, jx), j*uy + _jitter(rng, jy)) for j in range(m+1) for i in range(2*n+1) ]
+    at = lambda i, j: points[j*(2*n+1)+i]
+
+    segs = [ Segment(at(i,j), at(i+1,j)) for j in range(m+1) for i in range(2*n) ]
+    for j in range(m):
+        walls = set(range(j % 2, 2*n+1, 2)) | {0, 2*n}
+        segs.extend(Segment(at(i,j), at(i,j+1)) for i in sorted(walls))
+    return points, segs
+
+def nested_holes_map(n, depth, size=2*10**6):
+    '''the points and segments of a square containing n by n holes, each of which is the
+    outermost of "depth" nested squares, for n*n*depth inner cycles'''
+    q = max(1, size//(4*n*(depth+1)))
+    slot = 4*(depth+1)*q
+
+    points, segs = [], []
+    def square(cx, cy, h):
+        corners = [ Point(cx-h, cy-h), Point(cx+h, cy-h), Point(cx+h, cy+h), Point(cx-h, cy+h) ]
+        points.extend(corners)
+        segs.extend(Segment(corners[i], corners[(i+1)%4]) for i in range(4))
+
+    square(n*slot//2, n*slot//2, n*slot//2)
+    for i in range(n):
+        for j in range(n):
+            for k in range(depth):
+                square(i*slot + slot//2, j*slot + slot//2, 2*q*(depth-k))
+    return points, segs
+
+def sliver_map(n, size=2*10**6, slant=None):
+    '''the points and segments of a square cut into long thin slivers by parallel segments
+    from the i-th of n+1 evenly spaced points on its bottom side to the (i+slant)-th on its
+    top side, by default with slant n//2. every sliver is a parallelogram, except for a
+    triangle at each end.'''
+    slant = max(1, n//2) if slant is None else slant
+    assert(1 <= slant < n)
+    w = 2*(size//(2*n))
+    h = n*w
+
+    bottom = [ Point(i*w, 0) for i in range(n-slant+1) ] + [ Point(h, 0) ]
+    top = [ Point(0, h) ] + [ Point(i*w, h) for i in range(slant, n+1) ]
+
+    segs = [ Segment(a, b) for a, b in zip(bottom, bottom[1:]) ]
+    segs.extend(Segment(a, b) for a, b in zip(top, top[1:]))
+    segs.append(Segment(bottom[-1], top[-1]))
+    segs.append(Segment(top[0], bottom[0]))
+    segs.extend(Segment(bottom[i], top[i+1]) for i in range(n-slant+1))
+    return bottom + top, segs
+
+MAPS = {
+    'grid': lambda n, size, seed: grid_map(n, n, size, jitter=0.1, seed=seed),
+    'honeycomb': lambda n, size, seed: honeycomb_map(n, 2*n, size, seed=seed),
+    'holes': lambda n, size, seed: nested_holes_map(n, 2, size),
+    'slivers': lambda n, size, seed: sliver_map(n, size),
+}
+
+def transposed(points, segs, shift=1):
+    '''the given points and segments reflected in the line y=x and shifted by "shift" in each direction'''
+    moved = { id(p): Point(p._y + shift*p._w, p._x + shift*p._w, p._w) for p in points }
+    return list(moved.values()), [ Segment(moved[id(s.p1)], moved[id(s.p2)]) for s in segs ]
+
+def estimate_crossings(segs1, segs2, area):
+    '''estimates the number of points where segs1 and segs2 meet if each spreads evenly over
+    the same region of the given area, from the total lengths of their horizontal and
+    vertical extents'''
+    def extents(segs):
+        dx = sum(abs(s.p2.x() - s.p1.x()) for s in segs)
+        dy = sum(abs(s.p2.y() - s.p1.y()) for s in segs)
+        return dx, dy
+
+    (h1, v1), (h2, v2) = extents(segs1), extents(segs2)
+    return (h1*v2 + v1*h2)/area
+
+def map_pair(kind, n, k, seed=None, size=2*10**6, compute_faces=False):
+    '''returns two DCELs to overlay, each a map of the given kind (a key of MAPS), where
+    the first has resolution n and the second is transposed and shifted, with its
+    resolution chosen so that they meet at about k points. their faces, which finding the
+    visible edge of each inner cycle makes superlinear to compute, are only computed if
+    compute_faces is set, as needed to label the faces of their overlay.'''
+    make = MAPS[kind]
+    points1, segs1 = make(n, size, seed)
+
+    # the number of crossings grows linearly in the resolution of either map
+    _, probe = make(n, size, None if seed is None else seed+1)
+    estimate = estimate_crossings(segs1, probe, float(size)**2)
+    n2 = max(2, round(n*k/max(estimate, 1)))
+
+    points2, segs2 = transposed(*make(n2, size, None if seed is None else seed+1))
+
+    return (DCEL.from_points_segs(points1, segs1, compute_faces=compute_faces),
+            DCEL.from_points_segs(points2, segs2, compute_faces=compute_faces))
@@ -1,14 +1,14 @@
-import matplotlib.pyplot as plt
 from primitives import *
-from matplotlib.patches import Polygon
 
 class Edge(Segment):
     '''a class representing an edge of a DCEL, as a subclass of Segment
     for arbitrary precision.
     
     Attributes:
-        h1  The first Halfedge of this edge, pointing from p1 to p2
-        h2  The second Halfedge of this edge, pointing from p2 to p1
+        h1      The first Halfedge of this edge, pointing from p1 to p2
+        h2      The second Halfedge of this edge, pointing from p2 to p1
+        source  The DCEL whose edge contains this edge, if this edge
+                    belongs to an overlay (None otherwise)
 
     Inherited from Segment:
         p1
@@ -22,6 +22,7 @@ class Edge(Segment):
     def __init__(self, p1, p2):
         super().__init__(p1, p2)
         self.h1, self.h2 = Halfedge.from_edge(self)
+        self.source = None
 
     def pointing_from(self, point):
         '''given a point that is either endpoint of this edge, return the halfedge
@@ -101,10 +102,11 @@ class Halfedge(object):
         h1 = Point(head.x()+r*math.cos(math.pi+rad-shift), head.y()+r*math.sin(math.pi+rad-shift))
         return Segment(t1,h1)
     
-    def draw(self, draw_prv=False, fig=plt):
+    def draw(self, draw_prv=False, fig=None):
         '''draws this this Halfedge, shifted slightly left into its incident face.
         If draw_prv is True, then purple arrowed segments are drawn from this Halfedge
         to its previous Halfedge on its incident face.'''
+        fig = get_fig(fig)
         s = self.get_drawable()
         t1 = s.p1
         h1 = s.p2
@@ -143,7 +145,7 @@ class Vertex(Point):
         super().__init__(x,y,w)
         self.hedge = hedge
 
-    def draw(self, fig=plt):
+    def draw(self, fig=None):
         Circle.by_radius(self, 0.15).draw(fig=fig)
 
     @classmethod
@@ -160,14 +162,19 @@ class Face(object):
         overlay_data    A dict to store the faces of overlayed DCELs
                             that contain this face     
         dcel            The DCEL object of which this face belongs
+        index           The position of this face in its DCEL's faces,
+                            if numbered by DCEL.set_faces (None otherwise)
     '''
     def __init__(self, outer, inners=[], dcel=None):
         self.outer = outer        
         self.inners = inners
         self.overlay_data = {}
         self.dcel = dcel
+        self.index = None
 
-    def draw(self, fig=plt):
+    def draw(self, fig=None):
+        from matplotlib.patches import Polygon
+        fig = get_fig(fig)
 
         # TODO: Replace with a better coloring scheme?
         bounded = list(filter(lambda x: self.overlay_data[x] != x.infinite_face, self.overlay_data.keys()))
@@ -199,14 +206,37 @@ class BoundaryCycle(object):
         parent      The boundary cycle visible directly left of
                         this cycle's leftmost vertex
         leftmost    The leftmost Halfedge of this cycle
+        index       A dense integer id of this cycle among its DCEL's cycles,
+                        if numbered by DCEL.set_faces (None otherwise)
     '''
     def __init__(self, hedges, leftmost, is_outer):
         self.hedges = tuple(hedges)
         self.is_outer = is_outer
         self.parent = None
         self.leftmost = leftmost
+        self.index = None
         for h in hedges:
             h.cycle = self
 
-    def __hash__(self):
-        return self.hedges.__hash__()
\ No newline at end of file
+def outgoing(v):
+    '''returns the halfedges directed away from vertex v, in clockwise order'''
+    hedges = [v.hedge]
+    h = v.hedge.twin.nxt
+    while h is not v.hedge:
+        hedges.append(h)
+        h = h.twin.nxt
+    return hedges
+
+def link_star(v, hedges):
+    '''given the halfedges directed away from vertex v, set their twins' nxt pointers
+    and their prv pointers in clockwise order around v'''
+    cw_hedges = sorted(hedges, key=lambda z: v.cw_key(z.twin.origin)) # sort in CW order
+    deg = len(cw_hedges)
+    for i in range(deg):
+        cur = cw_hedges[i]
+        nxt = cw_hedges[(i+1)%deg]
+
+        cur.twin.nxt = nxt
+        nxt.prv = cur.twin
+
+    v.hedge = cw_hedges[0]
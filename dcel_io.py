@@ -0,0 +1,306 @@
+import mmap
+import struct
+import sys
+from array import array
+from primitives import *
+from dcel_helpers import *
+from dcel import DCEL
+
+# binary layout of a DCEL, all integers little-endian:
+#   header      MAGIC, version, flags, then the counts in HEADER_FMT
+#   coords      int64[3*nverts] if FIXED_COORDS is set, float64[3*nverts] if FLOAT_COORDS is
+#                   set, otherwise uint64 offsets[3*nverts+1] into a blob of signed
+#                   variable-length integers
+#   vhedge      int64[nverts]           an outgoing halfedge of each vertex
+#   ehedges     int64[2*nedges]         (h1, h2) of each edge
+#   sources     int64[nedges]           layer of the source of each edge
+#   hedges      int64[4*nhedges]        (origin, twin, nxt, prv) of each halfedge
+#   cycles      int64[4*ncycles]        (leftmost, is_outer, face, parent) of each cycle
+#   faces       int64[3*nfaces]         (outer cycle, first inner, number of inners) of each face
+#   inners      int64[ninners]          inner cycles of all faces, concatenated
+#   labels      int64[nfaces*nlayers]   face of each layer containing each face
+# every section starts at a multiple of 8 bytes, and missing references are stored as -1.
+
+MAGIC = b'DCEL'
+VERSION = 2
+FIXED_COORDS = 1
+FLOAT_COORDS = 2
+
+HEADER_FMT = '<4sIIqqqqqqqq'
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+
+INT64_MIN = -2**63
+INT64_MAX = 2**63-1
+
+def _pad(n):
+    return (n + 7) & ~7
+
+def _int64s(values):
+    a = array('q', values)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a.tobytes()
+
+def _float64s(values):
+    a = array('d', values)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a.tobytes()
+
+def _read_int64s(buf, offset, n, typecode='q'):
+    '''returns a view of n int64s (or float64s, for typecode 'd') starting at offset,
+    without copying where possible'''
+    view = memoryview(buf)[offset:offset+8*n]
+    if sys.byteorder == 'little':
+        return view.cast(typecode)
+    a = array(typecode, view)
+    a.byteswap()
+    return a
+
+def _cycles_of(dcel):
+    '''returns the boundary cycles of dcel's faces, in order of their faces'''
+    cycles = []
+    if dcel.faces is not None:
+        for f in dcel.faces:
+            cycles.append(f.outer)
+            cycles.extend(f.inners)
+    return cycles
+
+def to_bytes(dcel, layers=()):
+    '''serialize a DCEL into a bytes object. "layers" is a list of DCELs whose faces
+    may appear in the overlay_data of this DCEL's faces, and which may be the sources
+    of its edges; labels referring to this DCEL itself are always recorded, while labels
+    and sources referring to any other DCEL are lost.
+    a DCEL with float coordinates, such as one with rotated points, is stored in float64;
+    raises ValueError if it also has integer coordinates that no float64 represents.'''
+    layers = [dcel] + list(layers)
+
+    vidx = { id(v): i for i,v in enumerate(dcel.verts) }
+    hidx = { id(h): i for i,h in enumerate(dcel.hedges) }
+    cycles = _cycles_of(dcel)
+    cidx = { id(c): i for i,c in enumerate(cycles) }
+    faces = dcel.faces if dcel.faces is not None else []
+    fidx = { id(f): i for i,f in enumerate(faces) }
+    lfidx = [ { id(f): i for i,f in enumerate(l.faces or []) } for l in layers ]
+
+    coords = [ c for v in dcel.verts for c in (v._x, v._y, v._w) ]
+    floats = any(isinstance(c, float) for c in coords)
+    fixed = not floats and all(INT64_MIN <= c <= INT64_MAX for c in coords)
+
+    if floats:
+        if any(float(c) != c for c in coords if not isinstance(c, float)):
+            raise ValueError('cannot store float and large integer coordinates together')
+        coord_bytes = _float64s(coords)
+    elif fixed:
+        coord_bytes = _int64s(coords)
+    else:
+        blobs = [ c.to_bytes((c.bit_length()+8)//8, 'little', signed=True) for c in coords ]
+        offsets = [0]
+        for b in blobs:
+            offsets.append(offsets[-1]+len(b))
+        coord_bytes = _int64s(offsets) + b''.join(blobs)
+
+    vhedge = [ hidx.get(id(v.hedge), -1) for v in dcel.verts ]
+    ehedges = [ hidx[id(h)] for e in dcel.edges for h in (e.h1, e.h2) ]
+    lidx = { id(l): i for i,l in enumerate(layers) }
+    sources = [ lidx.get(id(e.source), -1) for e in dcel.edges ]
+
+    hedges = []
+    for h in dcel.hedges:
+        hedges.extend((
+            vidx[id(h.origin)],
+            hidx[id(h.twin)],
+            hidx.get(id(h.nxt), -1),
+            hidx.get(id(h.prv), -1),
+        ))
+
+    crecs = []
+    for c in cycles:
+        crecs.extend((
+            -1 if c.leftmost is None else hidx[id(c.leftmost)],
+            int(c.is_outer),
+            fidx[id(c.face)],
+            cidx.get(id(c.parent), -1),
+        ))
+
+    frecs = []
+    inners = []
+    labels = []
+    for f in faces:
+        frecs.extend((cidx[id(f.outer)], len(inners), len(f.inners)))
+        inners.extend(cidx[id(c)] for c in f.inners)
+        for l, idx in zip(layers, lfidx):
+            g = f.overlay_data.get(l)
+            labels.append(-1 if g is None else idx[id(g)])
+
+    infinite = fidx.get(id(dcel.infinite_face), -1)
+
+    flags = FLOAT_COORDS if floats else FIXED_COORDS if fixed else 0
+    header = struct.pack(HEADER_FMT, MAGIC, VERSION, flags,
+                         len(dcel.verts), len(dcel.edges), len(dcel.hedges), len(cycles),
+                         len(faces), len(inners), len(layers), infinite)
+
+    out = bytearray(header)
+    for section in (coord_bytes, _int64s(vhedge), _int64s(ehedges), _int64s(sources), _int64s(hedges),
+                    _int64s(crecs), _int64s(frecs), _int64s(inners), _int64s(labels)):
+        out.extend(b'\0'*(_pad(len(out))-len(out)))
+        out.extend(section)
+
+    return bytes(out)
+
+def from_buffer(buf, layers=()):
+    '''construct a DCEL from a buffer produced by to_bytes, without recomputing
+    any topology. "layers" must list the same DCELs given to to_bytes; if it is
+    empty, labels of the other layers are stored in overlay_data with the layer's
+    position as key and the face's index within that layer as value, and the source
+    of each edge is the position of its layer.'''
+    magic, version, flags, nv, ne, nh, nc, nf, ni, nl, infinite = struct.unpack_from(HEADER_FMT, buf, 0)
+
+    if magic != MAGIC:
+        raise ValueError('not a serialized DCEL')
+    if version != VERSION:
+        raise ValueError('unsupported DCEL format version ' + str(version))
+
+    offset = _pad(HEADER_SIZE)
+
+    if flags & FIXED_COORDS:
+        coords = _read_int64s(buf, offset, 3*nv)
+        offset = _pad(offset + 24*nv)
+    elif flags & FLOAT_COORDS:
+        coords = _read_int64s(buf, offset, 3*nv, 'd')
+        offset = _pad(offset + 24*nv)
+    else:
+        offsets = _read_int64s(buf, offset, 3*nv+1)
+        start = offset + 8*(3*nv+1)
+        blob = memoryview(buf)[start:start+offsets[-1]]
+        coords = [ int.from_bytes(blob[offsets[i]:offsets[i+1]], 'little', signed=True) for i in range(3*nv) ]
+        offset = _pad(start + offsets[-1])
+
+    def section(n):
+        nonlocal offset
+        a = _read_int64s(buf, offset, n)
+        offset = _pad(offset + 8*n)
+        return a
+
+    vhedge = section(nv)
+    ehedges = section(2*ne)
+    srecs = section(ne)
+    hrecs = section(4*nh)
+    crecs = section(4*nc)
+    frecs = section(3*nf)
+    irecs = section(ni)
+    lrecs = section(nf*nl)
+
+    verts = [ Vertex(coords[3*i], coords[3*i+1], coords[3*i+2]) for i in range(nv) ]
+
+    hedges = [None]*nh
+    edges = []
+    for i in range(ne):
+        i1, i2 = ehedges[2*i], ehedges[2*i+1]
+        e = Edge(verts[hrecs[4*i1]], verts[hrecs[4*i2]])
+        hedges[i1], hedges[i2] = e.h1, e.h2
+        edges.append(e)
+
+    for i,h in enumerate(hedges):
+        h.origin = verts[hrecs[4*i]]
+        n, p = hrecs[4*i+2], hrecs[4*i+3]
+        h.nxt = None if n < 0 else hedges[n]
+        h.prv = None if p < 0 else hedges[p]
+
+    for i,v in enumerate(verts):
+        v.hedge = None if vhedge[i] < 0 else hedges[vhedge[i]]
+
+    dcel = DCEL(edges, hedges, verts)
+
+    # restore the sources of the edges, with this DCEL as the first layer
+    for e, j in zip(edges, srecs):
+        if j < 0:
+            continue
+        if j == 0:
+            e.source = dcel
+        elif len(layers) > 0:
+            e.source = layers[j-1]
+        else:
+            e.source = j-1
+
+    if nf == 0:
+        return dcel
+
+    # collect each cycle's halfedges by walking from its leftmost halfedge
+    cycles = []
+    for i in range(nc):
+        l = crecs[4*i]
+        if l < 0:
+            cycle = BoundaryCycle([], None, bool(crecs[4*i+1]))
+        else:
+            leftmost = hedges[l]
+            chedges = [leftmost]
+            curr = leftmost.nxt
+            while curr is not leftmost:
+                chedges.append(curr)
+                curr = curr.nxt
+            cycle = BoundaryCycle(chedges, leftmost, bool(crecs[4*i+1]))
+        cycles.append(cycle)
+
+    for i,c in enumerate(cycles):
+        p = crecs[4*i+3]
+        c.parent = None if p < 0 else cycles[p]
+
+    faces = []
+    for i in range(nf):
+        o, first, count = frecs[3*i], frecs[3*i+1], frecs[3*i+2]
+        inners = [ cycles[irecs[j]] for j in range(first, first+count) ]
+        face = Face(cycles[o], inners, dcel=dcel)
+        for c in [face.outer] + inners:
+            c.face = face
+            for h in c.hedges:
+                h.face = face
+        faces.append(face)
+
+    dcel.faces = faces
+    dcel.infinite_face = None if infinite < 0 else faces[infinite]
+
+    # restore overlay labels, with this DCEL as the first layer
+    for i,f in enumerate(faces):
+        for j in range(nl):
+            g = lrecs[i*nl+j]
+            if g < 0:
+                continue
+            if j == 0:
+                f.overlay_data[dcel] = faces[g]
+            elif len(layers) > 0:
+                f.overlay_data[layers[j-1]] = layers[j-1].faces[g]
+            else:
+                f.overlay_data[j-1] = g
+
+    return dcel
+
+def save(dcel, path, layers=()):
+    '''write a DCEL to the file at path in the binary format of to_bytes'''
+    with open(path, 'wb') as f:
+        f.write(to_bytes(dcel, layers))
+
+def load(path, layers=()):
+    '''read a DCEL written by save, mapping the file into memory rather than reading it'''
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return from_buffer(mm, layers)
+
+if __name__=='__main__':
+    from dcel import overlay
+    from dcel_datasets import grid_lines_test
+
+    # labels and edge sources survive a round trip, so the loaded overlay can be edited
+    d1, d2 = grid_lines_test()
+    ol = from_buffer(to_bytes(overlay(d1, d2, compute_faces=True), [d1, d2]), [d1, d2])
+    ol.verify(verify_faces=True)
+    assert all(e.source is d1 or e.source is d2 for e in ol.edges)
+    assert all(f.overlay_data[d1] in d1.faces and f.overlay_data[d2] in d2.faces for f in ol.faces)
+
+    # rotated points have float coordinates
+    points = { v: v.rotate(0.3, Point(0,0)) for v in d1.verts }
+    rotated = DCEL.from_points_segs(list(points.values()), [ Segment(points[e.p1], points[e.p2]) for e in d1.edges ])
+    loaded = from_buffer(to_bytes(rotated))
+    loaded.verify(verify_faces=True)
+    assert [ v.p() for v in loaded.verts ] == [ v.p() for v in rotated.verts ]
+    print('ok')
@@ -1,3 +1,4 @@
+import matplotlib.pyplot as plt
 from primitives import *
 from dcel import DCEL, naive_overlay_intersect
 
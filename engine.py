@@ -0,0 +1,427 @@
+import math
+import random
+from fractions import Fraction
+import numpy as np
+from primitives import *
+from stats import phase
+from kernel import BOUND, BLOCK, PARALLEL, segment_array, orient_signs, intersect_many, param_point
+from sweep_line import SweepLine, naive_seg_inter
+from red_blue import red_blue_intersections
+
+# selection of an engine for finding segment intersections by a cost model. the engines are
+#   naive       tests every pair of segments with Segment.intersect
+#   vectorized  tests every pair of segments in batches with the int64 kernel (see kernel.py)
+#   grid        buckets the bounding boxes of the segments in a uniform grid, and tests the
+#                   pairs sharing a cell in batches with the kernel
+#   sweep       a plane sweep: SweepLine for a single set of segments in general position,
+#                   or the red-blue sweep (see red_blue.py) for the edges of two DCELs
+#   the cost of each is estimated from a sample of the input, and the cheapest one is run.
+
+ENGINES = ('naive', 'vectorized', 'grid', 'sweep')
+
+# estimated seconds per unit of work, measured on random segments and the maps of
+#   dcel_datasets.py: a pair tested exactly, a pair tested in the kernel, a segment converted
+#   to arrays, a cell covered by the bounding box of a segment, a pair sharing a cell, an
+#   intersection point built from the kernel, an endpoint and an intersection event of
+#   SweepLine per level of its tree, and an event of the red-blue sweep per level
+COST_EXACT_PAIR = 6e-6
+COST_KERNEL_PAIR = 1e-7
+COST_SEGMENT = 2e-6
+COST_INCIDENCE = 1e-7
+COST_CELL_PAIR = 3e-7
+COST_POINT = 4.5e-6
+COST_EVENT = 4e-6
+COST_INTER_EVENT = 2.2e-5
+COST_RED_BLUE_EVENT = 6e-6
+
+# the number of pairs of segments tested when estimating the number of intersections, the
+#   number of those tested exactly, and the number of segments of each set whose bounding
+#   boxes are bucketed to estimate the work of the grid engine
+SAMPLE_PAIRS = 2**16
+SAMPLE_EXACT = 1000
+SAMPLE_SEGMENTS = 1000
+
+class Plan(object):
+    '''the engine chosen for finding the intersections of a set of segments, or between two
+    sets of segments, and the estimates it was chosen by.
+
+    Attributes:
+        engine      The name of the chosen engine, one of ENGINES
+        costs       The estimated time in seconds of each engine considered, where the sweep
+                        is left out for a single set of segments not in general position
+        n           The number of segments in each set, as a pair
+        k           The estimated number of pairs of segments that meet
+        exact       The estimated fraction of pairs tested exactly rather than in the kernel
+        lengths     The median, 90th percentile and largest of the sampled segment lengths,
+                        as fractions of the diagonal of the bounding box of all segments
+        cells       The number of grid cells along each side chosen for the grid engine
+    '''
+
+    def __init__(self, engine, costs=None, n=(0, 0), k=0, exact=0.0, lengths=(0.0, 0.0, 0.0), cells=1):
+        self.engine = engine
+        self.costs = {} if costs is None else costs
+        self.n = n
+        self.k = k
+        self.exact = exact
+        self.lengths = lengths
+        self.cells = cells
+
+    @property
+    def cost(self):
+        '''the estimated time in seconds of the chosen engine, or None if it was not estimated'''
+        return self.costs.get(self.engine)
+
+    def __str__(self):
+        lines = ['engine %s, n = %s, k ~ %d, exact %.3f, lengths %s, cells %d' % (
+            self.engine, self.n, self.k, self.exact, ' '.join('%.3g' % l for l in self.lengths), self.cells)]
+        for name, cost in sorted(self.costs.items(), key=lambda t: t[1]):
+            lines.append('%-12s %.4fs' % (name, cost))
+        return '\n'.join(lines)
+
+def meeting_points(a, b, overlaps=False):
+    '''returns the list of points where segments a and b meet, as found by a.intersect(b). If
+    overlaps is True, for collinear segments this is instead the endpoints of either lying
+    on the other, so that overlapping and touching collinear segments are also found.'''
+    p = a.intersect(b)
+    if p is not None:
+        return [p]
+    if not overlaps or not (collinear(a.p1, a.p2, b.p1) and collinear(a.p1, a.p2, b.p2)):
+        return []
+
+    # endpoints shared by both segments are only reported once
+    points = {}
+    for s, t in ((a, b), (b, a)):
+        for p in (t.p1, t.p2):
+            if s.contains_point(p):
+                points.setdefault(p, p)
+    return list(points.values())
+
+def float_boxes(segs, a):
+    '''returns an array of shape (n,2,2) of the lower-left and upper-right corners of the
+    bounding boxes of the given segments as floats, given their kernel array a'''
+    coords = a.astype(float)
+    for i in np.flatnonzero((a == BOUND).all(axis=2).any(axis=1)):
+        coords[i] = segs[i].p1.p(), segs[i].p2.p()
+    return np.stack([coords.min(axis=1), coords.max(axis=1)], axis=1)
+
+def cell_ranges(boxes, origin, size, cells):
+    '''returns the arrays (lo, hi) of shape (n,2) of the columns and rows of the first and last
+    cells overlapped by each box in the array "boxes" of shape (n,2,2), in the grid of cells by
+    cells rectangles covering the rectangle at origin of the given size. cells are found in
+    floating point, where rounding is monotone, so two boxes sharing a point always share
+    the cell of its rounded coordinates.'''
+    scale = cells / np.maximum(size, 1e-300)
+    lo = np.clip(np.floor((boxes[:,0] - origin)*scale), 0, cells-1).astype(np.int64)
+    hi = np.clip(np.floor((boxes[:,1] - origin)*scale), 0, cells-1).astype(np.int64)
+    return lo, hi
+
+def incidences(boxes, origin, size, cells):
+    '''returns the arrays (idx, cell) with an entry for each box in the array "boxes" and each
+    cell it overlaps (see cell_ranges), where cells are numbered by column and then row'''
+    lo, hi = cell_ranges(boxes, origin, size, cells)
+
+    width = hi - lo + 1
+    counts = width[:,0]*width[:,1]
+    idx = np.repeat(np.arange(len(boxes)), counts)
+    local = np.arange(len(idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    col = lo[idx,0] + local % width[idx,0]
+    row = lo[idx,1] + local // width[idx,0]
+    return idx, col*cells + row
+
+def cell_pairs(idx, cell):
+    '''returns the arrays (left, right) of the entries of idx sharing a cell, once for each
+    pair of positions within a cell'''
+    order = np.argsort(cell, kind='stable')
+    idx, cell = idx[order], cell[order]
+
+    # the end of the run of each cell, for each position
+    bounds = np.flatnonzero(np.diff(cell)) + 1
+    ends = np.repeat(np.append(bounds, len(cell)), np.diff(np.concatenate([[0], bounds, [len(cell)]])))
+
+    after = ends - np.arange(len(cell)) - 1
+    left = np.repeat(np.arange(len(cell)), after)
+    right = left + 1 + np.arange(len(left)) - np.repeat(np.cumsum(after) - after, after)
+    return idx[left], idx[right]
+
+def grid_candidates(boxes1, boxes2, cells):
+    '''returns the sorted arrays (I, J) of the distinct pairs of indices of boxes1 and boxes2
+    that share a cell of a grid of cells by cells rectangles over their bounding box. If
+    boxes2 is None, these are the pairs i < j of boxes1.'''
+    boxes = boxes1 if boxes2 is None else np.concatenate([boxes1, boxes2])
+    origin = boxes[:,0].min(axis=0)
+    size = boxes[:,1].max(axis=0) - origin
+
+    left, right = cell_pairs(*incidences(boxes, origin, size, cells))
+    lo, hi = np.minimum(left, right), np.maximum(left, right)
+
+    if boxes2 is None:
+        m = len(boxes1)
+        codes = np.unique(lo*m + hi)
+        return codes // m, codes % m
+
+    # pairs of one box from each set
+    n, m = len(boxes1), len(boxes2)
+    keep = (lo < n) & (hi >= n)
+    codes = np.unique(lo[keep]*m + hi[keep] - n)
+    return codes // m, codes % m
+
+def _masks(s, t, overlaps):
+    '''returns the arrays (hit, exact, den, t_num) for the pairs of segments with endpoints in
+    the coordinate arrays s and t, broadcast together, where hit masks pairs meeting at a
+    single point in the kernel, and exact masks pairs to be tested with meeting_points'''
+    s_loc, t_loc, den, t_num, fallback = intersect_many(s, t)
+    on = IntersLoc.ON.value
+    hit = (s_loc == on) & (t_loc == on)
+    exact = fallback
+    if overlaps:
+        # parallel pairs on the same line
+        exact = fallback | ((s_loc == PARALLEL) & (orient_signs(s[...,0,:], s[...,1,:], t[...,0,:]) == 0))
+    return hit, exact, den, t_num
+
+def _triples(segs1, segs2, hits, exact, overlaps):
+    '''returns the triples (i, j, p) for the arrays hits = (I, J, den, t_num) of pairs meeting in
+    the kernel and exact = (I, J) of pairs to be tested with meeting_points'''
+    res = [ (i, j, param_point(segs1[i], d, t)) for i, j, d, t in zip(*(x.tolist() for x in hits)) ]
+    for i, j in zip(*(x.tolist() for x in exact)):
+        res.extend((i, j, p) for p in meeting_points(segs1[i], segs2[j], overlaps))
+    return res
+
+def evaluate_pairs(segs1, segs2, a, b, I, J, overlaps=False):
+    '''returns a list of triples (i, j, p) for each point p where segs1[i] meets segs2[j] for
+    the pairs of indices in the arrays I and J, as found by meeting_points, given the kernel
+    arrays a and b of the segments. pairs are tested in the kernel, and exactly if their
+    segments fall outside it or, if overlaps is True, are collinear. triples are ordered
+    by i and then j.'''
+    res = []
+    for start in range(0, len(I), BLOCK):
+        i, j = I[start:start+BLOCK], J[start:start+BLOCK]
+        hit, exact, den, t_num = _masks(a[i], b[j], overlaps)
+        res.extend(_triples(segs1, segs2, (i[hit], j[hit], den[hit], t_num[hit]), (i[exact], j[exact]), overlaps))
+
+    res.sort(key=lambda t: t[:2])
+    return res
+
+def evaluate_all(segs1, segs2, a, b, upper=False, overlaps=False):
+    '''returns the triples of evaluate_pairs for every pair of segs1 and segs2, or only the pairs
+    i < j if upper is True, testing blocks of rows of a against all of b'''
+    res = []
+    rows = max(1, BLOCK // max(1, len(b)))
+    cols = np.arange(len(b))
+    for start in range(0, len(a), rows):
+        hit, exact, den, t_num = _masks(a[start:start+rows,None], b[None,:], overlaps)
+        if upper:
+            later = cols[None,:] > np.arange(start, start+len(hit))[:,None]
+            hit, exact = hit & later, exact & later
+
+        r, c = np.nonzero(hit)
+        hits = (r + start, c, den[r,c], t_num[r,c])
+        r, c = np.nonzero(exact)
+        res.extend(_triples(segs1, segs2, hits, (r + start, c), overlaps))
+
+    res.sort(key=lambda t: t[:2])
+    return res
+
+def _sample_hits(segs1, segs2, a, b, rows, upper, overlaps, rng):
+    '''returns the estimated number of pairs of the given rows of segs1 with all of segs2 that
+    meet, and the number that would be tested exactly, leaving out pairs of a row with itself
+    if upper. at most SAMPLE_EXACT of the pairs tested exactly are tested, and scaled up.'''
+    hit, exact, _, _ = _masks(a[rows,None], b[None,:], overlaps)
+    if upper:
+        exact[np.arange(len(rows)), rows] = False
+
+    r, c = np.nonzero(exact)
+    picked = rng.sample(range(len(r)), min(len(r), SAMPLE_EXACT))
+    found = sum(1 for i in picked if meeting_points(segs1[rows[r[i]]], segs2[c[i]], overlaps))
+    scale = len(r)/len(picked) if len(picked) > 0 else 0
+    return int(np.count_nonzero(hit)) + found*scale, len(r)
+
+def _grid_cost(boxes1, boxes2, sample1, sample2, n1, n2, origin, size, rng_cells):
+    '''returns the least estimated cost of bucketing for the grid engine over the grid sizes in
+    rng_cells, with that grid size and its estimated number of pairs sharing a cell, from
+    the bounding boxes of the samples of each set'''
+    best = (math.inf, 1, 0)
+    sets = [ (boxes1[sample1], n1/len(sample1)) ]
+    if boxes2 is not None:
+        sets.append((boxes2[sample2], n2/len(sample2)))
+
+    for cells in rng_cells:
+        # finer grids only add incidences once they cost more than the best grid
+        inc = 0.0
+        for boxes, scale in sets:
+            lo, hi = cell_ranges(boxes, origin, size, cells)
+            inc += scale*float(((hi - lo + 1).prod(axis=1)).sum())
+        if inc*COST_INCIDENCE > best[0]:
+            break
+
+        counts = [ (np.bincount(incidences(boxes, origin, size, cells)[1], minlength=cells*cells), scale)
+                   for boxes, scale in sets ]
+        if boxes2 is None:
+            (count, scale), = counts
+            pairs = scale*scale*float((count*(count-1)).sum())/2
+        else:
+            (count1, scale1), (count2, scale2) = counts
+            pairs = scale1*scale2*float((count1*count2).sum())
+
+        cost = inc*COST_INCIDENCE + pairs*COST_CELL_PAIR
+        if cost < best[0]:
+            best = (cost, cells, pairs)
+    return best
+
+def plan_arrays(segs1, segs2, a, b, boxes1, boxes2, overlaps=False, seed=290):
+    '''returns the Plan choosing an engine for the intersections of segs1, or between segs1 and
+    segs2 if segs2 is not None, given their kernel arrays a and b and bounding boxes (see
+    float_boxes), where b and boxes2 are None with segs2. see plan_intersections.'''
+    single = segs2 is None
+    n1 = len(segs1)
+    n2 = n1 if single else len(segs2)
+    if n1 == 0 or n2 == 0:
+        return Plan('naive', { 'naive': 0.0 }, n=(n1, n2))
+
+    rng = random.Random(seed)
+    b = a if single else b
+    pairs = n1*(n1-1)/2 if single else n1*n2
+
+    # the number of meeting pairs and of exact tests, from a sample of rows against every segment
+    rows = np.array(sorted(rng.sample(range(n1), min(n1, max(1, SAMPLE_PAIRS // n2)))))
+    hits, exact = _sample_hits(segs1, segs1 if single else segs2, a, b, rows, single, overlaps, rng)
+    tested = len(rows)*(n2-1 if single else n2)
+    k = hits*n1/(2*len(rows)) if single else hits*n1/len(rows)
+    exact = exact/max(tested, 1)
+
+    # the distribution of lengths and the bounding boxes of samples of each set
+    sample1 = np.array(sorted(rng.sample(range(n1), min(n1, SAMPLE_SEGMENTS))))
+    sample2 = None if single else np.array(sorted(rng.sample(range(n2), min(n2, SAMPLE_SEGMENTS))))
+    boxes = boxes1 if single else np.concatenate([boxes1, boxes2])
+    origin = boxes[:,0].min(axis=0)
+    size = boxes[:,1].max(axis=0) - origin
+
+    extent = boxes1[sample1,1] - boxes1[sample1,0]
+    if not single:
+        extent = np.concatenate([extent, boxes2[sample2,1] - boxes2[sample2,0]])
+    lengths = np.hypot(extent[:,0], extent[:,1]) / max(float(np.hypot(*size)), 1e-300)
+    lengths = tuple(float(l) for l in np.quantile(lengths, [0.5, 0.9, 1.0]))
+
+    pair_cost = COST_KERNEL_PAIR*(1-exact) + COST_EXACT_PAIR*exact
+    convert = (n1 if single else n1+n2)*COST_SEGMENT
+    levels = math.log2(n1+n2+2)
+
+    max_cells = 2**max(0, math.ceil(math.log2(math.sqrt(n1+n2))) + 2)
+    rng_cells = [ 2**e for e in range(int(math.log2(max_cells))+1) ]
+    grid, cells, grid_pairs = _grid_cost(boxes1, boxes2, sample1, sample2, n1, n2, origin, size, rng_cells)
+
+    # pairs sharing a cell are at least those that meet, and at most all pairs
+    grid_pairs = min(max(grid_pairs, k), pairs)
+
+    # the vectorized engine tests every pair of a single set in both orders
+    costs = {
+        'naive': pairs*COST_EXACT_PAIR,
+        'vectorized': convert + (2 if single else 1)*pairs*pair_cost + k*COST_POINT,
+        'grid': convert + grid + grid_pairs*pair_cost + k*COST_POINT,
+    }
+    if not single:
+        costs['sweep'] = (n1+n2+k)*levels*COST_RED_BLUE_EVENT
+    elif general_position(a, segs1):
+        costs['sweep'] = (2*n1*COST_EVENT + k*COST_INTER_EVENT)*levels
+
+    engine = min(costs, key=costs.get)
+    return Plan(engine, costs, n=(n1, n2), k=int(round(k)), exact=exact, lengths=lengths, cells=cells)
+
+def general_position(a, segs):
+    '''returns whether the endpoints of the given segments, with kernel array a, all have
+    distinct y-coordinates, as SweepLine.find_intersections requires. this also rules out
+    horizontal segments and shared endpoints, but not three segments meeting at a point.'''
+    inside = ~(a == BOUND).all(axis=2).any(axis=1)
+    ys = [ int(y) for y in a[inside][:,:,1].ravel() ]
+    for i in np.flatnonzero(~inside):
+        ys.extend(Fraction(p._y, p._w) for p in (segs[i].p1, segs[i].p2))
+    return len(set(ys)) == len(ys)
+
+def plan_intersections(segs, other=None, overlaps=False, seed=290):
+    '''returns a Plan with the engine estimated to find the intersections of the given segments,
+    or between them and the segments "other", fastest. the number of meeting pairs and of pairs
+    falling outside the kernel are estimated by testing a random sample of the segments, seeded
+    by "seed", against all others, and the work of the grid engine by bucketing a sample of
+    bounding boxes in grids of increasing size. If overlaps is True, collinear segments that
+    touch or overlap are counted as meeting, as for the edges of two DCELs.'''
+    a = segment_array(segs)
+    b = None if other is None else segment_array(other)
+    boxes2 = None if other is None else float_boxes(other, b)
+    return plan_arrays(segs, other, a, b, float_boxes(segs, a), boxes2, overlaps, seed)
+
+def _resolve(engine, segs1, segs2, overlaps, seed, stats):
+    '''returns the kernel arrays and bounding boxes of the segments and the Plan for "engine",
+    which is a Plan, 'auto' to choose one, or the name of an engine to run'''
+    a = segment_array(segs1)
+    b = None if segs2 is None else segment_array(segs2)
+    boxes1 = float_boxes(segs1, a)
+    boxes2 = None if segs2 is None else float_boxes(segs2, b)
+
+    if isinstance(engine, Plan):
+        plan = engine
+    elif engine == 'auto':
+        with phase(stats, 'plan'):
+            plan = plan_arrays(segs1, segs2, a, b, boxes1, boxes2, overlaps, seed)
+    else:
+        if engine not in ENGINES:
+            raise ValueError('unknown engine ' + str(engine))
+        plan = Plan(engine, n=(len(segs1), len(segs1 if segs2 is None else segs2)))
+        plan.cells = 2**max(0, math.ceil(math.log2(math.sqrt(len(segs1) + 1))))
+
+    if stats is not None:
+        stats.count('engine.' + plan.engine)
+    return plan, a, b, boxes1, boxes2
+
+def intersection_triples(plan, segs1, segs2, a, b, boxes1, boxes2, overlaps=False):
+    '''returns the triples (i, j, p) of intersect_all for the pairs of segments tested by the
+    naive, vectorized or grid engine of the plan, where segs2 is None for the pairs i < j of
+    segs1 (see evaluate_pairs)'''
+    single = segs2 is None
+    segs2, b = (segs1, a) if single else (segs2, b)
+
+    if plan.engine == 'naive':
+        return [ (i, j, p) for i, s in enumerate(segs1) for j in range(i+1 if single else 0, len(segs2))
+                 for p in meeting_points(s, segs2[j], overlaps) ]
+
+    if plan.engine == 'vectorized':
+        return evaluate_all(segs1, segs2, a, b, upper=single, overlaps=overlaps)
+
+    I, J = grid_candidates(boxes1, None if single else boxes2, plan.cells)
+    return evaluate_pairs(segs1, segs2, a, b, I, J, overlaps)
+
+def find_intersections(segs, engine='auto', seed=290, stats=None):
+    '''returns a list of the points where pairs of the given segments meet, as naive_seg_inter,
+    using the given engine: a Plan (see plan_intersections), one of ENGINES, or 'auto' to
+    choose one by its estimated cost. the sweep engine requires the general position assumed
+    by SweepLine.find_intersections. If stats is a Stats object (see stats.py), the time spent
+    planning and the engine run are recorded.'''
+    plan, a, _, boxes, _ = _resolve(engine, segs, None, False, seed, stats)
+    if plan.engine == 'sweep':
+        return SweepLine(stats=stats).find_intersections(segs)
+    if plan.engine == 'naive':
+        return naive_seg_inter(segs)
+    return [ p for _, _, p in intersection_triples(plan, segs, None, a, None, boxes, None) ]
+
+def overlay_intersect(dcel1, dcel2, engine='auto', seed=290, stats=None):
+    '''returns the set of points where edges of dcel1 meet edges of dcel2, and a dict mapping
+    the id of each edge of either DCEL to the set of those points in its interior, as
+    red_blue_overlay_intersect, using the given engine as in find_intersections'''
+    if engine == 'sweep':
+        if stats is not None:
+            stats.count('engine.sweep')
+        return red_blue_intersections(dcel1.edges, dcel2.edges)
+
+    edges1, edges2 = dcel1.edges, dcel2.edges
+    plan, a, b, boxes1, boxes2 = _resolve(engine, edges1, edges2, True, seed, stats)
+    if plan.engine == 'sweep':
+        return red_blue_intersections(edges1, edges2)
+
+    points = set()
+    splits = { id(e): set() for e in edges1 + edges2 }
+    for i, j, p in intersection_triples(plan, edges1, edges2, a, b, boxes1, boxes2, overlaps=True):
+        points.add(p)
+        for e in (edges1[i], edges2[j]):
+            if p != e.p1 and p != e.p2:
+                splits[id(e)].add(p)
+
+    return points, splits
@@ -4,17 +4,20 @@ import heapq
 from enum import Enum
 
 class EventKind(Enum):
-    '''a simple enum class to denote types of events'''
+    '''a simple enum class to denote types of events, where JOINT is a point joining two
+    segments of a chain swept in chain mode (see find_chain_intersections in sweep_line.py)'''
     INSERT = 1
     INTER = 2
     DELETE = 3
+    JOINT = 4
 
 @total_ordering
 class Event(object):
     '''a class to record information about segment-intersect events, which correspond to
         - starting to intersect a segment from above,
         - stopping intersecting a segment from above,
-        - an intersection of two distinct segments.
+        - an intersection of two distinct segments,
+        - passing a joint of a chain of segments, in chain mode.
         
         events are ordered in chronological order, as the sweep-line is parallel to the y-axis
         and moves downwards through segments.
@@ -47,9 +50,12 @@ class Event(object):
         return cx == 0 and cy == 0
     
 class EventQueue(object):
-    '''implementation of a priority queue for segment-intersection events'''
+    '''implementation of a priority queue for segment-intersection events.
+    If stats is a Stats object (see stats.py), popped events are counted by kind,
+    along with pushes of events that had been seen before.'''
 
-    def __init__(self, evts=[]):
+    def __init__(self, evts=[], stats=None):
+        self.stats = stats
         self.q = list(evts)
         self.all_evts = { e:e for e in evts }
         self.last_evt = None
@@ -67,6 +73,8 @@ class EventQueue(object):
             assert(self.last_evt < evt)
 
         self.last_evt = evt
+        if self.stats is not None:
+            self.stats.count('events.' + evt.kind.name)
         return evt
     
     def push(self, evt):
@@ -78,6 +86,8 @@ class EventQueue(object):
             if e.kind == evt.kind and set(e.involved) == set(evt.involved):
                 # found same event again, skip adding it.
                 # this may be an already-processed intersection event
+                if self.stats is not None:
+                    self.stats.count('events.repeated')
                 return
             else:
                 # found shared endpoint of different involved segments
@@ -0,0 +1,34 @@
+import subprocess
+import sys
+
+# modules whose import should not load the plotting stack
+MODULES = ['primitives', 'sweep_line', 'dcel', 'red_blue', 'dcel_io', 'incremental',
+           'boolean_ops', 'merge_tree', 'tiled_overlay']
+
+# run in a fresh interpreter, reporting the time to import the module, the peak
+#   resident memory of the process in kB, and whether matplotlib was loaded
+CODE = '''
+import resource, sys, time
+start = time.perf_counter()
+import {}
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 'matplotlib' in sys.modules)
+'''
+
+def measure(module, repeat=5):
+    '''returns the fastest import time of module in seconds over "repeat" fresh interpreters,
+    the peak memory in kB of that interpreter, and whether matplotlib was imported'''
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', CODE.format(module)], capture_output=True,
+                             text=True, check=True).stdout.split()
+        res = (float(out[0]), int(out[1]), out[2] == 'True')
+        if best is None or res[0] < best[0]:
+            best = res
+    return best
+
+if __name__=='__main__':
+    print('module', 'seconds', 'peak kB', 'matplotlib', sep='\t')
+    for m in MODULES + ['matplotlib.pyplot']:
+        t, mem, mpl = measure(m)
+        print(m, '%.4f' % t, mem, mpl, sep='\t')
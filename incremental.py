@@ -0,0 +1,652 @@
+import math
+from primitives import *
+from dcel_helpers import *
+from dcel import DCEL
+from kernel import intersect_all
+from engine import meeting_points
+
+class EditIndex(object):
+    '''a persistent index of the records of a DCEL, so that each edit made with the functions
+    in this module takes time in the size of the edit rather than of the DCEL. it is built in
+    linear time on the first edit (see edit_index) and kept up to date by those functions;
+    other changes to the vertices or edges of the DCEL must build a new one.
+
+    Attributes:
+        dcel        The indexed DCEL
+        verts       A dict from each point to the vertex of dcel at it
+        origin      The lower-left corner of the grid, as floats
+        size        The side of each square cell of the grid, fixed when the index is built
+        cells       A dict from each cell (column,row) to a dict, by id, of the edges of dcel
+                        whose bounding boxes overlap it, found in floating point
+                        (see cell_ranges in engine.py)
+        lo          The smallest column of any cell that has held an edge
+        positions   A dict from the name of each list of dcel ('verts', 'edges', 'hedges' and
+                        'faces') to a dict from the id of each of its records to its position,
+                        rebuilt when it is found to be out of date
+        owners      None, or if dcel is an overlay updated by update_overlay, a dict from the
+                        id of each edge to the set of layers with an edge containing it
+                        (see own_edges), since an edge shared by several layers has only
+                        one source
+    '''
+
+    def __init__(self, dcel):
+        self.dcel = dcel
+        self.verts = { v: v for v in dcel.verts }
+
+        xs = [ v.x() for v in dcel.verts ] or [0.0]
+        ys = [ v.y() for v in dcel.verts ] or [0.0]
+        self.origin = (min(xs), min(ys))
+
+        # about one edge per cell for evenly spread edges
+        extent = max(max(xs)-min(xs), max(ys)-min(ys))
+        self.size = extent / max(1.0, math.sqrt(len(dcel.edges))) or 1.0
+
+        self.cells = {}
+        self.lo = 0
+        for e in dcel.edges:
+            self._add_cells(e)
+
+        self.positions = { name: None for name in ('verts', 'edges', 'hedges', 'faces') }
+        self.owners = None
+
+    def cell(self, p):
+        '''returns the (column,row) of the cell containing the point p'''
+        x, y = p.p()
+        return math.floor((x - self.origin[0])/self.size), math.floor((y - self.origin[1])/self.size)
+
+    def _cell_range(self, e):
+        (c1, r1), (c2, r2) = self.cell(e.p1), self.cell(e.p2)
+        return range(min(c1, c2), max(c1, c2)+1), range(min(r1, r2), max(r1, r2)+1)
+
+    def _add_cells(self, e):
+        cols, rows = self._cell_range(e)
+        self.lo = min(self.lo, cols.start)
+        for c in cols:
+            for r in rows:
+                self.cells.setdefault((c, r), {})[id(e)] = e
+
+    def _remove_cells(self, e):
+        cols, rows = self._cell_range(e)
+        for c in cols:
+            for r in rows:
+                cell = self.cells[c, r]
+                del cell[id(e)]
+                if len(cell) == 0:
+                    del self.cells[c, r]
+
+    def _append(self, name, x):
+        items = getattr(self.dcel, name)
+        pos = self.positions[name]
+        if pos is not None:
+            pos[id(x)] = len(items)
+        items.append(x)
+
+    def _remove(self, name, x):
+        # swap the last record into the place of x
+        items = getattr(self.dcel, name)
+        pos = self.positions[name]
+        i = None if pos is None else pos.get(id(x))
+        if i is None or i >= len(items) or items[i] is not x:
+            pos = self.positions[name] = { id(y): j for j, y in enumerate(items) }
+            i = pos[id(x)]
+
+        del pos[id(x)]
+        last = items.pop()
+        if last is not x:
+            items[i] = last
+            pos[id(last)] = i
+
+    def add_vert(self, v):
+        '''adds the vertex v to dcel'''
+        self.verts[v] = v
+        self._append('verts', v)
+
+    def remove_vert(self, v):
+        '''removes the vertex v from dcel'''
+        del self.verts[v]
+        self._remove('verts', v)
+
+    def add_edge(self, e):
+        '''adds the edge e and its halfedges to dcel'''
+        self._append('edges', e)
+        self._append('hedges', e.h1)
+        self._append('hedges', e.h2)
+        self._add_cells(e)
+
+    def remove_edge(self, e):
+        '''removes the edge e and its halfedges from dcel'''
+        if self.owners is not None:
+            del self.owners[id(e)]
+        self._remove('edges', e)
+        self._remove('hedges', e.h1)
+        self._remove('hedges', e.h2)
+        self._remove_cells(e)
+
+    def add_face(self, f):
+        '''adds the face f to dcel'''
+        self._append('faces', f)
+
+    def remove_face(self, f):
+        '''removes the face f from dcel'''
+        self._remove('faces', f)
+
+    def near(self, seg):
+        '''returns the edges of dcel whose bounding boxes share a cell with that of seg,
+        which include every edge meeting seg'''
+        edges = {}
+        cols, rows = self._cell_range(seg)
+        for c in cols:
+            for r in rows:
+                edges.update(self.cells.get((c, r), ()))
+        return list(edges.values())
+
+    def edges_at(self, p):
+        '''returns the edges of dcel in the cell of the point p, which include every edge
+        through p'''
+        return list(self.cells.get(self.cell(p), {}).values())
+
+    def visible_hedge(self, leftmost):
+        '''returns dcel.get_visible_hedge(leftmost, dcel.edges), testing only the edges in the
+        cells of the row of the origin of leftmost, from its cell leftwards, until the edge
+        closest to it on the left is found'''
+        col, row = self.cell(leftmost.origin)
+
+        edges = {}
+        closest = None
+        for c in range(col, self.lo-1, -1):
+            cell = self.cells.get((c, row))
+            if cell is None:
+                continue
+            edges.update(cell)
+
+            _, inter = self.dcel.get_rightmost_visible_edge(leftmost, list(cell.values()))
+            if inter is not None and (closest is None or closest < inter):
+                closest = inter
+
+            # edges in the cells further left cross the ray further left
+            if closest is not None and self.cell(closest)[0] >= c:
+                break
+
+        return self.dcel.get_visible_hedge(leftmost, list(edges.values()))
+
+def edit_index(dcel):
+    '''returns the EditIndex of dcel, building it if dcel has none'''
+    if dcel.edit_index is None:
+        dcel.edit_index = EditIndex(dcel)
+    return dcel.edit_index
+
+def own_edges(ol_dcel, layers):
+    '''returns the EditIndex of ol_dcel, an overlay of the given layers, with the layers owning
+    each edge of ol_dcel indexed if they are not yet. besides its source, a layer owns an
+    edge if the midpoint of the edge lies on an edge of the layer, since no edge of the
+    layer crosses the interior of an edge of the overlay.'''
+    index = edit_index(ol_dcel)
+    if index.owners is not None:
+        return index
+
+    index.owners = {}
+    for e in ol_dcel.edges:
+        p, q = e.p1, e.p2
+        mid = Point(p._x*q._w + q._x*p._w, p._y*q._w + q._y*p._w, 2*p._w*q._w)
+        index.owners[id(e)] = { d for d in layers if d is e.source
+                                or any(f.contains_point(mid) for f in edit_index(d).edges_at(mid)) }
+    return index
+
+def remove_edge(dcel, e):
+    '''unlink edge e from the vertex stars at its endpoints and remove it from dcel.
+    vertices left without edges are removed from dcel as well.'''
+    index = edit_index(dcel)
+    for h in (e.h1, e.h2):
+        v = h.origin
+
+        # v has no other edges
+        if h.prv is h.twin:
+            v.hedge = None
+            index.remove_vert(v)
+            continue
+
+        h.prv.nxt = h.twin.nxt
+        h.twin.nxt.prv = h.prv
+
+        if v.hedge is h:
+            v.hedge = h.twin.nxt
+
+    index.remove_edge(e)
+
+def merge_at_vertex(dcel, v):
+    '''given a vertex v with exactly two collinear incident edges, replace them by
+    a single edge and remove v from dcel. returns the new edge.'''
+    index = edit_index(dcel)
+    h1, h2 = outgoing(v)
+    a, b = h1.twin.origin, h2.twin.origin
+
+    e = Edge(a, b)
+    e.source = h1.edge.source
+    owners = None if index.owners is None else index.owners[id(h1.edge)]
+
+    # the new halfedges take the places of the old ones at a and b
+    replaced = { id(h1.twin): e.h1, id(h1): e.h2, id(h2.twin): e.h2, id(h2): e.h1 }
+
+    for old in (h1.twin, h2.twin):
+        new = replaced[id(old)]
+        new.prv = replaced.get(id(old.prv), old.prv)
+        new.prv.nxt = new
+
+    for old in (h1, h2):
+        new = replaced[id(old)]
+        new.nxt = replaced.get(id(old.nxt), old.nxt)
+        new.nxt.prv = new
+
+    if a.hedge is h1.twin:
+        a.hedge = e.h1
+    if b.hedge is h2.twin:
+        b.hedge = e.h2
+
+    index.remove_edge(h1.edge)
+    index.remove_edge(h2.edge)
+    index.remove_vert(v)
+    v.hedge = None
+
+    index.add_edge(e)
+    if owners is not None:
+        index.owners[id(e)] = owners
+
+    return e
+
+def insert_segment(dcel, seg, source):
+    '''insert the segment "seg" into dcel as a chain of edges with the given source, split
+    at every point where it meets edges of dcel, which are split there as well. pieces of seg
+    along an edge of dcel are not added again; instead, if the owners of the edges of dcel are
+    indexed (see own_edges), source is added to the owners of that edge. only the edges of
+    dcel near seg are tested (see EditIndex.near). returns the vertices whose incident edges
+    changed and the halfedges removed from dcel.'''
+    index = edit_index(dcel)
+    owners = index.owners
+    near = index.near(seg)
+
+    # the points where seg meets each edge, including the ends of collinear overlaps
+    #   (see meeting_points in engine.py)
+    hits = [ (near[j], p) for _, j, p in intersect_all([seg], near) ]
+    hits.extend((e, p) for e in near if collinear(seg.p1, seg.p2, e.p1) and collinear(seg.p1, seg.p2, e.p2)
+                for p in meeting_points(seg, e, overlaps=True))
+
+    # the points along seg, and the points in the interior of each edge meeting seg there
+    points = { seg.p1: seg.p1, seg.p2: seg.p2 }
+    splits = {}
+    for e, p in hits:
+        points.setdefault(p, p)
+        if p != e.p1 and p != e.p2:
+            splits.setdefault(id(e), (e, {}))[1].setdefault(p, p)
+
+    # the halfedges leaving each vertex whose incident edges change
+    stars = {}
+
+    def star(v):
+        if id(v) not in stars:
+            stars[id(v)] = (v, [] if v.hedge is None else outgoing(v))
+        return stars[id(v)][1]
+
+    def vertex(p):
+        if p not in index.verts:
+            index.add_vert(Vertex.from_point(p))
+        return index.verts[p]
+
+    def link(v1, v2, source, layers):
+        f = Edge(v1, v2)
+        f.source = source
+        star(v1).append(f.h1)
+        star(v2).append(f.h2)
+        index.add_edge(f)
+        if owners is not None:
+            owners[id(f)] = set(layers)
+
+    removed = []
+    for e, inters in splits.values():
+        # order the points along e from p1 to p2
+        chain = [e.p1] + [ vertex(p) for p in sorted(inters, reverse=e.p2 < e.p1) ] + [e.p2]
+        star(e.p1).remove(e.h1)
+        star(e.p2).remove(e.h2)
+        for v1, v2 in zip(chain, chain[1:]):
+            link(v1, v2, e.source, () if owners is None else owners[id(e)])
+
+        index.remove_edge(e)
+        removed.extend((e.h1, e.h2))
+
+    chain = [ vertex(p) for p in sorted(points.values(), reverse=seg.p2 < seg.p1) ]
+    for v1, v2 in zip(chain, chain[1:]):
+        hedges = stars[id(v1)][1] if id(v1) in stars else [] if v1.hedge is None else outgoing(v1)
+        shared = next((h.edge for h in hedges if h.twin.origin is v2), None)
+        if shared is None:
+            link(v1, v2, source, [source])
+        elif owners is not None:
+            owners[id(shared)].add(source)
+
+    for v, hedges in stars.values():
+        link_star(v, hedges)
+
+    return [ v for v, _ in stars.values() ], removed
+
+def update_faces(dcel, touched, removed):
+    '''recompute the faces of dcel around the given vertices, whose incident edges
+    have changed, after the given halfedges were removed. faces whose outer cycle
+    changed are replaced, and the new faces are labelled against every DCEL that
+    labels the infinite face. returns the replaced faces and the new faces.'''
+
+    # halfedges whose next or previous pointers may have changed
+    affected = []
+    seen = set()
+    for v in touched:
+        if v.hedge is None or v.hedge.origin is not v or id(v) in seen:
+            continue
+        seen.add(id(v))
+        for h in outgoing(v):
+            affected.extend((h, h.twin))
+
+    # every cycle through an affected or removed halfedge no longer exists
+    old_cycles = {}
+    for h in affected + removed:
+        if h.cycle is not None and h.face is not None:
+            old_cycles[id(h.cycle)] = h.cycle
+
+    dissolved = {}
+    for c in old_cycles.values():
+        f = c.face
+        if c is f.outer:
+            dissolved[id(f)] = f
+        else:
+            f.inners = [ i for i in f.inners if i is not c ]
+
+    # inner cycles of replaced faces must find their new face
+    pending = {}
+    for f in dissolved.values():
+        for c in f.inners:
+            if id(c) not in old_cycles:
+                pending[id(c)] = c
+
+    marked = set()
+    new_faces = []
+    traced = {}
+    for h in affected:
+        if h in marked:
+            continue
+
+        cycle = dcel.trace_cycle(h, marked)
+        if cycle.is_outer:
+            face = Face(cycle, [], dcel=dcel)
+            cycle.face = face
+            new_faces.append(face)
+        else:
+            pending[id(cycle)] = cycle
+            traced[id(cycle)] = cycle
+
+    for face in new_faces:
+        for e in face.outer.hedges:
+            e.face = face
+
+    index = edit_index(dcel)
+    infinite_face_outer = dcel.infinite_face.outer
+    visible = {}
+
+    def containing_face(c):
+        if id(c) not in pending:
+            return c.face
+
+        # pending inner cycles lie in the face of their visible halfedge
+        hedge = visible.pop(id(c))
+        if hedge is None:
+            c.parent = infinite_face_outer
+            f = dcel.infinite_face
+        else:
+            c.parent = hedge.cycle
+            f = containing_face(hedge.cycle)
+
+        del pending[id(c)]
+        f.inners.append(c)
+        c.face = f
+        for e in c.hedges:
+            e.face = f
+        return f
+
+    def place_pending():
+        visible.update((i, index.visible_hedge(c.leftmost)) for i,c in pending.items())
+        while len(pending) > 0:
+            containing_face(next(iter(pending.values())))
+
+    place_pending()
+
+    # a new face may enclose inner cycles of the face its boundary was placed in, which
+    #   must find their new face as well. only those within the bounding box of a new face
+    #   are checked.
+    boxes = []
+    for face in new_faces:
+        xs = [ h.origin.x() for h in face.outer.hedges ]
+        ys = [ h.origin.y() for h in face.outer.hedges ]
+        boxes.append((min(xs), min(ys), max(xs), max(ys)))
+
+    def enclosed(c):
+        x, y = c.leftmost.origin.p()
+        return any(x0 <= x <= x1 and y0 <= y <= y1 for x0, y0, x1, y1 in boxes)
+
+    hosts = { id(c.face): c.face for c in traced.values() } if len(boxes) > 0 else {}
+    for f in hosts.values():
+        for c in f.inners:
+            if id(c) not in traced and enclosed(c):
+                pending[id(c)] = c
+        f.inners = [ c for c in f.inners if id(c) not in pending ]
+
+    place_pending()
+
+    for f in dissolved.values():
+        index.remove_face(f)
+    for f in new_faces:
+        index.add_face(f)
+
+    # label new faces against every DCEL that labels the faces of dcel
+    for other in dcel.infinite_face.overlay_data:
+        if other is dcel:
+            for face in new_faces:
+                face.overlay_data[dcel] = face
+        else:
+            dcel.annotate_faces(other, faces=new_faces, index=edit_index(other))
+
+    return list(dissolved.values()), new_faces
+
+def _vertex(dcel, seg, p):
+    '''returns the vertex of dcel at the endpoint p of seg'''
+    v = edit_index(dcel).verts.get(p)
+    if v is None:
+        raise ValueError('segment %s-%s is not an edge: no vertex at %s' % (seg.p1, seg.p2, p))
+    return v
+
+def _delete_edge(dcel, seg):
+    '''remove the edge of dcel between the endpoints of seg.
+    returns the vertices whose incident edges changed and the removed halfedges.'''
+    v = _vertex(dcel, seg, seg.p1)
+    h = next((h for h in outgoing(v) if h.twin.origin == seg.p2), None)
+    if h is None:
+        raise ValueError('segment %s-%s is not an edge' % (seg.p1, seg.p2))
+
+    remove_edge(dcel, h.edge)
+    return [h.origin, h.twin.origin], [h, h.twin]
+
+def _delete_chain(dcel, seg, source):
+    '''remove source from the owners of the chain of edges of the overlay dcel that together
+    cover seg (see own_edges), and remove the edges that no layer owns any longer.
+    returns the vertices whose incident edges changed, the removed halfedges, and the
+    endpoints of the edges kept for other layers.'''
+    owners = edit_index(dcel).owners
+    touched = []
+    removed = []
+    kept = []
+    v = _vertex(dcel, seg, seg.p1)
+    _vertex(dcel, seg, seg.p2)
+    while v != seg.p2:
+        h = next((h for h in outgoing(v)
+                  if source in owners[id(h.edge)] and seg.contains_point(h.twin.origin)), None)
+        if h is None:
+            raise ValueError('segment %s-%s is not covered by edges' % (seg.p1, seg.p2))
+
+        layers = owners[id(h.edge)]
+        layers.discard(source)
+        if len(layers) > 0:
+            if h.edge.source is source:
+                h.edge.source = next(iter(layers))
+            kept.extend((v, h.twin.origin))
+        else:
+            remove_edge(dcel, h.edge)
+            touched.extend((v, h.twin.origin))
+            removed.extend((h, h.twin))
+        v = h.twin.origin
+
+    return touched, removed, kept
+
+def edit_dcel(dcel, inserted=(), deleted=()):
+    '''update dcel in place by deleting the edges between the endpoints of each segment
+    in "deleted" and inserting each segment in "inserted", recomputing only the
+    faces whose boundaries change. returns the replaced faces and the new faces.'''
+    touched, removed = [], []
+
+    for seg in deleted:
+        t, r = _delete_edge(dcel, seg)
+        touched.extend(t)
+        removed.extend(r)
+
+    for seg in inserted:
+        t, r = insert_segment(dcel, seg, None)
+        touched.extend(t)
+        removed.extend(r)
+
+    return update_faces(dcel, touched, removed)
+
+def relabel_faces(ol_dcel, layer, replaced, new_faces, layer_faces=()):
+    '''given the faces of ol_dcel, an overlay of layer, that were replaced and the new faces,
+    already labelled, that were rebuilt after an edit of layer, and the faces of layer that
+    were replaced or rebuilt, relabel the other faces whose face in layer changed. these are
+    found from the faces on either side of the halfedges that bounded the replaced faces, and
+    the faces around a vertex of ol_dcel on the boundary of each face of layer, which may be
+    unchanged in ol_dcel where it lies along edges of other layers. from there, they are found
+    across edges that layer does not own (see own_edges), since faces on either side of such
+    an edge lie in the same face of layer. the search stops at faces whose label is unchanged.
+    returns the relabelled faces.'''
+    index = edit_index(layer)
+    ol_index = edit_index(ol_dcel)
+    owners = ol_index.owners
+    seen = set(map(id, replaced)) | set(map(id, new_faces))
+    stack = list(new_faces)
+    relabelled = []
+
+    def visit(g):
+        if id(g) in seen:
+            return
+        seen.add(id(g))
+
+        old = g.overlay_data.get(layer)
+        ol_dcel.annotate_faces(layer, faces=[g], index=index)
+        if g.overlay_data[layer] is not old:
+            relabelled.append(g)
+            stack.append(g)
+
+    for f in replaced:
+        for h in ( h for c in [f.outer] + f.inners for h in c.hedges ):
+            visit(h.face)
+            visit(h.twin.face)
+
+    for f in layer_faces:
+        v = next(( ol_index.verts[h.origin] for h in f.outer.hedges if h.origin in ol_index.verts ), None)
+        for h in [] if v is None else outgoing(v):
+            visit(h.face)
+
+    while len(stack) > 0:
+        f = stack.pop()
+        cycles = f.inners if f.outer is None else [f.outer] + f.inners
+        for h in ( h for c in cycles for h in c.hedges ):
+            if layer not in owners[id(h.edge)]:
+                visit(h.twin.face)
+
+    return relabelled
+
+def update_overlay(ol_dcel, layer, inserted=(), deleted=()):
+    '''update ol_dcel, the overlay of "layer" with other DCELs computed with faces, after
+    deleting the edges between the endpoints of each segment in "deleted" from layer
+    and inserting each segment in "inserted" into layer. layer is updated as well.
+    only the edges near the changed segments are tested and split or merged, only the faces
+    whose boundaries change are rebuilt, and only the faces whose face in layer changes
+    are relabelled (see relabel_faces), using the EditIndex of each DCEL. an edge shared by
+    several layers is only removed once none of them has an edge containing it.
+    raises ValueError if a deleted segment is not an edge of layer.'''
+
+    # the layers, whose vertices must not be merged away. the layers owning each edge
+    #   are found before layer changes.
+    layers = [ d for d in ol_dcel.infinite_face.overlay_data if d is not ol_dcel ]
+    owners = own_edges(ol_dcel, layers).owners
+
+    layer_replaced, layer_new = edit_dcel(layer, inserted, deleted)
+
+    touched, removed, kept = [], [], []
+    for seg in deleted:
+        t, r, k = _delete_chain(ol_dcel, seg, layer)
+        touched.extend(t)
+        removed.extend(r)
+        kept.extend(k)
+
+    # rejoin edges of the other layers that were only split by deleted edges
+    for v in touched + kept:
+        if v.hedge is None:
+            continue
+
+        hedges = outgoing(v)
+        if (len(hedges) != 2 or owners[id(hedges[0].edge)] != owners[id(hedges[1].edge)]
+                or any(v in edit_index(d).verts for d in layers)
+                or not collinear_in_order(hedges[0].twin.origin, v, hedges[1].twin.origin)):
+            continue
+
+        e = merge_at_vertex(ol_dcel, v)
+        touched.extend((e.p1, e.p2))
+        removed.extend(hedges + [hedges[0].twin, hedges[1].twin])
+
+    for seg in inserted:
+        t, r = insert_segment(ol_dcel, seg, layer)
+        touched.extend(t)
+        removed.extend(r)
+
+    replaced, new_faces = update_faces(ol_dcel, touched, removed)
+    relabel_faces(ol_dcel, layer, replaced, new_faces, layer_replaced + layer_new)
+
+    return ol_dcel
+
+if __name__=='__main__':
+    import random
+    from dcel import overlay
+    from dcel_datasets import grid_map
+
+    def rebuilt(d):
+        points = { v: Point(v._x, v._y, v._w) for v in d.verts }
+        return DCEL.from_points_segs(list(points.values()), [ Segment(points[e.p1], points[e.p2]) for e in d.edges ])
+
+    def cycle_key(c):
+        return tuple(sorted(h.origin.p() for h in c.hedges)) if c is not None else ()
+
+    def signature(ol_dcel, layers):
+        edges = sorted(tuple(sorted((e.p1.p(), e.p2.p()))) for e in ol_dcel.edges)
+        faces = sorted((cycle_key(f.outer), tuple(cycle_key(f.overlay_data[d].outer) for d in layers)) for f in ol_dcel.faces)
+        return edges, faces
+
+    # random edits of two grids sharing many collinear edges match the overlay from scratch
+    for seed in range(100):
+        rng = random.Random(seed)
+        layers = [ DCEL.from_points_segs(*grid_map(3, 3, size=12)), DCEL.from_points_segs(*grid_map(2, 2, size=12)) ]
+        ol = overlay(*layers, compute_faces=True)
+        for step in range(10):
+            layer = rng.choice(layers)
+            if rng.random() < 0.4:
+                e = rng.choice(layer.edges)
+                update_overlay(ol, layer, deleted=[Segment(Point(e.p1._x, e.p1._y, e.p1._w), Point(e.p2._x, e.p2._y, e.p2._w))])
+            else:
+                p = Point(rng.randrange(0, 13, 2), rng.randrange(0, 13, 2))
+                q = Point(rng.randrange(0, 13, 2), p._y if rng.random() < 0.5 else rng.randrange(0, 13, 2))
+                if p != q:
+                    update_overlay(ol, layer, inserted=[Segment(p, q)])
+
+            fresh = [ rebuilt(d) for d in layers ]
+            assert signature(ol, layers) == signature(overlay(*fresh, compute_faces=True), fresh), (seed, step)
+    print('ok')
@@ -0,0 +1,189 @@
+import numpy as np
+from primitives import *
+
+# a kernel evaluating predicates and intersections over batches of points with small integer
+#   coordinates in int64 arithmetic. for coordinates of magnitude below BOUND, differences of
+#   coordinates are below 2^31, so the products of two differences in orient and in the
+#   numerators and denominators of intersections are below 2^62, and their sums fit in an int64.
+#   points with w != 1, or coordinates outside the bound, are left to the generic predicates.
+
+BOUND = 2**30
+
+# the number of pairs of segments tested at once in intersect_all
+BLOCK = 2**18
+
+def fits(p):
+    '''returns whether the point p has integer Cartesian coordinates of magnitude below BOUND'''
+    return (p._w == 1 and type(p._x) is int and type(p._y) is int
+            and -BOUND < p._x < BOUND and -BOUND < p._y < BOUND)
+
+def point_array(points):
+    '''returns an int64 array of shape (n,2) of the coordinates of the given points, where
+    points that do not fit in the kernel are given the coordinates (BOUND, BOUND), so that
+    the *_many functions below flag them for exact fallback'''
+    coords = np.full((len(points), 2), BOUND, dtype=np.int64)
+    if len(points) == 0:
+        return coords
+
+    # numpy only infers int64 if every coordinate is an int that fits
+    flat = np.array([ (p._x, p._y, p._w) for p in points ])
+    if flat.dtype == np.int64:
+        ok = (flat[:,2] == 1) & (np.abs(flat[:,:2]) < BOUND).all(axis=1)
+        coords[ok] = flat[ok,:2]
+        return coords
+
+    for i, p in enumerate(points):
+        if fits(p):
+            coords[i] = p._x, p._y
+    return coords
+
+def segment_array(segs):
+    '''returns an int64 array of shape (n,2,2) of the endpoints p1 and p2 of the given segments,
+    as in point_array'''
+    return point_array([ p for s in segs for p in (s.p1, s.p2) ]).reshape(-1, 2, 2)
+
+def kernel_array(a, points=1):
+    '''given an array of coordinates of shape (...,2), or (...,k,2) for "points"=k points per
+    item, returns an int64 copy of it and a boolean array of shape (...) that is True for
+    items with a coordinate that is not an integer of magnitude below BOUND, which must
+    be evaluated exactly instead. the coordinates of these items are set to 0.'''
+    a = np.asarray(a)
+    if a.dtype.kind in 'iu':
+        ok = np.abs(a.astype(np.int64)) < BOUND
+    elif a.dtype.kind == 'f':
+        ok = (np.floor(a) == a) & (np.abs(a) < BOUND)
+    else:
+        ok = np.vectorize(lambda v: type(v) is int and -BOUND < v < BOUND, otypes=[bool])(a) if a.size > 0 else np.ones(a.shape, dtype=bool)
+
+    # reduce over the coordinates of each item
+    for _ in range(1 if points == 1 else 2):
+        ok = ok.all(axis=-1)
+
+    shape = ok.shape + (1,)*(a.ndim - ok.ndim)
+    return np.where(ok.reshape(shape), a, 0).astype(np.int64), ~ok
+
+def orient_signs(p, q, r):
+    '''returns the signs of orient(p,q,r) for int64 arrays p, q and r of shape (...,2)'''
+    det = (r[...,1]-p[...,1])*(q[...,0]-p[...,0]) - (q[...,1]-p[...,1])*(r[...,0]-p[...,0])
+    return np.sign(det).astype(np.int8)
+
+def float_orient_signs(p, q, r):
+    '''returns the signs of orient(p,q,r) for float arrays p, q and r of shape (...,2), whose
+    coordinates are those of exact points rounded to the nearest float, along with a mask of
+    the items where rounding may have changed the sign, which must be evaluated exactly'''
+    eps = np.finfo(float).eps
+    ax, ay = q[...,0]-p[...,0], q[...,1]-p[...,1]
+    bx, by = r[...,0]-p[...,0], r[...,1]-p[...,1]
+    det = by*ax - ay*bx
+
+    # the rounding of each coordinate and each operation changes each product by a small
+    #   multiple of eps times the magnitudes of its factors' terms
+    bound = 8*eps*((np.abs(q[...,1]) + np.abs(p[...,1]) + np.abs(r[...,1]))*np.abs(ax)
+                   + (np.abs(q[...,0]) + np.abs(p[...,0]) + np.abs(r[...,0]))*np.abs(by)
+                   + (np.abs(q[...,1]) + np.abs(p[...,1]))*np.abs(bx)
+                   + (np.abs(q[...,0]) + np.abs(p[...,0]))*np.abs(ay))
+    undecided = np.abs(det) <= bound
+    return np.where(undecided, 0, np.sign(det)).astype(np.int8), undecided
+
+def collinear_in_order_mask(a, b, c):
+    '''returns where collinear_in_order(a,b,c) holds for int64 arrays a, b and c of shape (...,2)'''
+    dot = (a[...,0]-b[...,0])*(b[...,0]-c[...,0]) + (a[...,1]-b[...,1])*(b[...,1]-c[...,1])
+    return (orient_signs(a, b, c) == 0) & (dot > 0)
+
+def intersect_params(s, t):
+    '''for int64 arrays s and t of shape (...,2,2) of segment endpoints, returns the arrays
+    (den, t_num, u_num) such that the lines supporting s and t meet at parameters t_num/den
+    along s and u_num/den along t, as in Segment.generic_intersect, with den >= 0, and
+    den = 0 where they are parallel'''
+    x1, y1 = s[...,0,0], s[...,0,1]
+    x2, y2 = s[...,1,0], s[...,1,1]
+    x3, y3 = t[...,0,0], t[...,0,1]
+    x4, y4 = t[...,1,0], t[...,1,1]
+
+    den = (x1-x2)*(y3-y4) - (y1-y2)*(x3-x4)
+    t_num = (x1-x3)*(y3-y4) - (y1-y3)*(x3-x4)
+    u_num = (y1-y2)*(x1-x3) - (x1-x2)*(y1-y3)
+
+    neg = den < 0
+    return np.where(neg, -den, den), np.where(neg, -t_num, t_num), np.where(neg, -u_num, u_num)
+
+# the location given to the parameters of parallel lines, for which generic_intersect returns None
+PARALLEL = 2
+
+def locations(num, den):
+    '''returns an int8 array of the values of IntersLoc (BEFORE, ON or AFTER) for the parameters
+    num/den from intersect_params along their segment, or PARALLEL where den = 0'''
+    loc = np.where(num < 0, IntersLoc.BEFORE.value, np.where(num > den, IntersLoc.AFTER.value, IntersLoc.ON.value))
+    return np.where(den == 0, PARALLEL, loc).astype(np.int8)
+
+def orient_many(p, q, r):
+    '''returns the signs of orient(p,q,r) for coordinate arrays p, q and r of shape (...,2),
+    broadcast together, along with a mask of the items which must be evaluated exactly
+    with orient, whose signs are 0'''
+    (p, fp), (q, fq), (r, fr) = kernel_array(p), kernel_array(q), kernel_array(r)
+    fallback = fp | fq | fr
+    return np.where(fallback, 0, orient_signs(p, q, r)).astype(np.int8), fallback
+
+def collinear_in_order_many(a, b, c):
+    '''returns where collinear_in_order(a,b,c) holds for coordinate arrays a, b and c of shape
+    (...,2), along with a mask of the items which must be evaluated exactly'''
+    (a, fa), (b, fb), (c, fc) = kernel_array(a), kernel_array(b), kernel_array(c)
+    fallback = fa | fb | fc
+    return collinear_in_order_mask(a, b, c) & ~fallback, fallback
+
+def intersect_many(s, t):
+    '''for coordinate arrays s and t of shape (...,2,2) of segment endpoints, broadcast
+    together, returns the arrays (s_loc, t_loc, den, t_num, fallback) where
+        s_loc, t_loc    are the locations of the intersection of their supporting lines
+                            along s and t, as in Segment.generic_intersect (see locations)
+        den, t_num      place the intersection at parameter t_num/den along s (see param_point)
+        fallback        masks the items which must be evaluated exactly instead
+    so that s and t meet at a single point where both locations are ON.'''
+    (s, fs), (t, ft) = kernel_array(s, points=2), kernel_array(t, points=2)
+    fallback = fs | ft
+
+    den, t_num, u_num = intersect_params(s, t)
+    den = np.where(fallback, 0, den)
+    return locations(t_num, den), locations(u_num, den), den, t_num, fallback
+
+def intersect_line_many(s, lines):
+    '''for coordinate arrays s of segment endpoints and "lines" of pairs of points on lines,
+    each of shape (...,2,2) and broadcast together, returns the arrays
+    (s_loc, den, t_num, fallback) as in intersect_many, so that s meets its line where
+    s_loc is ON, as in Segment.intersect_line'''
+    s_loc, _, den, t_num, fallback = intersect_many(s, lines)
+    return s_loc, den, t_num, fallback
+
+def param_point(seg, den, t_num):
+    '''returns the exact Point at parameter t_num/den along seg from p1 to p2, which is the
+    rational point ((x1*den + t_num*(x2-x1))/den, (y1*den + t_num*(y2-y1))/den)'''
+    den, t_num = int(den), int(t_num)
+    x1, y1, x2, y2 = seg.p1._x, seg.p1._y, seg.p2._x, seg.p2._y
+    return Point(x1*den + t_num*(x2-x1), y1*den + t_num*(y2-y1), den)
+
+def intersect_all(segs1, segs2):
+    '''returns a list of the triples (i, j, p) for each segment segs1[i] meeting segs2[j] at a
+    single point p, as found by segs1[i].intersect(segs2[j]). pairs of segments are tested
+    with intersect_many, in blocks of about BLOCK pairs, and those outside the kernel
+    with Segment.intersect. triples are ordered by i and then j.'''
+    a = segment_array(segs1)
+    b = segment_array(segs2)
+
+    res = []
+    rows = max(1, BLOCK // max(1, len(b)))
+    for start in range(0, len(a), rows):
+        s_loc, t_loc, den, t_num, fallback = intersect_many(a[start:start+rows,None], b[None,:])
+        on = IntersLoc.ON.value
+
+        for r, c in zip(*np.nonzero((s_loc == on) & (t_loc == on))):
+            i, j = start+int(r), int(c)
+            res.append((i, j, param_point(segs1[i], den[r,c], t_num[r,c])))
+
+        for r, c in zip(*np.nonzero(fallback)):
+            i, j = start+int(r), int(c)
+            p = segs1[i].intersect(segs2[j])
+            if p is not None:
+                res.append((i, j, p))
+
+    res.sort(key=lambda t: t[:2])
+    return res
@@ -0,0 +1,59 @@
+from concurrent.futures import ProcessPoolExecutor
+from dcel import DCEL, overlay
+from dcel_io import to_bytes, from_buffer
+
+def overlay_pair(task):
+    '''overlay two serialized DCELs, returning the serialized overlay along with, for each
+    of its faces, the indices of the containing faces of the original DCELs of both
+    inputs. runs in a worker process.'''
+    (buf1, labels1), (buf2, labels2) = task
+
+    dcel1 = from_buffer(buf1)
+    dcel2 = from_buffer(buf2)
+    ol_dcel = overlay(dcel1, dcel2, compute_faces=True)
+
+    idx1 = { id(f): i for i,f in enumerate(dcel1.faces) }
+    idx2 = { id(f): i for i,f in enumerate(dcel2.faces) }
+
+    labels = [ labels1[idx1[id(f.overlay_data[dcel1])]] + labels2[idx2[id(f.overlay_data[dcel2])]]
+               for f in ol_dcel.faces ]
+
+    return to_bytes(ol_dcel), labels
+
+def merge_tree_overlay(dcels, max_workers=None):
+    '''returns a DCEL which is the overlay of all of the given DCELs, computed by overlaying
+    them pairwise in a balanced binary tree. the pairs at each level are overlayed
+    concurrently in a process pool, and intermediate DCELs are passed between processes
+    in the binary format of dcel_io. each face is labelled in its overlay_data with the
+    containing face of every given DCEL. If max_workers is 0, all pairs are overlayed
+    in this process.'''
+
+    # each item is a serialized DCEL and, for each of its faces, the
+    #   indices of the containing faces of the given DCELs it overlays
+    items = [ (to_bytes(d), [ (i,) for i in range(len(d.faces)) ]) for d in dcels ]
+
+    pool = None if max_workers == 0 else ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        while len(items) > 1:
+            pairs = list(zip(items[0::2], items[1::2]))
+            carry = items[-1:] if len(items) % 2 == 1 else []
+
+            if pool is None:
+                merged = list(map(overlay_pair, pairs))
+            else:
+                merged = list(pool.map(overlay_pair, pairs))
+
+            items = merged + carry
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    buf, labels = items[0]
+    ol_dcel = from_buffer(buf)
+
+    for f, label in zip(ol_dcel.faces, labels):
+        f.overlay_data = {}
+        for d, i in zip(dcels, label):
+            f.overlay_data[d] = d.faces[i]
+
+    return ol_dcel
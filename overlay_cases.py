@@ -14,7 +14,7 @@ def vertex_vertex(dcel, v1, inc1, v2, inc2):
         heads.append(inc.pointing_to(v1)) # v1 and v2 are equal by coordinates, so v1==v2
         tails.append(inc.pointing_from(v1))
 
-    heads = sorted( heads, key=lambda hedge: -v1.angle(hedge.origin) ) # sorts CW around v
+    heads = sorted( heads, key=lambda hedge: v1.cw_key(hedge.origin) ) # sorts CW around v
 
     # for each outgoing halfedge in clockwise order, pair it with the twin in CW order
     #   and vice versa
@@ -23,7 +23,16 @@ def vertex_vertex(dcel, v1, inc1, v2, inc2):
         e.nxt = heads[nxt].twin
         e.nxt.prv = e
 
-    dcel.verts.remove(v2)
+    # v2 is removed, so its edges and halfedges now refer to v1
+    for inc in inc2:
+        inc.pointing_from(v2).origin = v1
+        for attr in ('p1', 'p2', 'left', 'right', 'top', 'bottom'):
+            if getattr(inc, attr) is v2:
+                setattr(inc, attr, v1)
+
+    # remove v2 itself, rather than the first vertex with equal coordinates
+    idx = next(i for i,v in enumerate(dcel.verts) if v is v2)
+    del dcel.verts[idx]
 
 def edge_edge(dcel, inter, a : Edge, b : Edge):
     v = Vertex.from_point(inter)
@@ -35,6 +44,8 @@ def edge_edge(dcel, inter, a : Edge, b : Edge):
 
     a1, a2 = Edge(a.p1, v), Edge(v, a.p2)
     b1, b2 = Edge(b.p1, v), Edge(v, b.p2)
+    a1.source = a2.source = a.source
+    b1.source = b2.source = b.source
 
     a1.h1.twin = a1.h2
     a1.h2.twin = a1.h1
@@ -60,7 +71,7 @@ def edge_edge(dcel, inter, a : Edge, b : Edge):
     inguys_prv = [a.h1.prv, b.h2.prv, a.h2.prv, b.h1.prv]
     inguys_with_prv = list(zip(inguys, inguys_prv))
 
-    inguys_with_prv.sort(key=lambda x: -v.angle(x[0].origin))  # index the guys
+    inguys_with_prv.sort(key=lambda x: v.cw_key(x[0].origin))  # index the guys
 
     # sorts CW around v
 
@@ -88,7 +99,7 @@ def edge_edge(dcel, inter, a : Edge, b : Edge):
     outguys_with_nxt = list(zip(outguys, outguys_nxt))
 
 
-    outguys_with_nxt.sort(key=lambda x: -v.angle(x[0].origin))
+    outguys_with_nxt.sort(key=lambda x: v.cw_key(x[0].twin.origin))
     # sorts CW around v
 
     # the out guys
@@ -113,7 +124,7 @@ def edge_edge(dcel, inter, a : Edge, b : Edge):
         a.p1.hedge = a1.h1
     if a.p2.hedge == a.h1 or a.p2.hedge == a.h2:
         a.p2.hedge = a2.h2
-    if b.p1.hedge == b.h1 or b.p2.hedge == b.h2:
+    if b.p1.hedge == b.h1 or b.p1.hedge == b.h2:
         b.p1.hedge = b1.h1
     if b.p2.hedge == b.h1 or b.p2.hedge == b.h2:
         b.p2.hedge = b2.h2
@@ -169,6 +180,7 @@ def vertex_edge(dcel, v, incident_edges, e : Edge):
         - remove all the old edges and halfedges from the dcel'''
 
     e1, e2 = Edge(e.p1, v), Edge(v, e.p2) # split into two edges, with pair halfedges each
+    e1.source = e2.source = e.source
 
     # collect all halfedges pointing to the vertex v (incoming halfedges)
     incoming = []
@@ -179,7 +191,7 @@ def vertex_edge(dcel, v, incident_edges, e : Edge):
     incoming.append(e2.h2) # added the two extra guys
 
     # incoming sorted in clockwise order around v
-    incoming.sort(key=lambda he: -v.angle(he.origin))
+    incoming.sort(key=lambda he: v.cw_key(he.origin))
 
     n = len(incoming)
     for i in range(n):
@@ -225,3 +237,125 @@ def vertex_edge(dcel, v, incident_edges, e : Edge):
     for vertex in [v, e.p1, e.p2]:
         if vertex.hedge not in dcel.hedges:
             vertex.hedge = next((he for he in dcel.hedges if he.origin == vertex), None)
+
+def split_edges(dcel, splits):
+    '''for an improper dcel whose edges only meet at their endpoints, at coinciding vertices,
+    or at the points in "splits", which maps the id of each edge to the set of points in its
+    interior where it meets other edges, modify dcel so that no edges cross:
+        - merge coinciding vertices, keeping the first in dcel.verts,
+        - replace each split edge by a chain of new edges, splitting it once at all of its points,
+        - merge edges between the same pair of vertices, which collinear overlapping edges leave
+          behind, keeping the first (so that its source is that of the earlier dcel),
+        - link the halfedges around each vertex whose incident edges changed only once, and
+        - remove all the old edges, halfedges and vertices from the dcel.
+    returns the vertices created at points where edges cross.'''
+
+    # the vertex at each point, and the halfedges leaving each vertex whose incident edges change
+    at = {}
+    stars = {}
+
+    def star(v):
+        if id(v) not in stars:
+            stars[id(v)] = (v, [] if v.hedge is None else outgoing(v))
+        return stars[id(v)][1]
+
+    gone_verts = set()
+    for v in dcel.verts:
+        u = at.setdefault(v, v)
+        if u is v or v.hedge is None:
+            continue
+
+        # v coincides with u, so its edges and halfedges now refer to u
+        for h in star(v):
+            h.origin = u
+            for attr in ('p1', 'p2', 'left', 'right', 'top', 'bottom'):
+                if getattr(h.edge, attr) is v:
+                    setattr(h.edge, attr, u)
+
+        star(u).extend(stars.pop(id(v))[1])
+        gone_verts.add(id(v))
+
+    new_verts = []
+    new_edges = []
+    gone_edges = set()
+    for e in dcel.edges:
+        inters = splits.get(id(e))
+        if not inters:
+            continue
+
+        # order the points along e from p1 to p2
+        chain = [e.p1]
+        for p in sorted(inters, reverse=e.p2 < e.p1):
+            if p not in at:
+                at[p] = Vertex.from_point(p)
+                new_verts.append(at[p])
+            chain.append(at[p])
+        chain.append(e.p2)
+
+        star(e.p1).remove(e.h1)
+        star(e.p2).remove(e.h2)
+
+        for v1, v2 in zip(chain, chain[1:]):
+            f = Edge(v1, v2)
+            f.source = e.source
+            star(v1).append(f.h1)
+            star(v2).append(f.h2)
+            new_edges.append(f)
+
+        gone_edges.add(id(e))
+
+    # overlapping pieces now join the same vertices; only the first of them is kept
+    first = {}
+    dupes = set()
+    for e in [ e for e in dcel.edges if id(e) not in gone_edges ] + new_edges:
+        if first.setdefault(frozenset((id(e.p1), id(e.p2))), e) is not e:
+            dupes.add(id(e))
+    for v, hedges in stars.values():
+        hedges[:] = [ h for h in hedges if id(h.edge) not in dupes ]
+    gone_edges |= dupes
+    new_edges = [ e for e in new_edges if id(e) not in dupes ]
+
+    for v, hedges in stars.values():
+        link_star(v, hedges)
+
+    gone_hedges = { id(h) for e in dcel.edges if id(e) in gone_edges for h in (e.h1, e.h2) }
+
+    dcel.verts[:] = [ v for v in dcel.verts if id(v) not in gone_verts ] + new_verts
+    dcel.edges[:] = [ e for e in dcel.edges if id(e) not in gone_edges ] + new_edges
+    dcel.hedges[:] = [ h for h in dcel.hedges if id(h) not in gone_hedges ] + [ h for e in new_edges for h in (e.h1, e.h2) ]
+
+    return new_verts
+
+if __name__=='__main__':
+    from dcel import DCEL
+
+    def crossing(p, q, r, s):
+        '''an improper DCEL of the segments pq and rs, which cross at a single point'''
+        dcel = DCEL.from_points_segs([p, q, r, s], [Segment(p, q), Segment(r, s)], compute_faces=False)
+        a, b = dcel.edges
+        return dcel, a, b, a.intersect(b)
+
+    points = [Point(0,0), Point(4,4), Point(0,4), Point(4,0)]
+    orders = [(0,1,2,3), (1,0,2,3), (0,1,3,2), (2,3,0,1), (3,2,1,0)]
+
+    # the halfedges around the new vertex are linked in clockwise order, whichever way the
+    #   edges are given. the halfedges leaving it were once sorted by their origin, which is
+    #   the new vertex itself and has no direction
+    for i, j, k, l in orders:
+        dcel, a, b, inter = crossing(points[i], points[j], points[k], points[l])
+        v = edge_edge(dcel, inter, a, b)
+        dcel.verify()
+        ends = [ h.twin.origin for h in outgoing(v) ]
+        first = ends.index(min(ends, key=v.cw_key))
+        assert ends[first:] + ends[:first] == sorted(ends, key=v.cw_key), (i, j, k, l)
+
+    # a vertex may point at either incident halfedge of a removed edge, and is moved to
+    #   a new halfedge. the first endpoint of b was once only moved off b.h1
+    for i, j, k, l in orders:
+        dcel, a, b, inter = crossing(points[i], points[j], points[k], points[l])
+        for e in (a, b):
+            e.p1.hedge, e.p2.hedge = e.h2, e.h1
+        edge_edge(dcel, inter, a, b)
+        hedges = set(map(id, dcel.hedges))
+        assert all(id(u.hedge) in hedges for u in dcel.verts), (i, j, k, l)
+    print('ok')
@@ -0,0 +1,14 @@
+# lazy access to matplotlib for the draw methods of the geometry and DCEL classes,
+#   so that importing them (e.g., in worker processes) does not load the plotting stack.
+#   matplotlib is only imported once something is drawn.
+
+def pyplot():
+    '''returns the matplotlib.pyplot module, importing it on first use'''
+    import matplotlib.pyplot as plt
+    return plt
+
+def get_fig(fig=None):
+    '''returns the given figure to draw on, or matplotlib.pyplot if fig is None'''
+    if fig is None:
+        return pyplot()
+    return fig
@@ -1,6 +1,8 @@
-import matplotlib.pyplot as plt
+from plotting import get_fig, pyplot
 from functools import total_ordering
+from fractions import Fraction
 import math
+import sys
 from enum import Enum
 
 class IntersLoc(Enum):
@@ -8,6 +10,18 @@ class IntersLoc(Enum):
     ON = 0
     AFTER = 1
         
+_HASH_MODULUS = sys.hash_info.modulus
+
+def _hash_ratio(n, d):
+    '''returns the hash of the Fraction n/d for integers n and d > 0, as computed by Python,
+    without reducing n/d'''
+    try:
+        h = hash(hash(abs(n)) * pow(d, -1, _HASH_MODULUS))
+    except ValueError:
+        h = sys.hash_info.inf
+    h = h if n >= 0 else -h
+    return -2 if h == -1 else h
+
 @total_ordering
 class Point(object):
     '''a class defining a 2D point using homogeneous coordinates
@@ -38,6 +52,10 @@ class Point(object):
         self._y = y
         self._w = w
 
+        # points are immutable, so derived values are computed once when first needed
+        self._p = None
+        self._hash = None
+
     @classmethod
     def from_rationals(cls,xn,xd,yn,yd):
         '''given x,y-coordinates in form integer numerators over integer denominators,
@@ -56,8 +74,23 @@ class Point(object):
         
         return cy < 0
     
+    def canonical(self):
+        '''return an exact key for this point, equal for points that are equal.
+        integer points with w = 1 are keyed by their coordinates, and all others by
+        their Cartesian coordinates as Fractions, whose hashes agree with those of
+        equal integers and floats.'''
+        if self._w == 1:
+            return (self._x, self._y)
+        return (Fraction(self._x)/Fraction(self._w), Fraction(self._y)/Fraction(self._w))
+
     def __hash__(self):
-        return self.p().__hash__()
+        if self._hash is None:
+            if self._w == 1 or not isinstance(self._w, int) or not isinstance(self._x, int) or not isinstance(self._y, int):
+                self._hash = hash(self.canonical())
+            else:
+                # equal to the hash of the Fractions in self.canonical(), without computing them
+                self._hash = hash((_hash_ratio(self._x, self._w), _hash_ratio(self._y, self._w)))
+        return self._hash
 
     def __eq__(self, other):
         cx = self._x*other._w - other._x*self._w
@@ -90,25 +123,29 @@ class Point(object):
         return cy == 0
 
     def x(self):
-        return self._x/self._w
+        return self.p()[0]
 
     def y(self):
-        return self._y/self._w
+        return self.p()[1]
 
     def p(self):
         '''return point as Cartesian coordinates as floats'''
-        return (self.x(), self.y())
+        if self._p is None:
+            self._p = (self._x/self._w, self._y/self._w)
+        return self._p
     
-    def draw(self,color='black', fig=plt, text=None):
+    def draw(self,color='black', fig=None, text=None):
         '''draw the point with the provided color. If text is not None, it is drawn near the point.'''
+        fig = get_fig(fig)
         if text is not None:
-            plt.annotate(str(text), (self.x(),self.y()))
+            pyplot().annotate(str(text), (self.x(),self.y()))
 
         fig.plot(self.x(), self.y(), color=color, marker="o")
 
-    def draw_edge(self, other_point, color='black', fig=plt, arrow=True):
+    def draw_edge(self, other_point, color='black', fig=None, arrow=True):
         '''draw an edge from this point to the provided point.
         if arrow=True then an arrowhead at the other point is drawn'''
+        fig = get_fig(fig)
         xs = [self.x(), other_point.x()]
         ys = [self.y(), other_point.y()]
         
@@ -138,12 +175,60 @@ class Point(object):
         in radians between -pi and pi'''
         return math.atan2(other.y()-self.y(), other.x()-self.x())
     
+    def cw_key(self, other):
+        '''return an exact sort key for the ray from this point to "other", such that sorting
+        rays from this point by their keys orders them clockwise, starting from the ray
+        pointing in the negative x-direction. rays are sorted as by decreasing self.angle(other).'''
+        return ClockwiseKey(self, other)
+
     def __str__(self):
         return "({},{},{})::({},{})".format(self._x, self._y, self._w, self.x(), self.y())
     
     def __repl__(self):
         return str(self)
 
+class ClockwiseKey(object):
+    '''a sort key for the ray from a center point through another point, ordering rays
+    clockwise from the negative x-direction without trigonometry or floating-point
+    arithmetic. rays are first classified by the axis or open quadrant containing them,
+    and only rays within the same open quadrant are compared with orient.
+
+    Attributes:
+        center  The origin of the ray
+        point   Another point on the ray
+        quad    The index of the axis or quadrant containing the ray, in clockwise order
+    '''
+
+    # the class of a ray by the signs of its x- and y-directions,
+    #   clockwise from the negative x-direction
+    QUADS = {
+        (-1, 0): 0,
+        (-1, 1): 1,
+        (0, 1): 2,
+        (1, 1): 3,
+        (1, 0): 4,
+        (1, -1): 5,
+        (0, -1): 6,
+        (-1, -1): 7,
+    }
+
+    __slots__ = ('center', 'point', 'quad')
+
+    def __init__(self, center, point):
+        dx = point._x*center._w - center._x*point._w
+        dy = point._y*center._w - center._y*point._w
+
+        self.center = center
+        self.point = point
+        self.quad = self.QUADS[((dx > 0) - (dx < 0), (dy > 0) - (dy < 0))]
+
+    def __lt__(self, other):
+        if self.quad != other.quad:
+            return self.quad < other.quad
+
+        # within an open quadrant, the other ray comes later if it is clockwise of this one
+        return self.quad % 2 == 1 and cw(self.center, self.point, other.point)
+
 class Circle(object):
     '''a class for drawing circles, useful for visualization'''
     def __init__(self, a, b, c):
@@ -159,7 +244,8 @@ class Circle(object):
         return cls(a,b,c)
 
     # https://math.stackexchange.com/a/3503338
-    def draw(self,fig=plt):
+    def draw(self,fig=None):
+        fig = get_fig(fig)
         z1 = complex(self._a.x(), self._a.y())
         z2 = complex(self._b.x(), self._b.y())
         z3 = complex(self._c.x(), self._c.y())
@@ -176,7 +262,7 @@ class Circle(object):
         c = (z2 - z1)*(w - abs(w)**2)/(2j*w.imag) + z1  # Simplified denominator
         r = abs(z1 - c)
         
-        circle1 = plt.Circle((c.real, c.imag), r, color='grey')
+        circle1 = pyplot().Circle((c.real, c.imag), r, color='grey')
         fig.gca().add_patch(circle1)
 
 class Segment(object):
@@ -226,7 +312,8 @@ class Segment(object):
     def __hash__(self):
         return self.p1.__hash__() + self.p2.__hash__()
 
-    def draw(self,fig=plt, color='blue', arrow=False):
+    def draw(self,fig=None, color='blue', arrow=False):
+        fig = get_fig(fig)
         xs = [self.p1.x(), self.p2.x()]
         ys = [self.p1.y(), self.p2.y()]
         if arrow:
@@ -335,7 +422,8 @@ class Line(Segment):
     def __init__(self, p1, p2):
         Segment.__init__(self, p1, p2)
 
-    def draw(self,fig=plt):
+    def draw(self,fig=None):
+        fig = get_fig(fig)
         fig.axline(self.p1.p(), self.p2.p())
 
     def intersect(self, other):
@@ -347,7 +435,7 @@ class Line(Segment):
         return other.intersect_line(self)
 
 def orient(p, q, r):
-    '''returns 0 if pqr are collinear, <0 if triangle pqr is CCW, >0 if triangle pqr is CW.'''
+    '''returns 0 if pqr are collinear, >0 if triangle pqr is CCW, <0 if triangle pqr is CW.'''
     wp = p._w
     wq = q._w
     wr = r._w
@@ -0,0 +1,355 @@
+import heapq
+import random
+from functools import cmp_to_key
+from primitives import *
+
+# the two colours of segments; segments of the same colour may only meet at their endpoints
+RED = 0
+BLUE = 1
+
+class _Node(object):
+    '''a node of the treap of a _Status, holding a segment and its pair of endpoints in sweep
+    order, with the number of nodes in its subtree'''
+    __slots__ = ('seg', 'ends', 'prio', 'size', 'left', 'right')
+
+    def __init__(self, seg, ends, prio):
+        self.seg = seg
+        self.ends = ends
+        self.prio = prio
+        self.size = 1
+        self.left = None
+        self.right = None
+
+def _size(t):
+    return 0 if t is None else t.size
+
+def _split(t, k):
+    '''splits the treap t into its first k nodes and the rest'''
+    if t is None:
+        return None, None
+    if _size(t.left) >= k:
+        a, t.left = _split(t.left, k)
+        t.size = _size(t.left) + _size(t.right) + 1
+        return a, t
+    t.right, b = _split(t.right, k - _size(t.left) - 1)
+    t.size = _size(t.left) + _size(t.right) + 1
+    return t, b
+
+def _merge(a, b):
+    '''returns the treap of the nodes of a followed by those of b'''
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.prio > b.prio:
+        a.right = _merge(a.right, b)
+        a.size = _size(a.left) + _size(a.right) + 1
+        return a
+    b.left = _merge(a, b.left)
+    b.size = _size(b.left) + _size(b.right) + 1
+    return b
+
+def _items(t, out):
+    # appends the (segment, ends) pairs of t to out in order
+    while t is not None:
+        _items(t.left, out)
+        out.append((t.seg, t.ends))
+        t = t.right
+
+class _Status(object):
+    '''the segments of one colour crossing the vertical sweep-line, ordered from bottom to top.
+    since segments of the same colour never cross, this order only changes at their endpoints.
+    the order is kept by position in a treap, a binary tree balanced by random priorities,
+    so that finding the segments through a point, replacing a range of m segments and finding
+    a segment by its position take O(log n + m) expected time.
+
+    Attributes:
+        root    The root of the treap of the segments crossing the sweep-line
+        rng     The seeded random number generator drawing the priorities of new nodes
+    '''
+
+    def __init__(self):
+        self.root = None
+        self.rng = random.Random(0)
+
+    def __len__(self):
+        return _size(self.root)
+
+    @staticmethod
+    def _side(t, p):
+        '''returns <0, 0 or >0 as the segment of node t passes below, through or above p,
+        which lies on the sweep-line. vertical segments only cross the sweep-line
+        while it stops at points along them, so they always pass through p.'''
+        start, end = t.ends
+        if start.equal_x(end):
+            return 0
+        return orient(start, p, end)
+
+    def _count(self, p, through):
+        # the number of segments passing below p, or also through p if "through" is True
+        t, count = self.root, 0
+        while t is not None:
+            side = self._side(t, p)
+            if side < 0 or (through and side == 0):
+                count += _size(t.left) + 1
+                t = t.right
+            else:
+                t = t.left
+        return count
+
+    def through(self, p):
+        '''returns the range [i,j) of the segments that pass through p'''
+        return self._count(p, False), self._count(p, True)
+
+    def replace(self, i, j, items):
+        '''replaces the segments in the range [i,j) with the given (segment, ends) pairs, and
+        returns the pairs of the replaced segments'''
+        left, rest = _split(self.root, i)
+        old, right = _split(rest, j-i)
+
+        new = None
+        for seg, ends in items:
+            new = _merge(new, _Node(seg, ends, self.rng.random()))
+        self.root = _merge(_merge(left, new), right)
+
+        replaced = []
+        _items(old, replaced)
+        return replaced
+
+    def get(self, i):
+        '''returns the i-th segment from the bottom, or None if there is none'''
+        if not 0 <= i < len(self):
+            return None
+        t = self.root
+        while True:
+            k = _size(t.left)
+            if i == k:
+                return t.seg
+            if i < k:
+                t = t.left
+            else:
+                i -= k+1
+                t = t.right
+
+def red_blue_intersections(red, blue):
+    '''given a list of red and a list of blue segments, where no two segments of the
+    same colour meet except at their endpoints, returns the set of points where a red
+    segment meets a blue segment, and a dict mapping the id of each segment to the set
+    of those points in its interior.
+
+    sweeps a vertical line from left to right, keeping the red and blue segments crossing it
+    in separate orders. segments of the same colour are never tested for intersection, and
+    segments of different colours are never compared with each other; red and blue segments
+    are only tested when they become neighbours at an event, as in the Bentley-Ottmann sweep.
+    unlike SweepLine, any number of segments may share an endpoint or meet at a point.
+    each of the O(n+k) events for n segments meeting at k points takes O(log n) orientation
+    tests, heap operations and updates of the statuses (see _Status), besides sorting the
+    segments through its point, so the sweep takes O((n+k) log n) expected time.'''
+    splits = {}
+
+    # the segments of each colour starting at each event point, which are the endpoints of
+    #   all segments and the points where segments of different colours are found to meet
+    starts = {}
+    for c, segs in ((RED, red), (BLUE, blue)):
+        for s in segs:
+            splits[id(s)] = set()
+            starts.setdefault(min(s.p1, s.p2), ([], []))[c].append(s)
+            starts.setdefault(max(s.p1, s.p2), ([], []))
+
+    events = list(starts)
+    heapq.heapify(events)
+
+    status = (_Status(), _Status())
+    points = set()
+
+    def schedule(a, b, p):
+        # record where a and b meet to the right of the sweep-line
+        if a is None or b is None:
+            return
+        inter = a.intersect(b)
+        if inter is not None and p < inter and inter not in starts:
+            starts[inter] = ([], [])
+            heapq.heappush(events, inter)
+
+    while len(events) > 0:
+        p = heapq.heappop(events)
+        started = starts.pop(p)
+
+        ranges = []
+        meeting = []
+        for c in (RED, BLUE):
+            i, j = status[c].through(p)
+
+            # segments passing through or ending at p are replaced by those leaving p
+            passing = status[c].replace(i, j, ())
+            leaving = [ (s, ends) for s, ends in passing if ends[1] != p ]
+            leaving.extend((s, (p, max(s.p1, s.p2))) for s in started[c])
+            leaving.sort(key=cmp_to_key(lambda a, b: orient(p, b[1][1], a[1][1])))
+
+            meeting.append([ s for s, _ in passing ] + started[c])
+            status[c].replace(i, i, leaving)
+            ranges.append((i, i+len(leaving)))
+
+        if len(meeting[RED]) > 0 and len(meeting[BLUE]) > 0:
+            points.add(p)
+            for segs in meeting:
+                for s in segs:
+                    if s.contains_interior_point(p):
+                        splits[id(s)].add(p)
+
+        # test the segments that became neighbours of another colour at p
+        (ri, rj), (bi, bj) = ranges
+        red_status, blue_status = status
+
+        if ri == rj and bi == bj:
+            schedule(red_status.get(ri-1), blue_status.get(bi), p)
+            schedule(blue_status.get(bi-1), red_status.get(ri), p)
+            continue
+
+        if ri < rj:
+            schedule(red_status.get(ri), blue_status.get(bi-1), p)
+            schedule(red_status.get(rj-1), blue_status.get(bj), p)
+        if bi < bj:
+            schedule(blue_status.get(bi), red_status.get(ri-1), p)
+            schedule(blue_status.get(bj-1), red_status.get(rj), p)
+
+    return points, splits
+
+def red_blue_overlay_intersect(dcel1, dcel2):
+    '''returns the set of points where edges of dcel1 meet edges of dcel2, and a dict
+    mapping the id of each edge of either DCEL to the set of those points in its interior'''
+    return red_blue_intersections(dcel1.edges, dcel2.edges)
+
+def sweep_segments(segs):
+    '''given a list of segments which may cross, touch and overlap anywhere, sweeps a vertical
+    line over them from left to right, yielding each point where segments start, end or meet
+    in sweep order, along with the list of segments starting at it and the list of those
+    passing through or ending at it.
+
+    the sweep of red_blue_intersections for segments of a single colour, which is the
+    Bentley-Ottmann sweep: every pair of segments that become neighbours at an event is
+    tested. as in red_blue_intersections, the sweep takes O((n+k) log n) expected time.'''
+    starts = {}
+    for s in segs:
+        starts.setdefault(min(s.p1, s.p2), []).append(s)
+        starts.setdefault(max(s.p1, s.p2), [])
+
+    events = list(starts)
+    heapq.heapify(events)
+
+    status = _Status()
+
+    def schedule(a, b, p):
+        # record where a and b meet to the right of the sweep-line
+        if a is None or b is None:
+            return
+        inter = a.intersect(b)
+        if inter is not None and p < inter and inter not in starts:
+            starts[inter] = []
+            heapq.heappush(events, inter)
+
+    while len(events) > 0:
+        p = heapq.heappop(events)
+        started = starts.pop(p)
+
+        # segments passing through or ending at p are replaced by those leaving p
+        i, j = status.through(p)
+        passing = status.replace(i, j, ())
+        yield p, started, [ s for s, _ in passing ]
+
+        leaving = [ (s, ends) for s, ends in passing if ends[1] != p ]
+        leaving.extend((s, (p, max(s.p1, s.p2))) for s in started)
+        leaving.sort(key=cmp_to_key(lambda a, b: orient(p, b[1][1], a[1][1])))
+        status.replace(i, i, leaving)
+
+        # test the segments that became neighbours at p
+        k = i + len(leaving)
+        schedule(status.get(i-1), status.get(i), p)
+        if k > i:
+            schedule(status.get(k-1), status.get(k), p)
+
+def split_segments(segs):
+    '''given a list of segments which may cross, touch and overlap anywhere, returns the list
+    of points where segments start, end or meet, in sweep order, and a list of the pieces
+    into which these points split the segments, as pairs of points in sweep order. pieces
+    shared by overlapping segments are reported once for each of them.
+
+    pieces are reported as the sweep of sweep_segments passes their right endpoints, so that
+    no points are collected per segment. the sweep takes O((n+k) log n) expected time.'''
+    points = []
+    pieces = []
+
+    # the last event point passed along each segment on the sweep-line
+    last = {}
+
+    for p, started, passing in sweep_segments(segs):
+        points.append(p)
+
+        # segments passing through or ending at p are split at p
+        for s in passing:
+            pieces.append((last[id(s)], p))
+            last[id(s)] = p
+        for s in started:
+            last[id(s)] = p
+
+    return points, pieces
+
+def generate_red_blue_segments(n, seed=None, size=10**6):
+    '''returns n red segments and n blue segments with random integer endpoints in
+    general position, where segments of the same colour lie in disjoint horizontal
+    (red) or vertical (blue) bands and so never meet. no segment is horizontal or
+    vertical, as required by SweepLine.'''
+    rng = random.Random(seed)
+
+    band = size//n
+    red, blue = [], []
+    for i in range(n):
+        x1 = rng.randrange(size)
+        x2 = min(size, x1 + rng.randrange(1, size//4))
+        y1, y2 = [ i*band + y for y in rng.sample(range(band), 2) ]
+        red.append(Segment(Point(x1, y1), Point(x2, y2)))
+
+        y1 = rng.randrange(size)
+        y2 = min(size, y1 + rng.randrange(1, size//4))
+        x1, x2 = [ i*band + x for x in rng.sample(range(band), 2) ]
+        blue.append(Segment(Point(x1, y1), Point(x2, y2)))
+
+    return red, blue
+
+if __name__=='__main__':
+    import time
+    from dcel_datasets import *
+    from dcel import naive_overlay_intersect, sweep_overlay_intersect
+    from sweep_line import SweepLine
+
+    def timed(f, *args):
+        start = time.time()
+        res = f(*args)
+        return res, time.time()-start
+
+    # the generic sweep requires segments in general position
+    print('n', 'inters', 'naive', 'sweep', 'red-blue', sep='\t')
+    for n in [100, 200, 400, 800, 1600]:
+        red, blue = generate_red_blue_segments(n, seed=n)
+        d1 = DCEL.from_points_segs([ p for s in red for p in (s.p1, s.p2) ], red, compute_faces=False)
+        d2 = DCEL.from_points_segs([ p for s in blue for p in (s.p1, s.p2) ], blue, compute_faces=False)
+
+        naive, t_naive = timed(naive_overlay_intersect, d1, d2)
+        sweep, t_sweep = timed(SweepLine().find_intersections, d1.edges + d2.edges)
+        (points, _), t_rb = timed(red_blue_overlay_intersect, d1, d2)
+
+        assert(naive == set(sweep) == points)
+        print(n, len(points), '%.3f' % t_naive, '%.3f' % t_sweep, '%.3f' % t_rb, sep='\t')
+
+    # overlays of subdivisions, whose edges share endpoints
+    print()
+    print('dataset', 'inters', 'naive', 'multi-sweep', 'red-blue', sep='\t')
+    for f in [edge_edge_test, vert_vert_test2, vert_edge_test2, disconnected_test, grid_lines_test]:
+        d1, d2 = f()
+
+        naive, t_naive = timed(naive_overlay_intersect, d1, d2)
+        _, t_multi = timed(sweep_overlay_intersect, [d1, d2])
+        (points, _), t_rb = timed(red_blue_overlay_intersect, d1, d2)
+
+        assert(naive == points)
+        print(f.__name__, len(points), '%.4f' % t_naive, '%.4f' % t_multi, '%.4f' % t_rb, sep='\t')
@@ -0,0 +1,185 @@
+import numpy as np
+from matplotlib.collections import LineCollection, PolyCollection
+from plotting import pyplot
+
+# bulk rendering of DCELs and segments, drawing each kind of record with a single
+#   matplotlib collection rather than one artist per record. for large views,
+#   records are decimated to the resolution of the axes before drawing.
+
+# the number of edges above which views are decimated by default
+LOD_EDGES = 10000
+
+# colors of faces by the number of overlayed DCELs with a bounded face containing them, as in Face.draw
+FACE_COLORS = ['black', 'lightblue', 'purple']
+
+def segment_array(segs):
+    '''returns an array of shape (n,2,2) with the endpoints of the given segments as floats'''
+    return np.array([ (s.p1.p(), s.p2.p()) for s in segs ], dtype=float).reshape(-1, 2, 2)
+
+def dcel_arrays(dcel):
+    '''exports the geometry of a DCEL as arrays of floats, returning a dict with
+        verts       an array of shape (nverts,2) of vertex coordinates
+        edges       an array of shape (nedges,2,2) of edge endpoints
+        hedges      an array of shape (nhedges,2,2) of halfedge origins and destinations
+        hedge_kind  an array of length nhedges, which is 1 for halfedges on outer cycles,
+                        -1 for those on inner cycles and 0 for those on no cycle
+        faces       a list of arrays of shape (k,2), the outer cycle of each bounded face
+        face_depth  an array with the number of overlayed DCELs with a bounded face
+                        containing each face in "faces"'''
+    verts = np.array([ v.p() for v in dcel.verts ], dtype=float).reshape(-1, 2)
+    edges = segment_array(dcel.edges)
+    hedges = np.array([ (h.origin.p(), h.twin.origin.p()) for h in dcel.hedges ], dtype=float).reshape(-1, 2, 2)
+    hedge_kind = np.array([ 0 if h.cycle is None else (1 if h.cycle.is_outer else -1) for h in dcel.hedges ], dtype=int)
+
+    faces = []
+    face_depth = []
+    for f in dcel.faces or []:
+        if f.outer is None or len(f.outer.hedges) == 0:
+            continue
+        faces.append(np.array([ h.origin.p() for h in f.outer.hedges ], dtype=float))
+        face_depth.append(sum(1 for d, g in f.overlay_data.items() if g is not d.infinite_face))
+
+    return {
+        'verts': verts,
+        'edges': edges,
+        'hedges': hedges,
+        'hedge_kind': hedge_kind,
+        'faces': faces,
+        'face_depth': np.array(face_depth, dtype=int),
+    }
+
+def shifted_hedges(hedges, r=0.15, shift=np.pi/10):
+    '''returns the halfedges in the array "hedges" of shape (n,2,2) shifted slightly left into their
+    incident faces, as drawn by Halfedge.draw'''
+    tail, head = hedges[:,0], hedges[:,1]
+    rad = np.arctan2(head[:,1]-tail[:,1], head[:,0]-tail[:,0])
+
+    t = tail + r*np.stack([np.cos(rad+shift), np.sin(rad+shift)], axis=1)
+    h = head + r*np.stack([np.cos(np.pi+rad-shift), np.sin(np.pi+rad-shift)], axis=1)
+    return np.stack([t, h], axis=1)
+
+def view_of(ax, data=None):
+    '''returns the bounds (xmin, ymin, xmax, ymax) in data coordinates and the size in pixels of
+    the axes ax. if the axes have no data yet, the bounds of the points in "data" are used.'''
+    width, height = ax.get_window_extent().size
+    if data is not None and len(data) > 0 and not ax.has_data():
+        lo, hi = data.min(axis=0), data.max(axis=0)
+    else:
+        (lo0, hi0), (lo1, hi1) = ax.get_xlim(), ax.get_ylim()
+        lo, hi = np.array([lo0, lo1]), np.array([hi0, hi1])
+    return (lo[0], lo[1], hi[0], hi[1]), (max(width, 1), max(height, 1))
+
+def decimate_lines(lines, bounds, pixels):
+    '''returns the indices of the lines of the array "lines" of shape (n,2,2) to draw in a view
+    of the given bounds and size in pixels: those lying partly within bounds, keeping one
+    line for each pair of pixels, and dropping lines that lie within a single pixel'''
+    xmin, ymin, xmax, ymax = bounds
+    lo = lines.min(axis=1)
+    hi = lines.max(axis=1)
+    idx = np.flatnonzero((hi[:,0] >= xmin) & (lo[:,0] <= xmax) & (hi[:,1] >= ymin) & (lo[:,1] <= ymax))
+
+    scale = np.array([ pixels[0]/max(xmax-xmin, 1e-300), pixels[1]/max(ymax-ymin, 1e-300) ])
+    cells = np.floor((lines[idx] - np.array([xmin, ymin]))*scale).astype(np.int64)
+
+    # lines within a single pixel are not drawn
+    distinct = np.any(cells[:,0] != cells[:,1], axis=1)
+    idx, cells = idx[distinct], cells[distinct]
+
+    # lines between the same pair of pixels are drawn once, regardless of their direction
+    swap = (cells[:,0,0] > cells[:,1,0]) | ((cells[:,0,0] == cells[:,1,0]) & (cells[:,0,1] > cells[:,1,1]))
+    cells[swap] = cells[swap][:, ::-1]
+    _, keep = np.unique(cells.reshape(-1, 4), axis=0, return_index=True)
+
+    return idx[np.sort(keep)]
+
+def decimate_polygon(poly, bounds, pixels):
+    '''returns the polygon "poly" of shape (k,2) with consecutive vertices in the same pixel of
+    a view of the given size in pixels merged, or None if it lies outside bounds or
+    within fewer than three pixels'''
+    xmin, ymin, xmax, ymax = bounds
+    lo, hi = poly.min(axis=0), poly.max(axis=0)
+    if hi[0] < xmin or lo[0] > xmax or hi[1] < ymin or lo[1] > ymax:
+        return None
+
+    scale = np.array([ pixels[0]/max(xmax-xmin, 1e-300), pixels[1]/max(ymax-ymin, 1e-300) ])
+    cells = np.floor((poly - np.array([xmin, ymin]))*scale).astype(np.int64)
+    keep = np.any(cells != np.roll(cells, 1, axis=0), axis=1)
+    if np.count_nonzero(keep) < 3:
+        return None
+    return poly[keep]
+
+def draw_segments(segs, ax=None, color='blue', lod=None, **kwargs):
+    '''draws the given segments, or an array of their endpoints of shape (n,2,2), as a single
+    LineCollection on the axes ax (by default, the current axes), and returns it. If lod is
+    True, or None and there are more than LOD_EDGES segments, they are decimated to the
+    resolution of the axes. other keyword arguments are passed to the LineCollection.'''
+    ax = pyplot().gca() if ax is None else ax
+    lines = segs if isinstance(segs, np.ndarray) else segment_array(segs)
+
+    if lod or (lod is None and len(lines) > LOD_EDGES):
+        bounds, pixels = view_of(ax, lines.reshape(-1, 2))
+        lines = lines[decimate_lines(lines, bounds, pixels)]
+
+    collection = LineCollection(lines, colors=color, **kwargs)
+    ax.add_collection(collection)
+    ax.autoscale_view()
+    return collection
+
+def draw_dcel(dcel, ax=None, faces=True, edges=True, verts=False, hedges=False, lod=None, color='blue'):
+    '''draws a DCEL with one collection per kind of record on the axes ax (by default, the
+    current axes), returning the list of collections:
+        - bounded faces are filled as in Face.draw, in a single PolyCollection,
+        - edges are drawn in the given color, in a single LineCollection,
+        - if verts is True, vertices are drawn with a single scatter, and
+        - if hedges is True, halfedges are drawn shifted into their faces as in Halfedge.draw,
+            blue on outer and red on inner cycles, in a single LineCollection.
+    If lod is True, or None and the DCEL has more than LOD_EDGES edges, records are decimated
+    to the resolution of the axes.'''
+    ax = pyplot().gca() if ax is None else ax
+    arrays = dcel_arrays(dcel)
+
+    decimate = lod or (lod is None and len(arrays['edges']) > LOD_EDGES)
+    if decimate:
+        bounds, pixels = view_of(ax, arrays['verts'])
+
+    collections = []
+
+    if faces and len(arrays['faces']) > 0:
+        polys = []
+        colors = []
+        for poly, depth in zip(arrays['faces'], arrays['face_depth']):
+            if decimate:
+                poly = decimate_polygon(poly, bounds, pixels)
+                if poly is None:
+                    continue
+            polys.append(poly)
+            colors.append(FACE_COLORS[min(depth, len(FACE_COLORS)-1)])
+
+        collection = PolyCollection(polys, facecolors=colors, edgecolors='none', alpha=0.5)
+        ax.add_collection(collection)
+        collections.append(collection)
+
+    if edges and len(arrays['edges']) > 0:
+        lines = arrays['edges']
+        if decimate:
+            lines = lines[decimate_lines(lines, bounds, pixels)]
+        collection = LineCollection(lines, colors=color)
+        ax.add_collection(collection)
+        collections.append(collection)
+
+    if hedges and len(arrays['hedges']) > 0:
+        # indexed by hedge_kind, so that -1 picks the last color
+        colors = np.array(['gray', 'blue', 'red'])[arrays['hedge_kind']]
+        lines = shifted_hedges(arrays['hedges'])
+        if decimate:
+            idx = decimate_lines(lines, bounds, pixels)
+            lines, colors = lines[idx], colors[idx]
+        collection = LineCollection(lines, colors=colors)
+        ax.add_collection(collection)
+        collections.append(collection)
+
+    if verts and len(arrays['verts']) > 0:
+        collections.append(ax.scatter(arrays['verts'][:,0], arrays['verts'][:,1], color='grey', s=8))
+
+    ax.autoscale_view()
+    return collections
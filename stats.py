@@ -0,0 +1,62 @@
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+class Stats(object):
+    '''opt-in instrumentation for sweeps and overlays. objects that accept a "stats" argument
+    record into it when it is a Stats object, and do nothing more than check for None otherwise.
+
+    Attributes:
+        counts      A Counter of named events, e.g. 'events.INSERT' or 'compare.exact'
+        maxima      The largest value recorded for each name, e.g. 'status.size'
+        times       The total wall time in seconds spent in each named phase, e.g. 'split'
+    '''
+
+    def __init__(self):
+        self.counts = Counter()
+        self.maxima = {}
+        self.times = {}
+
+    def count(self, name, n=1):
+        '''adds n to the counter with the given name'''
+        self.counts[name] += n
+
+    def record_max(self, name, value):
+        '''records value under the given name if it is the largest seen so far'''
+        if value > self.maxima.get(name, value-1):
+            self.maxima[name] = value
+
+    @contextmanager
+    def phase(self, name):
+        '''a context manager adding the wall time spent in its body to the phase with the given name'''
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - start
+
+    def merge(self, other):
+        '''adds the counts, maxima and times of another Stats object to this one'''
+        self.counts.update(other.counts)
+        for name, value in other.maxima.items():
+            self.record_max(name, value)
+        for name, t in other.times.items():
+            self.times[name] = self.times.get(name, 0.0) + t
+
+    def as_dict(self):
+        '''returns the recorded statistics as a dict of plain dicts, e.g. for json'''
+        return { 'counts': dict(self.counts), 'maxima': dict(self.maxima), 'times': dict(self.times) }
+
+    def __str__(self):
+        lines = []
+        for name, n in sorted(self.counts.items()):
+            lines.append('%-24s %d' % (name, n))
+        for name, value in sorted(self.maxima.items()):
+            lines.append('%-24s %d (max)' % (name, value))
+        for name, t in self.times.items():
+            lines.append('%-24s %.4fs' % (name, t))
+        return '\n'.join(lines)
+
+def phase(stats, name):
+    '''returns stats.phase(name), or a context manager doing nothing if stats is None'''
+    return nullcontext() if stats is None else stats.phase(name)
@@ -5,18 +5,29 @@ from event_queue import *
 from sweep_line_comparator import *
 import time
 import random
+from fractions import Fraction
+from functools import cmp_to_key
+from itertools import accumulate
 from sweep_line_datasets import *
 
 class SweepLine(AVLTree):
     '''an implementation of a balanced binary search tree, namely an AVL tree,
     using a custom comparator to sort segments on a moving horizontal sweep-line
-    by their points of intersection.'''
+    by their points of intersection.
+    If stats is a Stats object (see stats.py), it is shared with the comparator and the
+    event queue, and also records the largest size and height of the tree.
+    If chains is True, find_intersections sweeps over y-monotone chains of segments
+    rather than single segments (see find_chain_intersections).
+    If certificates is True, the comparator caches the order of each pair of keys it
+    compares until the pair is swapped (see SweepLineComparator).'''
 
     DRAW=False
 
-    def __init__(self):
-        super().__init__(SweepLineComparator())
-        self.queue = EventQueue()
+    def __init__(self, stats=None, chains=False, certificates=False):
+        super().__init__((ChainComparator if chains else SweepLineComparator)(stats=stats, certificates=certificates))
+        self.queue = EventQueue(stats=stats)
+        self.stats = stats
+        self.chains = chains
 
     def swap(self, left, right):
         '''swaps the positions of two segments, left and right, within the tree.
@@ -31,6 +42,14 @@ class SweepLine(AVLTree):
 
         node_left.key, node_right.key = node_right.key, node_left.key
 
+        # the two keys swap their order
+        self.comparator.invalidate(left, right)
+
+    def delete(self, key):
+        '''deletes key from the tree, along with the comparator's certificates for it'''
+        super().delete(key)
+        self.comparator.forget(key)
+
 
     def handle_insert(self, seg : Segment):
 
@@ -44,6 +63,10 @@ class SweepLine(AVLTree):
         self.comparator.set_last(seg.top)
         super().insert(seg) # sorted by x-coordinate of intersection with sweep line (from sweep_line_comparator.py)
 
+        if self.stats is not None:
+            self.stats.record_max('status.size', self.size)
+            self.stats.record_max('status.height', self.height(self.root))
+
         left_neighbor = self.left_neighbor(seg)
         right_neighbor = self.right_neighbor(seg)
 
@@ -81,7 +104,7 @@ class SweepLine(AVLTree):
 
         new_evts = []
         
-        super().delete(seg)
+        self.delete(seg)
 
         if left_neighbor and right_neighbor:
             intersection_point = left_neighbor.intersect(right_neighbor)
@@ -140,7 +163,11 @@ class SweepLine(AVLTree):
             - no three segments intersect, and
             - no two segments intersect at their endpoints.
         As a consequence, all events (see event_queue.py) have different y-coordinates.
+        In chain mode, segments may also share endpoints (see find_chain_intersections).
         '''
+        if self.chains:
+            return self.find_chain_intersections(segs)
+
         inters = []
 
         # initialize queue with insertion and deletion events
@@ -153,19 +180,15 @@ class SweepLine(AVLTree):
 
             evt = self.queue.pop()
 
-            """
             if self.DRAW:
-                for s in segs:
-                    s.draw(color='grey')
-
-                segs_on_line = self.in_order()
-                for s in segs_on_line:
-                    s.draw(color='black')
+                # all segments, and those on the sweep-line, are each drawn as one collection
+                from render import draw_segments
+                draw_segments(segs, color='grey')
+                draw_segments(self.in_order(), color='black')
 
                 self.comparator.draw()
 
                 evt.point.draw()
-            """
 
             match evt.kind:
                 case EventKind.INSERT:                    
@@ -199,10 +222,316 @@ class SweepLine(AVLTree):
                 self.queue.push(e)
 
             if self.DRAW:
-                plt.show()
+                pyplot().show()
         
         return inters
 
+    def find_chain_intersections(self, segs):
+        '''compute the points where the given segments cross, sweeping over the y-monotone
+        chains they form (see monotone_chains) rather than over single segments, assuming:
+            - no two distinct endpoints have the same y-coordinate,
+            - no three chains cross at a point, and
+            - chains only meet at their endpoints where they share them.
+        points where segments meet at shared endpoints are not reported. there is one event
+        at the top and bottom of each chain and at each crossing, and the segment of each
+        chain crossing the sweep-line is only found when the chain is compared (see Chain.at),
+        so long polylines of many short segments take few tree operations. neighbouring chains
+        are walked down lazily, by a JOINT event where the segment of either ending higher
+        joins its next one (see Chain.meet), so each joint is passed at most once for each
+        pair of neighbours it lies between.'''
+        inters = []
+
+        # the chains starting and ending at each of their endpoints
+        ends = {}
+        for c in monotone_chains(segs):
+            ends.setdefault(c.top, ([], []))[0].append(c)
+            ends.setdefault(c.bottom, ([], []))[1].append(c)
+
+        for p, (starting, ending) in ends.items():
+            self.queue.push(Event(EventKind.INSERT if len(starting) > 0 else EventKind.DELETE, p, ()))
+
+        def schedule(left, right, p):
+            if left is None or right is None:
+                return
+            inter, joint = left.meet(right, p)
+            if inter is not None:
+                self.queue.push(Event(EventKind.INTER, inter, (left, right)))
+            elif joint is not None:
+                chain, q = joint
+                self.queue.push(Event(EventKind.JOINT, q, (chain,)))
+
+        comparator = self.comparator
+        while self.queue.size() > 0:
+            evt = self.queue.pop()
+            p = evt.point
+
+            if evt.kind == EventKind.INTER:
+                inters.append(p)
+                left, right = evt.involved
+                self.swap(left, right)
+                comparator.set_last(p)
+
+                # chains may cross again below p
+                schedule(right, left, p)
+                schedule(self.left_neighbor(right), right, p)
+                schedule(left, self.right_neighbor(left), p)
+                continue
+
+            # the chain passes a joint, so it is tested again with its neighbours. their order
+            #   has not changed since the last event, so the sweep-line is left there, away
+            #   from any crossing at the height of the joint
+            if evt.kind == EventKind.JOINT:
+                chain, = evt.involved
+                schedule(self.left_neighbor(chain), chain, p)
+                schedule(chain, self.right_neighbor(chain), p)
+                continue
+
+            starting, ending = ends[p]
+            comparator.set_last(p)
+
+            # chains ending at p all meet the sweep-line at p, so they are told apart
+            #   by their order just above it
+            comparator.above = True
+            for c in ending:
+                left, right = self.left_neighbor(c), self.right_neighbor(c)
+                self.delete(c)
+                if len(starting) == 0:
+                    schedule(left, right, p)
+            comparator.above = False
+
+            for c in starting:
+                AVLTree.insert(self, c)
+                if self.stats is not None:
+                    self.stats.record_max('status.size', self.size)
+                    self.stats.record_max('status.height', self.height(self.root))
+                schedule(self.left_neighbor(c), c, p)
+                schedule(c, self.right_neighbor(c), p)
+
+        return inters
+
+    def find_any_intersection(self, segs):
+        '''returns a pair of the given segments that cross, touch or overlap anywhere but at an
+        endpoint of both, along with a point they share, or None if there is no such pair.
+        unlike find_intersections, segments may share endpoints and be horizontal, as the
+        edges of a DCEL.
+
+        a Shamos-Hoey sweep in O(n log n) time, which stops at the first such pair found:
+        only the segments that become neighbours on the sweep-line are tested. to avoid
+        horizontal segments and endpoints at the same height, the segments are first
+        sheared by an exact affine map, which preserves where they meet.'''
+        sheared = _sheared(segs)
+        original = { id(t): s for s, t in zip(segs, sheared) }
+
+        # the segments starting and ending at each endpoint, in order of the sweep
+        events = {}
+        for t in sheared:
+            events.setdefault(t.top, ([], []))[0].append(t)
+            events.setdefault(t.bottom, ([], []))[1].append(t)
+
+        order = sorted(events, key=cmp_to_key(lambda p, q: -1 if p.is_above(q) or (p.equal_y(q) and p.is_left_of(q)) else 1))
+
+        def found(a, b):
+            a, b = original[id(a)], original[id(b)]
+            return a, b, conflict(a, b)
+
+        def test(a, b):
+            return a is not None and b is not None and conflict(a, b) is not None
+
+        comparator = self.comparator
+        for p in order:
+            starting, ending = events[p]
+            comparator.set_last(p)
+
+            # segments ending at p all meet the sweep-line at p, so they are told apart
+            #   by their order just above it
+            comparator.above = True
+            for t in ending:
+                left, right = self.left_neighbor(t), self.right_neighbor(t)
+                self.delete(t)
+                if test(left, right):
+                    return found(left, right)
+            comparator.above = False
+
+            # any segment left on the sweep-line at p passes through p
+            t = self._passing_through(p)
+            if t is not None:
+                return found(t, (starting + ending)[0])
+
+            # segments starting at p in the same direction overlap
+            starting.sort(key=lambda t: p.cw_key(t.bottom))
+            for a, b in zip(starting, starting[1:]):
+                if test(a, b):
+                    return found(a, b)
+
+            for t in starting:
+                AVLTree.insert(self, t)
+                if self.stats is not None:
+                    self.stats.record_max('status.size', self.size)
+                for other in (self.left_neighbor(t), self.right_neighbor(t)):
+                    if test(t, other):
+                        return found(t, other)
+
+        return None
+
+    def _passing_through(self, p):
+        '''returns a segment in the tree which meets the sweep-line at p, or None'''
+        node = self.root
+        while node is not None:
+            inter = self.comparator.get_exact_intersect(node.key)
+            if inter == p:
+                return node.key
+            node = node.right if inter.is_left_of(p) else node.left
+        return None
+
+class Chain(object):
+    '''a y-monotone chain of segments, swept by SweepLine in chain mode as a single key
+
+    Attributes:
+        points      The endpoints of the segments, from top to bottom
+        segs        The segments, from top to bottom
+        top         The first point
+        bottom      The last point
+        current     The index of the segment crossing the sweep-line when the chain was
+                        last compared, which only moves down the chain
+        lower       The index of the segment crossing the horizontal line just below the
+                        point at which the chain was last tested against a neighbour (see
+                        below), which only moves down the chain
+        lo, hi      The least and greatest x-coordinates, as floats, of the points from
+                        each index to the bottom
+    '''
+
+    def __init__(self, points, segs):
+        self.points = points
+        self.segs = segs
+        self.top = points[0]
+        self.bottom = points[-1]
+        self.current = 0
+        self.lower = 0
+
+        xs = [ p.x() for p in points ]
+        self.lo = list(accumulate(reversed(xs), min))[::-1]
+        self.hi = list(accumulate(reversed(xs), max))[::-1]
+
+    def at(self, p):
+        '''returns the segment of this chain crossing the horizontal line through p, which lies
+        below the points at which the chain was compared before'''
+        i = self.current
+        while i < len(self.segs)-1 and self.points[i+1].is_above(p):
+            i += 1
+        self.current = i
+        return self.segs[i]
+
+    def below(self, p):
+        '''returns the index of the segment of this chain crossing the horizontal line just
+        below p, which is the segment after the one ending at p if p is a joint of this chain'''
+        i = self.lower
+        while i < len(self.segs)-1 and not self.points[i+1].is_below(p):
+            i += 1
+        self.lower = i
+        return i
+
+    def meet(self, other, p):
+        '''returns the pair (inter, joint) for the segments of this chain and the other chain
+        crossing the horizontal line just below p, where inter is the point below p where they
+        cross, or None. if they do not cross, the chains are only walked further when the
+        segment ending higher is passed, so joint is that chain and the point where it joins
+        its next segment, at which the chains must be tested again, or None if the chains
+        cannot meet below p because that segment ends the chain, or because the remaining
+        parts of the chains have disjoint x-ranges.'''
+        i, j = self.below(p), other.below(p)
+        if self.hi[i] < other.lo[j] or other.hi[j] < self.lo[i]:
+            return None, None
+
+        # chains sharing an endpoint meet there without crossing
+        s, t = self.segs[i], other.segs[j]
+        inter = s.intersect(t)
+        if inter is not None and inter.is_below(p) and not (
+                (inter == s.p1 or inter == s.p2) and (inter == t.p1 or inter == t.p2)):
+            return inter, None
+
+        chain, k = (self, i) if self.points[i+1].is_above(other.points[j+1]) else (other, j)
+        if k == len(chain.segs)-1:
+            return None, None
+        return None, (chain, chain.points[k+1])
+
+def monotone_chains(segs):
+    '''returns the maximal y-monotone chains formed by the given segments, none of which are
+    horizontal, as a list of Chain objects. two segments are joined in a chain at an
+    endpoint shared by only those two segments, where one lies above and the other below.'''
+    incident = {}
+    for s in segs:
+        for p in (s.p1, s.p2):
+            incident.setdefault(p, []).append(s)
+
+    def joined(p):
+        # the segment leaving p downwards, if p joins two segments in a chain
+        around = incident[p]
+        if len(around) != 2:
+            return None
+        a, b = around
+        if a.bottom == p and b.top == p:
+            return b
+        if b.bottom == p and a.top == p:
+            return a
+        return None
+
+    chains = []
+    for s in segs:
+        # chains start at the segments whose tops do not join them to a segment above
+        if joined(s.top) is s:
+            continue
+
+        points, chain = [s.top], []
+        while s is not None:
+            chain.append(s)
+            points.append(s.bottom)
+            s = joined(s.bottom)
+        chains.append(Chain(points, chain))
+
+    return chains
+
+def _sheared(segs):
+    '''returns copies of the given segments under the shear (x,y) -> (x, y + x/m), where m is
+    chosen so that distinct endpoints have distinct y-coordinates, and so no segment is
+    horizontal: larger than the width of the endpoints over the least gap between their
+    distinct y-coordinates. equal endpoints stay equal.'''
+    xs = { Fraction(p._x, p._w) for s in segs for p in (s.p1, s.p2) }
+    ys = sorted({ Fraction(p._y, p._w) for s in segs for p in (s.p1, s.p2) })
+
+    gap = min((b-a for a, b in zip(ys, ys[1:])), default=Fraction(1))
+    m = (max(xs) - min(xs))/gap + 1 if len(xs) > 0 else Fraction(1)
+
+    a, b = m.numerator, m.denominator
+    points = {}
+    def shear(p):
+        if p not in points:
+            points[p] = Point(p._x*a, p._y*a + p._x*b, p._w*a)
+        return points[p]
+
+    return [ Segment(shear(s.p1), shear(s.p2)) for s in segs ]
+
+def conflict(a, b):
+    '''returns a point where the segments a and b meet, other than at an endpoint of both,
+    or None if there is none. for collinear overlapping segments, this is an endpoint
+    of one lying on the other.'''
+    inter = a.intersect(b)
+    if inter is not None:
+        shared = (inter == a.p1 or inter == a.p2) and (inter == b.p1 or inter == b.p2)
+        return None if shared else inter
+
+    if not (collinear(a.p1, a.p2, b.p1) and collinear(a.p1, a.p2, b.p2)):
+        return None
+
+    for s, t in ((a, b), (b, a)):
+        for p in (t.p1, t.p2):
+            if s.contains_interior_point(p):
+                return p
+
+    # the same segment twice
+    if (a.p1 == b.p1 and a.p2 == b.p2) or (a.p1 == b.p2 and a.p2 == b.p1):
+        return a.p1
+    return None
+
 def naive_seg_inter(segs):
     inters = []
     for i in range(len(segs)-1):
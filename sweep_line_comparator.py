@@ -1,5 +1,5 @@
 from primitives import Line, cw, ccw
-import matplotlib.pyplot as plt
+from plotting import get_fig
 
 class SweepLineComparator(object):
     '''A custom comparator for use by the provided AVL tree (in `avl.py`),
@@ -12,18 +12,33 @@ class SweepLineComparator(object):
                         line attribute
         y           The y-coordinate of the sweep-line as floating-point (for efficiency)
         line        A horizontal Line object through self.y
+        stats       None, or a Stats object (see stats.py) counting calls to compare,
+                        and how many were decided in floating-point, exactly, or by a
+                        certificate
+        above       If True, segments meeting the sweep-line at the same point are ordered
+                        as on sweep-lines just above it, rather than just below it
+        certificates    None, or a dict caching the order of each pair of keys compared, as
+                        certificates[id(a)][id(b)] = (order, b), which keeps b so that its id
+                        is not reused. the order of two segments on the sweep-line only
+                        changes where they cross, so a certificate stays valid until the tree
+                        swaps the pair at an intersection event (see invalidate), or either
+                        key leaves the tree (see forget)
     '''
 
     EPS = 0.01 # a parameter used to determine when to rely on arbitrary-precision math
 
-    def __init__(self, last=None):
+    def __init__(self, last=None, stats=None, certificates=False):
         self.last = last
+        self.stats = stats
+        self.above = False
+        self.certificates = {} if certificates else None
         self.y = None if last is None else last.y()
         self.line = None if last is None else Line(last, last.translate(1,0)) # arbitrary shift in x-dir
 
     def set_last(self, last):
         '''sets the sweep-line to the y-coordinate of the provided point,
         which is assumed to be the most-recently processed event'''
+        self.last = last
         self.y = None if last is None else last.y()
         self.line = None if last is None else Line(last, last.translate(1,0)) # arbitrary shift in x-dir
 
@@ -52,31 +67,94 @@ class SweepLineComparator(object):
 
         return xi
 
+    def invalidate(self, a, b):
+        '''discards the certificates of the order of a and b, which are swapped. the order of
+        either with any other key is unchanged, as no other pair crosses at the same point.'''
+        certificates = self.certificates
+        if certificates is not None:
+            certificates.get(id(a), {}).pop(id(b), None)
+            certificates.get(id(b), {}).pop(id(a), None)
+
+    def forget(self, a):
+        '''discards every certificate involving a, which has left the tree, so that only pairs
+        of keys in the tree are cached'''
+        certificates = self.certificates
+        if certificates is not None:
+            ia = id(a)
+            for ib in certificates.pop(ia, ()):
+                certificates[ib].pop(ia, None)
+
     def compare(self, a, b):
         '''compares the x-coordinates of the intersections of the lines
-        supporting a and b with the horizontal sweep-line y=self.y'''
+        supporting a and b with the horizontal sweep-line y=self.y,
+        answered by a certificate if there is one'''
+
+        stats = self.stats
+        if stats is not None:
+            stats.count('compare.calls')
 
         if a == b:
             return 0
 
+        certificates = self.certificates
+        if certificates is None:
+            return self.order(a, b)
+
+        ia, ib = id(a), id(b)
+        known = certificates.get(ia)
+        if known is None:
+            known = certificates[ia] = {}
+        cert = known.get(ib)
+        if cert is not None:
+            if stats is not None:
+                stats.count('compare.cached')
+            return cert[0]
+
+        res = self.order(a, b)
+        known[ib] = (res, b)
+        certificates.setdefault(ib, {})[ia] = (-res, a)
+        return res
+
+    def order(self, a, b):
+        '''compares a and b as in compare, without certificates'''
+        stats = self.stats
+
         fa = self.get_fast_intersect(a)
         fb = self.get_fast_intersect(b)
 
         if abs(fa-fb) > self.EPS:
+            if stats is not None:
+                stats.count('compare.fast')
             return (fa > fb) - (fa < fb)
 
+        if stats is not None:
+            stats.count('compare.exact')
+
         ia = self.get_exact_intersect(a)
         ib = self.get_exact_intersect(b)
 
         assert(ia is not None and ib is not None)
  
         if ia == ib:
+            if self.above:
+                # put a before b if a's intersection on higher sweep-lines is left of b's
+                return ccw(ia, a.top, b.top) - cw(ia, a.top, b.top)
+
             # if they have same intersection with the current sweep-line,
             #   put a before b if a's intersection on lower sweep-lines is left of b's
             return cw(ia, a.bottom, b.bottom) - ccw(ia, a.bottom, b.bottom)
     
         return (ia > ib) - (ia < ib)
     
-    def draw(self, fig=plt):
+    def draw(self, fig=None):
+        fig = get_fig(fig)
         if self.line:
-            self.line.draw(fig=fig)
\ No newline at end of file
+            self.line.draw(fig=fig)
+
+class ChainComparator(SweepLineComparator):
+    '''A SweepLineComparator for the y-monotone chains swept by SweepLine in chain mode
+    (see Chain in sweep_line.py), comparing two chains by their segments crossing the
+    sweep-line through the last point.'''
+
+    def order(self, a, b):
+        return super().order(a.at(self.last), b.at(self.last))
@@ -1,6 +1,8 @@
+import math
 import random
 from itertools import islice
 from primitives import Point, Segment
+from kernel import segment_array, orient_signs, intersect_all
 
 def sample_integer_points(n,xoffset=0,yoffset=0,sparsity=5):
     '''returns a set of points with distinct integer coordinates,
@@ -17,6 +19,48 @@ def generate_random_segments(n):
     segs = [ Segment(p1,p2) for p1,p2 in zip(pts[:n],pts[n:]) ]
     return segs
 
+def generate_general_segments(n, seed=None, sparsity=5):
+    '''returns n segments as paired random integer endpoints, as in generate_random_segments,
+    in the general position required by SweepLine: no two endpoints share an x- or
+    y-coordinate, no two segments are collinear, no segment passes through an endpoint of
+    another, and no three segments meet at a point. segments breaking these are redrawn.'''
+    rng = random.Random(seed)
+    side = sparsity*2*n
+
+    xs, ys = set(), set()
+    def fresh(used):
+        while True:
+            c = rng.randrange(side)
+            if c not in used:
+                return c
+
+    segs = []
+    ends = set()
+    crossings = set()
+    while len(segs) < n:
+        x1, y1 = fresh(xs), fresh(ys)
+        x2, y2 = fresh(xs | {x1}), fresh(ys | {y1})
+        seg = Segment(Point(x1, y1), Point(x2, y2))
+
+        if len(segs) > 0:
+            a = segment_array(segs)
+            b = segment_array([seg])[0]
+            if ((orient_signs(b[0], b[1], a[:,0]) == 0) & (orient_signs(b[0], b[1], a[:,1]) == 0)).any():
+                continue
+
+        found = [ p for _, _, p in intersect_all([seg], segs) ]
+        if (len(set(found)) < len(found) or any(p in ends or p in crossings for p in found)
+                or seg.p1 in found or seg.p2 in found):
+            continue
+
+        xs.update((x1, x2))
+        ys.update((y1, y2))
+        ends.update((seg.p1, seg.p2))
+        crossings.update(found)
+        segs.append(seg)
+
+    return segs
+
 def generate_tall_verticals(n):
     '''returns a set of n disjoint vertical segments that intersect the x-axis'''
     return [
@@ -27,4 +71,71 @@ def generate_short_verticals(n):
     '''returns a set of n disjoint vertical segments with disjoint y-intervals'''
     return [
         Segment(Point(i,i),Point(2*i+1,2*i+1,2)) for i in range(n)
-    ]
\ No newline at end of file
+    ]
+
+def generate_segments(n, k, seed=None, size=10**9):
+    '''returns n segments of equal length and random directions in the square [0,size]^2,
+    whose length is chosen so that about k pairs of them intersect. as required by
+    SweepLine, no two endpoints share an x- or y-coordinate.'''
+    rng = random.Random(seed)
+
+    # two segments of length l with random positions and directions in a region of area a
+    #   meet with probability 2l^2/(pi*a), where their midpoints range over a square of side size-l
+    pairs = max(1, n*(n-1)//2)
+    r = math.sqrt(k*math.pi/(2*pairs))
+    length = size*r/(1+r)
+    half = length/2
+
+    xs, ys = set(), set()
+    segs = []
+    while len(segs) < n:
+        cx = rng.uniform(half, size-half)
+        cy = rng.uniform(half, size-half)
+        a = rng.uniform(0, math.pi)
+        dx, dy = half*math.cos(a), half*math.sin(a)
+
+        x1, y1, x2, y2 = round(cx-dx), round(cy-dy), round(cx+dx), round(cy+dy)
+        if len({x1, x2} | xs) != len(xs)+2 or len({y1, y2} | ys) != len(ys)+2:
+            continue
+
+        xs.update((x1, x2))
+        ys.update((y1, y2))
+        segs.append(Segment(Point(x1, y1), Point(x2, y2)))
+
+    return segs
+
+def generate_polylines(n, m, seed=None, size=10**9):
+    '''returns the segments of n random walks of m steps each in the square [0,size]^2, where
+    the walks cross each other and themselves. no two vertices share an x- or y-coordinate
+    and no two consecutive steps are collinear, so that the walks split into y-monotone
+    chains as required by SweepLine in chain mode.'''
+    rng = random.Random(seed)
+    step = max(2, size // (4*math.isqrt(max(m, 1))))
+
+    xs, ys = set(), set()
+    def fresh(x, y):
+        if x in xs or y in ys:
+            return None
+        xs.add(x)
+        ys.add(y)
+        return Point(x, y)
+
+    segs = []
+    for _ in range(n):
+        p = None
+        while p is None:
+            p = fresh(rng.randrange(size), rng.randrange(size))
+
+        walk = [p]
+        while len(walk) <= m:
+            q = walk[-1]
+            x = min(size, max(0, q._x + rng.randint(-step, step)))
+            y = min(size, max(0, q._y + rng.randint(-step, step)))
+            if len(walk) > 1 and (x - q._x)*(q._y - walk[-2]._y) == (y - q._y)*(q._x - walk[-2]._x):
+                continue
+            p = fresh(x, y)
+            if p is not None:
+                walk.append(p)
+
+        segs.extend(Segment(a, b) for a, b in zip(walk, walk[1:]))
+    return segs
\ No newline at end of file
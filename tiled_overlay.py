@@ -0,0 +1,206 @@
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from primitives import *
+from dcel import DCEL, overlay
+
+def _point(p):
+    '''return a plain Point with the coordinates of p (which may be a Vertex),
+    so that it can be sent to a worker process without its halfedge records'''
+    return Point(p._x, p._y, p._w)
+
+def _fx(p):
+    return Fraction(p._x, p._w)
+
+def _fy(p):
+    return Fraction(p._y, p._w)
+
+def _vertical_line(c):
+    '''return the vertical Line x=c for a Fraction c'''
+    return Line(Point(c.numerator, 0, c.denominator), Point(c.numerator, c.denominator, c.denominator))
+
+def _horizontal_line(c):
+    '''return the horizontal Line y=c for a Fraction c'''
+    return Line(Point(0, c.numerator, c.denominator), Point(c.denominator, c.numerator, c.denominator))
+
+def tile_cuts(dcels, nx, ny):
+    '''return the interior x- and y-coordinates, as Fractions, of the lines that
+    partition the bounding box of the given DCELs into an nx by ny grid of tiles'''
+    pts = [ v for d in dcels for v in d.verts ]
+    xs = [ _fx(p) for p in pts ]
+    ys = [ _fy(p) for p in pts ]
+    xmin, xmax = min(xs), max(xs)
+    ymin, ymax = min(ys), max(ys)
+
+    xcuts = [ xmin + i*(xmax-xmin)/nx for i in range(1, nx) ]
+    ycuts = [ ymin + j*(ymax-ymin)/ny for j in range(1, ny) ]
+    return xcuts, ycuts
+
+def split_at_cuts(seg, xcuts, ycuts):
+    '''split a segment at every tile line crossing its interior, returning
+    the list of points along it from seg.p1 to seg.p2 (inclusive)'''
+    lx, rx = sorted([_fx(seg.p1), _fx(seg.p2)])
+    by, ty = sorted([_fy(seg.p1), _fy(seg.p2)])
+
+    pts = {}
+    for c in xcuts:
+        if lx < c < rx:
+            p = seg.intersect_line(_vertical_line(c))
+            pts[p] = p
+    for c in ycuts:
+        if by < c < ty:
+            p = seg.intersect_line(_horizontal_line(c))
+            pts[p] = p
+
+    # order the interior points from p1 to p2
+    inner = sorted(pts.values(), reverse=seg.p2 < seg.p1)
+    return [_point(seg.p1)] + inner + [_point(seg.p2)]
+
+def tile_of(p, q, xcuts, ycuts):
+    '''return the (column,row) index of the half-open tile containing the midpoint of pq'''
+    mx = (_fx(p) + _fx(q))/2
+    my = (_fy(p) + _fy(q))/2
+    return bisect_right(xcuts, mx), bisect_right(ycuts, my)
+
+def partition_edges(dcel, xcuts, ycuts):
+    '''return a dict mapping tile indices to the pieces of the edges of dcel within that tile,
+    along with the set of points introduced by splitting edges at tile lines'''
+    tiles = {}
+    seams = set()
+    for e in dcel.edges:
+        pts = split_at_cuts(e, xcuts, ycuts)
+        seams.update(pts[1:-1])
+        for p, q in zip(pts, pts[1:]):
+            tiles.setdefault(tile_of(p, q, xcuts, ycuts), []).append(Segment(p, q))
+
+    return tiles, seams
+
+def _segs_dcel(segs):
+    '''build a DCEL from a list of non-crossing segments'''
+    points = {}
+    for s in segs:
+        points[s.p1] = s.p1
+        points[s.p2] = s.p2
+    return DCEL.from_points_segs(list(points.values()), segs)
+
+def overlay_tile(task):
+    '''overlay the pieces of two DCELs within a single tile, returning the
+    edges of the result as pairs of Points. runs in a worker process.'''
+    segs1, segs2 = task
+
+    if len(segs1) == 0 or len(segs2) == 0:
+        return [ (s.p1, s.p2) for s in segs1 + segs2 ]
+
+    ol = overlay(_segs_dcel(segs1), _segs_dcel(segs2))
+    return [ (_point(e.p1), _point(e.p2)) for e in ol.edges ]
+
+def split_on_cuts(tile_edges, xcuts, ycuts):
+    '''split every tile edge lying on a tile line at the endpoints of other tile edges
+    strictly inside it. such an edge is sent only to the tile above or right of its line,
+    so a vertex touching it from the other side is not resolved by any tile overlay.'''
+    xset, yset = set(xcuts), set(ycuts)
+
+    # the points on each tile line, ordered along it
+    on_x, on_y = {}, {}
+    for p in { p for pq in tile_edges for p in pq }:
+        x, y = _fx(p), _fy(p)
+        if x in xset:
+            on_x.setdefault(x, []).append((y, p))
+        if y in yset:
+            on_y.setdefault(y, []).append((x, p))
+    for line in list(on_x.values()) + list(on_y.values()):
+        line.sort(key=lambda t: t[0])
+
+    res = []
+    for p, q in tile_edges:
+        if _fx(p) == _fx(q) and _fx(p) in on_x:
+            line, lo, hi = on_x[_fx(p)], _fy(p), _fy(q)
+        elif _fy(p) == _fy(q) and _fy(p) in on_y:
+            line, lo, hi = on_y[_fy(p)], _fx(p), _fx(q)
+        else:
+            res.append((p, q))
+            continue
+
+        keys = [ k for k, _ in line ]
+        i, j = bisect_right(keys, min(lo, hi)), bisect_left(keys, max(lo, hi))
+        inner = [ r for _, r in line[i:j] ]
+        if lo > hi:
+            inner.reverse()
+
+        pts = [p] + inner + [q]
+        res.extend(zip(pts, pts[1:]))
+
+    return res
+
+def stitch(tile_edges, seams, originals, xcuts, ycuts):
+    '''join the per-tile overlay edges into a single list of segments, splitting edges on
+    the tile lines where other edges touch them (see split_on_cuts), and merging each pair
+    of edges that was split only by a tile line back into one edge'''
+    adj = {}
+    points = {}
+    for p, q in set(frozenset(pq) for pq in split_on_cuts(tile_edges, xcuts, ycuts)):
+        p = points.setdefault(p, p)
+        q = points.setdefault(q, q)
+        adj.setdefault(p, []).append(q)
+        adj.setdefault(q, []).append(p)
+
+    # a seam point of degree two that is neither an original vertex nor an
+    #   intersection joins two collinear pieces of a single edge
+    for s in seams:
+        if s in originals or s not in adj or len(adj[s]) != 2:
+            continue
+
+        a, b = adj.pop(s)
+        adj[a][adj[a].index(s)] = b
+        adj[b][adj[b].index(s)] = a
+        del points[s]
+
+    segs = []
+    for p, nbrs in adj.items():
+        for q in nbrs:
+            if p < q:
+                segs.append(Segment(p, q))
+
+    return list(points.values()), segs
+
+def tiled_overlay(dcel1, dcel2, nx=2, ny=2, compute_faces=False, max_workers=None):
+    '''returns a DCEL which is the overlay of dcel1 and dcel2, computed by partitioning
+    both into an nx by ny grid of tiles, overlaying each tile in a separate process,
+    and stitching the tiles back together along the tile lines.
+    If max_workers is 0, the tiles are overlayed in this process.'''
+    xcuts, ycuts = tile_cuts([dcel1, dcel2], nx, ny)
+
+    tiles1, seams1 = partition_edges(dcel1, xcuts, ycuts)
+    tiles2, seams2 = partition_edges(dcel2, xcuts, ycuts)
+
+    tasks = [ (tiles1.get(t, []), tiles2.get(t, [])) for t in set(tiles1) | set(tiles2) ]
+
+    if max_workers == 0:
+        results = map(overlay_tile, tasks)
+        tile_edges = [ pq for r in results for pq in r ]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            tile_edges = [ pq for r in pool.map(overlay_tile, tasks) for pq in r ]
+
+    originals = set(_point(v) for v in dcel1.verts + dcel2.verts)
+    points, segs = stitch(tile_edges, seams1 | seams2, originals, xcuts, ycuts)
+
+    ol_dcel = DCEL.from_points_segs(points, segs, compute_faces=compute_faces)
+
+    if compute_faces:
+        ol_dcel.annotate_faces(dcel1)
+        ol_dcel.annotate_faces(dcel2)
+
+    return ol_dcel
+
+if __name__=='__main__':
+    from dcel_datasets import vert_edge_test, vert_edge_test2, disconnected_test, seam_test, grid_lines_test
+
+    # the tiled overlay matches the overlay for every tiling
+    for test in [vert_edge_test, vert_edge_test2, disconnected_test, seam_test, grid_lines_test]:
+        d1, d2 = test()
+        expected = overlay(d1, d2, compute_faces=True)
+        for nx, ny in [(1,2), (2,1), (2,2), (3,3)]:
+            ol = tiled_overlay(d1, d2, nx, ny, compute_faces=True, max_workers=0)
+            assert (len(ol.verts), len(ol.edges), len(ol.faces)) == (len(expected.verts), len(expected.edges), len(expected.faces)), (test.__name__, nx, ny)
+    print('ok')